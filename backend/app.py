@@ -1,29 +1,45 @@
 import os
+import time
 import uuid
 import logging
+import multiprocessing
 from datetime import datetime, timedelta
-from flask import Flask, request, jsonify, send_file
+from typing import List, Tuple
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context, g
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
+import numpy as np
 import pandas as pd
 import json
 
+from config import config
+
 # Configuration du logging
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
-        logging.FileHandler('logs/inventory_processor.log'),
+        logging.FileHandler(os.path.join(config.LOG_FOLDER, 'inventory_processor.log')),
         logging.StreamHandler()
     ]
 )
 logger = logging.getLogger(__name__)
 
 # Imports des services
-from config import config
 from services.file_processor import FileProcessorService
-from services.session_service import SessionService
+from services.session_service import session_service
+from services.dataframe_cache import dataframe_cache
 from services.lotecart_processor import LotecartProcessor
+from services.distribution_engine import distribution_engine, DELTA_TOLERANCE
+from services.partition_executor import partition_executor
+from services.stage_pool import stage_pool
+from services.lot_index import LotIndex, ROW_ID_COLUMN, KEY_ID_COLUMN, TEMPLATE_KEY_COLUMN
+from services.line_store import LineStore, RAW_LINE_COLUMN, LINE_OFFSET_COLUMN, LINE_LENGTH_COLUMN
+from services.final_file_writer import FinalFileWriter
+from services.job_service import job_service, JobFailed
+from services.ingest_cache import ingest_cache
+from services.progress_service import progress_service
+from services.metrics import metrics
 from utils.validators import FileValidator
 from utils.error_handler import handle_api_errors, APIErrorHandler
 from utils.rate_limiter import apply_rate_limit
@@ -39,8 +55,31 @@ app.config['SECRET_KEY'] = config.SECRET_KEY
 
 # Services
 file_processor = FileProcessorService()
-session_service = SessionService()
 lotecart_processor = LotecartProcessor()
+final_file_writer = FinalFileWriter(lotecart_processor)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """Durée et volumes de la requête, par règle de routage (pas par URL : identifiants exclus)"""
+    started = g.pop('request_started', None)
+    if started is not None:
+        try:
+            metrics.observe_request(
+                request.url_rule.rule if request.url_rule else 'unmatched',
+                request.method,
+                response.status_code,
+                time.perf_counter() - started,
+                bytes_in=request.content_length or 0,
+                # Taille inconnue pour les réponses en flux (SSE, fichiers)
+                bytes_out=None if response.is_streamed else response.content_length,
+            )
+        except Exception as e:
+            logger.error(f"Erreur enregistrement des métriques: {e}")
+    return response
 
 class InventoryProcessor:
     """Processeur principal pour les inventaires Sage X3"""
@@ -49,48 +88,33 @@ class InventoryProcessor:
         self.sessions = {}  # Stockage temporaire en mémoire (sera migré vers DB)
         logger.info("InventoryProcessor initialisé")
     
-    def process_completed_file(self, session_id: str, completed_file_path: str) -> pd.DataFrame:
-        """Traite le fichier template complété et calcule les écarts"""
+    def process_completed_file(self, session_id: str, completed_file_path: str, completed_df: pd.DataFrame = None) -> pd.DataFrame:
+        """
+        Traite le fichier template complété et calcule les écarts
+
+        completed_df : template déjà lu (et sauvegardé dans la session) ;
+        à défaut le fichier est lu depuis completed_file_path.
+        """
         try:
-            # Vérifier que le fichier existe et est accessible
-            if not os.path.exists(completed_file_path):
-                raise FileNotFoundError(f"Fichier complété non trouvé: {completed_file_path}")
-            
-            # Vérifier la taille du fichier
-            file_size = os.path.getsize(completed_file_path)
-            if file_size == 0:
-                raise ValueError("Le fichier complété est vide")
-            
-            logger.info(f"Lecture du fichier complété: {completed_file_path} ({file_size} bytes)")
-            
-            # Tentative de lecture avec gestion d'erreur améliorée
-            try:
-                completed_df = pd.read_excel(completed_file_path, engine='openpyxl')
-            except Exception as excel_error:
-                logger.error(f"Erreur lecture Excel avec openpyxl: {excel_error}")
-                # Tentative avec un autre moteur
-                try:
-                    completed_df = pd.read_excel(completed_file_path, engine='xlrd')
-                    logger.info("Lecture réussie avec xlrd")
-                except Exception as xlrd_error:
-                    logger.error(f"Erreur lecture Excel avec xlrd: {xlrd_error}")
-                    
-                    # Dernière tentative : lire le fichier comme binaire et utiliser BytesIO
-                    try:
-                        import io
-                        with open(completed_file_path, 'rb') as f:
-                            file_content = f.read()
-                        completed_df = pd.read_excel(io.BytesIO(file_content), engine='openpyxl')
-                        logger.info("Lecture réussie avec BytesIO")
-                    except Exception as bytesio_error:
-                        logger.error(f"Erreur lecture avec BytesIO: {bytesio_error}")
-                        raise ValueError(f"Impossible de lire le fichier Excel: {excel_error}")        
+            if completed_df is None:
+                # Vérifier que le fichier existe et est accessible
+                if not os.path.exists(completed_file_path):
+                    raise FileNotFoundError(f"Fichier complété non trouvé: {completed_file_path}")
+                
+                # Vérifier la taille du fichier
+                file_size = os.path.getsize(completed_file_path)
+                if file_size == 0:
+                    raise ValueError("Le fichier complété est vide")
+                
+                logger.info(f"Lecture du fichier complété: {completed_file_path} ({file_size} bytes)")
+                
+                completed_df = file_processor.read_completed_template(completed_file_path)
+                
+                # Sauvegarder le DataFrame complété
+                session_service.save_dataframe(session_id, "completed_df", completed_df)
             
             logger.info(f"Template complété chargé: {len(completed_df)} lignes")
             
-            # Sauvegarder le DataFrame complété
-            session_service.save_dataframe(session_id, "completed_df", completed_df)
-            
             # Charger les données originales
             original_df = session_service.load_dataframe(session_id, "original_df")
             if original_df is None:
@@ -103,9 +127,18 @@ class InventoryProcessor:
                 logger.info(f"🎯 {len(lotecart_candidates)} candidats LOTECART détectés")
             
             # Calculer les écarts
-            discrepancies = self._calculate_discrepancies(completed_df, original_df)
+            lot_index = LotIndex.load(session_service, session_id, original_df)
+            discrepancies, unmatched = self._calculate_discrepancies(completed_df, original_df, lot_index)
             session_service.save_dataframe(session_id, "discrepancies_df", discrepancies)
             
+            if not unmatched.empty:
+                counts = unmatched['SOURCE'].value_counts()
+                logger.warning(
+                    f"⚠️ Clés sans correspondance: {counts.get('original', 0)} articles absents du template "
+                    f"(quantité saisie = 0), {counts.get('template', 0)} saisies absentes des données originales"
+                )
+                session_service.save_dataframe(session_id, "unmatched_keys_df", unmatched)
+            
             logger.info(f"Écarts calculés: {len(discrepancies)} lignes avec écarts")
             return discrepancies
             
@@ -113,130 +146,98 @@ class InventoryProcessor:
             logger.error(f"Erreur traitement fichier complété: {e}")
             raise
     
-    def _calculate_discrepancies(self, completed_df: pd.DataFrame, original_df: pd.DataFrame) -> pd.DataFrame:
-        """Calcule les écarts entre quantités théoriques et réelles"""
-        discrepancies = []
+    def _calculate_discrepancies(
+        self, completed_df: pd.DataFrame, original_df: pd.DataFrame, lot_index: LotIndex = None
+    ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Calcule les écarts entre quantités théoriques et réelles
+
+        Les quantités saisies (par article et inventaire, sans numéro de lot)
+        sont rapprochées des lots originaux par numéro de clé (article,
+        inventaire) : celui de la colonne masquée du template, ou à défaut
+        celui retrouvé par libellés. Le rapprochement est ensuite une simple
+        indexation de tableaux. Une clé absente du template donne une
+        quantité saisie de 0 ; en cas de doublon, la dernière saisie l'emporte.
+
+        Returns:
+            (écarts par lot, clés sans correspondance avec leur SOURCE :
+            'original' = lots absents du template, 'template' = saisies
+            absentes des données originales)
+        """
+        keys = ['CODE_ARTICLE', 'NUMERO_INVENTAIRE']
         
-        # Créer un dictionnaire des quantités réelles saisies (sans numéro de lot)
-        real_quantities_dict = {}
-        for _, row in completed_df.iterrows():
-            key = (
-                row["Code Article"],
-                row["Numéro Inventaire"]
-            )
-            real_quantities_dict[key] = row["Quantité Réelle"]
+        if lot_index is None:
+            lot_index = LotIndex.build(original_df)
         
-        # Parcourir les données originales et calculer les écarts
-        for _, original_row in original_df.iterrows():
-            code_article = original_row["CODE_ARTICLE"]
-            numero_inventaire = original_row["NUMERO_INVENTAIRE"]
-            numero_lot = str(original_row["NUMERO_LOT"]).strip() if pd.notna(original_row["NUMERO_LOT"]) else ""
-            quantite_originale = original_row["QUANTITE"]
-            
-            key = (code_article, numero_inventaire)
-            quantite_reelle_saisie = real_quantities_dict.get(key, 0)
-            
-            # IMPORTANT: Ne pas calculer la quantité corrigée ici
-            # Elle sera calculée dans distribute_discrepancies selon FIFO/LIFO
-            discrepancy_row = {
-                'CODE_ARTICLE': code_article,
-                'NUMERO_INVENTAIRE': numero_inventaire,
-                'NUMERO_LOT': numero_lot,
-                'TYPE_LOT': original_row.get('Type_Lot', 'unknown'),
-                'QUANTITE_ORIGINALE': quantite_originale,
-                'QUANTITE_REELLE_SAISIE_TOTALE': quantite_reelle_saisie,  # Quantité totale saisie pour l'article
-                'AJUSTEMENT': 0,  # Sera calculé dans distribute_discrepancies
-                'QUANTITE_CORRIGEE': quantite_originale,  # Initialement = quantité originale
-                'Date_Lot': original_row.get('Date_Lot'),
-                'original_s_line_raw': original_row.get('original_s_line_raw')
-            }
-            
-            discrepancies.append(discrepancy_row)
+        # Numéro de clé de chaque ligne saisie et de chaque lot original
+        saisie_keys = lot_index.resolve_key_codes(
+            completed_df['Code Article'], completed_df['Numéro Inventaire'], completed_df.get(TEMPLATE_KEY_COLUMN)
+        )
+        row_keys = (
+            original_df[KEY_ID_COLUMN].to_numpy(dtype=np.int64)
+            if KEY_ID_COLUMN in original_df
+            else lot_index.row_codes(len(original_df))
+        )
+        
+        # Quantité saisie par clé ; en cas de doublon, la dernière saisie l'emporte
+        known = saisie_keys >= 0
+        last = known & ~pd.Series(saisie_keys).duplicated(keep='last').to_numpy()
+        saisies = np.full(len(lot_index), np.nan)
+        has_saisie = np.zeros(len(lot_index), dtype=bool)
+        saisies[saisie_keys[last]] = pd.to_numeric(completed_df['Quantité Réelle'], errors='coerce').to_numpy()[last]
+        has_saisie[saisie_keys[last]] = True
         
-        return pd.DataFrame(discrepancies)
+        indexed = row_keys >= 0
+        matched = np.zeros(len(original_df), dtype=bool)
+        matched[indexed] = has_saisie[row_keys[indexed]]
+        real_quantities = np.zeros(len(original_df))
+        real_quantities[matched] = saisies[row_keys[matched]]
+        
+        # IMPORTANT: Ne pas calculer la quantité corrigée ici
+        # Elle sera calculée dans distribute_discrepancies selon FIFO/LIFO
+        numero_lot = original_df['NUMERO_LOT']
+        discrepancies = pd.DataFrame({
+            'CODE_ARTICLE': original_df['CODE_ARTICLE'].array,
+            'NUMERO_INVENTAIRE': original_df['NUMERO_INVENTAIRE'].array,
+            'NUMERO_LOT': numero_lot.astype(str).str.strip().where(numero_lot.notna(), '').array,
+            'TYPE_LOT': original_df['Type_Lot'].array if 'Type_Lot' in original_df else 'unknown',
+            'QUANTITE_ORIGINALE': original_df['QUANTITE'].array,
+            'QUANTITE_REELLE_SAISIE_TOTALE': real_quantities,  # Quantité totale saisie pour l'article
+            'AJUSTEMENT': 0,  # Sera calculé dans distribute_discrepancies
+            'QUANTITE_CORRIGEE': original_df['QUANTITE'].array,  # Initialement = quantité originale
+            'Date_Lot': original_df['Date_Lot'].array if 'Date_Lot' in original_df else None,
+            # Identifiants de ligne et de clé, position de la ligne brute dans le
+            # LineStore (ou ligne brute des anciennes sessions)
+            **{
+                name: original_df[name].array
+                for name in (ROW_ID_COLUMN, KEY_ID_COLUMN, RAW_LINE_COLUMN, LINE_OFFSET_COLUMN, LINE_LENGTH_COLUMN)
+                if name in original_df
+            },
+        })
+        
+        # Clés sans correspondance, dans les deux sens
+        missing_in_template = original_df.loc[~matched, keys].astype(str).drop_duplicates()
+        unknown_in_original = pd.DataFrame({
+            'CODE_ARTICLE': completed_df['Code Article'].astype(str).to_numpy()[~known],
+            'NUMERO_INVENTAIRE': completed_df['Numéro Inventaire'].astype(str).to_numpy()[~known],
+        }).drop_duplicates(subset=keys, keep='last')
+        unmatched = pd.concat([
+            missing_in_template.assign(SOURCE='original'),
+            unknown_in_original.assign(SOURCE='template'),
+        ], ignore_index=True)
+        
+        return discrepancies, unmatched
     
     def distribute_discrepancies(self, session_id: str, strategy: str = 'FIFO') -> pd.DataFrame:
         """Distribue les écarts selon la stratégie choisie (FIFO/LIFO)"""
         try:
             # Charger les écarts calculés
-            discrepancies_df = session_service.load_dataframe(session_id, "discrepancies_df")
-            if discrepancies_df is None:
-                raise ValueError("Écarts non calculés pour cette session")
+            discrepancies_df = self._load_discrepancies(session_id)
             
             logger.info(f"🔄 Distribution des écarts selon stratégie {strategy}")
             
-            # Grouper par article et inventaire pour calculer les écarts totaux
-            distributed_rows = []
-            
-            for (code_article, numero_inventaire), group in discrepancies_df.groupby(['CODE_ARTICLE', 'NUMERO_INVENTAIRE']):
-                # Calculer l'écart total pour cet article
-                quantite_originale_totale = group['QUANTITE_ORIGINALE'].sum()
-                quantite_reelle_saisie = group['QUANTITE_REELLE_SAISIE_TOTALE'].iloc[0]  # Même valeur pour tous les lots
-                ecart_total = quantite_reelle_saisie - quantite_originale_totale
-                
-                logger.info(f"📊 Article {code_article}: Orig={quantite_originale_totale}, Saisie={quantite_reelle_saisie}, Écart={ecart_total}")
-                
-                # Trier les lots selon la stratégie
-                if strategy == 'FIFO':
-                    # FIFO: lots les plus anciens en premier (par date puis par numéro de lot)
-                    sorted_group = group.sort_values(['Date_Lot', 'NUMERO_LOT'], na_position='last')
-                elif strategy == 'LIFO':
-                    # LIFO: lots les plus récents en premier
-                    sorted_group = group.sort_values(['Date_Lot', 'NUMERO_LOT'], ascending=[False, False], na_position='first')
-                else:
-                    # Par défaut, garder l'ordre original
-                    sorted_group = group
-                
-                # Distribuer l'écart sur les lots
-                ecart_restant = ecart_total
-                
-                for _, lot_row in sorted_group.iterrows():
-                    quantite_originale_lot = lot_row['QUANTITE_ORIGINALE']
-                    
-                    if ecart_restant == 0:
-                        # Plus d'écart à distribuer, garder la quantité originale
-                        quantite_corrigee = quantite_originale_lot
-                        ajustement_lot = 0
-                    elif ecart_restant > 0:
-                        # Écart positif: ajouter du stock
-                        if ecart_restant >= quantite_originale_lot:
-                            # On peut absorber tout l'écart sur ce lot
-                            quantite_corrigee = quantite_originale_lot + min(ecart_restant, quantite_originale_lot)
-                            ajustement_lot = min(ecart_restant, quantite_originale_lot)
-                            ecart_restant -= ajustement_lot
-                        else:
-                            # Écart restant plus petit que la quantité du lot
-                            quantite_corrigee = quantite_originale_lot + ecart_restant
-                            ajustement_lot = ecart_restant
-                            ecart_restant = 0
-                    else:
-                        # Écart négatif: retirer du stock
-                        if abs(ecart_restant) >= quantite_originale_lot:
-                            # On retire tout le stock de ce lot
-                            quantite_corrigee = 0
-                            ajustement_lot = -quantite_originale_lot
-                            ecart_restant += quantite_originale_lot
-                        else:
-                            # On retire partiellement
-                            quantite_corrigee = quantite_originale_lot + ecart_restant  # ecart_restant est négatif
-                            ajustement_lot = ecart_restant
-                            ecart_restant = 0
-                    
-                    # Créer la ligne distribuée
-                    distributed_row = lot_row.copy()
-                    distributed_row['AJUSTEMENT'] = ajustement_lot
-                    distributed_row['QUANTITE_CORRIGEE'] = quantite_corrigee
-                    distributed_row['QUANTITE_REELLE_SAISIE'] = quantite_reelle_saisie  # Garder la saisie totale pour info
-                    
-                    distributed_rows.append(distributed_row)
-                    
-                    logger.debug(f"  📦 Lot {lot_row['NUMERO_LOT']}: Orig={quantite_originale_lot} → Corrigée={quantite_corrigee} (Ajust={ajustement_lot})")
-                
-                # Vérifier qu'on a bien distribué tout l'écart
-                if abs(ecart_restant) > 0.01:  # Tolérance pour les erreurs d'arrondi
-                    logger.warning(f"⚠️ Écart non complètement distribué pour {code_article}: {ecart_restant}")
-            
-            distributed_df = pd.DataFrame(distributed_rows)
+            # Répartition vectorisée des écarts sur les lots
+            distributed_df = distribution_engine.distribute(discrepancies_df, strategy, partition_executor)
             
             # Charger les candidats LOTECART s'ils existent
             lotecart_candidates = session_service.load_dataframe(session_id, "lotecart_candidates")
@@ -244,15 +245,18 @@ class InventoryProcessor:
             # Créer les ajustements LOTECART si nécessaire
             if lotecart_candidates is not None and not lotecart_candidates.empty:
                 original_df = session_service.load_dataframe(session_id, "original_df")
+                lot_index = LotIndex.load(session_service, session_id, original_df)
                 lotecart_adjustments = lotecart_processor.create_lotecart_adjustments(
-                    lotecart_candidates, original_df
+                    lotecart_candidates, original_df, lot_index,
+                    LineStore.for_session(session_service, session_id)
                 )
                 logger.info(f"🎯 {len(lotecart_adjustments)} ajustements LOTECART créés")
                 
-                # Ajouter les ajustements LOTECART
-                for lotecart_adj in lotecart_adjustments:
-                    lotecart_adj['QUANTITE_REELLE_SAISIE'] = lotecart_adj['QUANTITE_CORRIGEE']
-                    distributed_df = pd.concat([distributed_df, pd.DataFrame([lotecart_adj])], ignore_index=True)
+                # Ajouter les ajustements LOTECART en une seule concaténation
+                if lotecart_adjustments:
+                    lotecart_df = pd.DataFrame(lotecart_adjustments)
+                    lotecart_df['QUANTITE_REELLE_SAISIE'] = lotecart_df['QUANTITE_CORRIGEE']
+                    distributed_df = pd.concat([distributed_df, lotecart_df], ignore_index=True)
             
             # Sauvegarder les données distribuées
             session_service.save_dataframe(session_id, "distributed_df", distributed_df)
@@ -270,6 +274,31 @@ class InventoryProcessor:
             logger.error(f"❌ Erreur distribution écarts: {e}")
             raise
     
+    def compare_strategies(self, session_id: str, strategies: List[str]) -> Tuple[pd.DataFrame, dict]:
+        """
+        Compare les stratégies de répartition (la première sert de référence)
+
+        Les stratégies sont calculées en une passe ; résultat : (comparaison
+        par lot, synthèse des écarts). Rien n'est enregistré dans la session ;
+        les nouvelles lignes LOTECART, identiques pour toutes les stratégies,
+        n'apparaissent pas dans la comparaison.
+        """
+        try:
+            discrepancies_df = self._load_discrepancies(session_id)
+            comparison_df = distribution_engine.compare(discrepancies_df, strategies)
+            summary = distribution_engine.summarize_comparison(comparison_df, strategies)
+            logger.info(f"✅ Comparaison {'/'.join(summary['strategies'])} terminée: {summary['deltas']}")
+            return comparison_df, summary
+        except Exception as e:
+            logger.error(f"❌ Erreur comparaison stratégies: {e}")
+            raise
+    
+    def _load_discrepancies(self, session_id: str) -> pd.DataFrame:
+        discrepancies_df = session_service.load_dataframe(session_id, "discrepancies_df")
+        if discrepancies_df is None:
+            raise ValueError("Écarts non calculés pour cette session")
+        return discrepancies_df
+    
     def _calculate_session_stats(self, distributed_df: pd.DataFrame) -> dict:
         """Calcule les statistiques de session"""
         try:
@@ -285,8 +314,12 @@ class InventoryProcessor:
             logger.error(f"Erreur calcul statistiques: {e}")
             return {'total_discrepancy': 0, 'adjusted_items_count': 0}
     
-    def generate_final_file(self, session_id: str) -> str:
-        """Génère le fichier final CSV avec les quantités réelles dans la colonne G"""
+    def generate_final_file(self, session_id: str, progress=None) -> str:
+        """
+        Génère le fichier final CSV avec les quantités réelles dans la colonne G
+
+        progress(lignes) est appelé au fil de l'écriture avec le nombre de lignes S; écrites.
+        """
         try:
             # Charger les données nécessaires
             distributed_df = session_service.load_dataframe(session_id, "distributed_df")
@@ -300,19 +333,19 @@ class InventoryProcessor:
             
             header_lines = json.loads(session_data['header_lines']) if session_data['header_lines'] else []
             
-            # Créer le dictionnaire des ajustements avec quantités réelles (AVEC numéro de lot)
-            adjustments_dict = {}
-            for _, row in distributed_df.iterrows():
-                key = (
-                    row["CODE_ARTICLE"],
-                    row["NUMERO_INVENTAIRE"],
-                    str(row["NUMERO_LOT"]).strip()
-                )
-                adjustments_dict[key] = {
-                    "qte_theo_ajustee": row["QUANTITE_CORRIGEE"],
-                    "qte_reelle_saisie": row.get("QUANTITE_REELLE_SAISIE", row["QUANTITE_CORRIGEE"]),  # Nouvelle donnée
-                    "type_lot": row["TYPE_LOT"]
-                }
+            original_df = session_service.load_dataframe(session_id, "original_df")
+            lot_index = LotIndex.load(session_service, session_id, original_df)
+            
+            # Quantité ajustée de chaque ligne originale (AVEC numéro de lot)
+            adjusted_quantities = final_file_writer.adjusted_quantities(original_df, distributed_df, lot_index)
+            
+            # Nouvelles lignes LOTECART (les mises à jour de lignes existantes sont déjà dans les ajustements)
+            is_new_lotecart = (
+                distributed_df["is_new_lotecart"].eq(True) & ~distributed_df["is_existing_update"].eq(True)
+                if "is_new_lotecart" in distributed_df and "is_existing_update" in distributed_df
+                else pd.Series(False, index=distributed_df.index)
+            )
+            lotecart_adjustments = distributed_df[is_new_lotecart].to_dict('records')
             
             # Générer le nom du fichier final
             original_filename = session_data['original_filename']
@@ -321,85 +354,16 @@ class InventoryProcessor:
             final_file_path = os.path.join(config.FINAL_FOLDER, final_filename)
             
             # Générer le fichier final
-            with open(final_file_path, 'w', encoding='utf-8') as f:
-                # Écrire les en-têtes
-                for header in header_lines:
-                    f.write(header + "\n")
-                
-                # Traiter les lignes existantes et ajouter les nouvelles lignes LOTECART
-                original_df = session_service.load_dataframe(session_id, "original_df")
-                max_line_number = 0
-                
-                # Traiter chaque ligne originale
-                for _, original_row in original_df.iterrows():
-                    parts = str(original_row["original_s_line_raw"]).split(";")
-                    
-                    if len(parts) >= 15:
-                        code_article = original_row["CODE_ARTICLE"]
-                        numero_inventaire = original_row["NUMERO_INVENTAIRE"]
-                        numero_lot = str(original_row["NUMERO_LOT"]).strip()
-                        
-                        key = (code_article, numero_inventaire, numero_lot)
-                        
-                        # Mettre à jour le numéro de ligne max
-                        try:
-                            line_number = int(parts[3])
-                            max_line_number = max(max_line_number, line_number)
-                        except (ValueError, IndexError):
-                            pass
-                        
-                        # Sauvegarder la quantité originale (elle était dans parts[5])
-                        quantite_originale = parts[5]
-                        
-                        # Vérifier s'il y a un ajustement pour cette ligne
-                        if key in adjustments_dict:
-                            adjustment_data = adjustments_dict[key]
-                            
-                            # NOUVELLE LOGIQUE : Inverser les colonnes 5 et 6
-                            parts[5] = quantite_originale  # Colonne 5 (F) = Quantité originale du fichier initial
-                            qte_theo_ajustee = int(adjustment_data["qte_theo_ajustee"])
-                            parts[6] = str(qte_theo_ajustee)  # Colonne 6 (G) = Quantité théorique ajustée
-                            
-                            # L'indicateur passe à "2" SEULEMENT si la quantité théorique ajustée est 0
-                            if qte_theo_ajustee == 0:
-                                parts[7] = "2"  # Indicateur de compte ajusté (quantité ajustée = 0)
-                            else:
-                                parts[7] = "1"  # Indicateur normal (quantité ajustée > 0)
-                        else:
-                            # Pas d'ajustement, garder les valeurs originales
-                            parts[5] = quantite_originale  # Colonne 5 (F) = Quantité originale
-                            parts[6] = quantite_originale  # Colonne 6 (G) = Quantité originale (pas d'ajustement)
-                            parts[7] = "2"  # Indicateur à 2 car pas d'ajustement
-                        
-                        # Écrire la ligne
-                        f.write(";".join(parts) + "\n")
-                
-                # Ajouter les nouvelles lignes LOTECART
-                lotecart_adjustments = [
-                    adj for adj in distributed_df.to_dict('records') 
-                    if adj.get('is_new_lotecart', False) and not adj.get('is_existing_update', False)
-                ]
-                
-                if lotecart_adjustments:
-                    new_lotecart_lines = lotecart_processor.generate_lotecart_lines(
-                        lotecart_adjustments, max_line_number
-                    )
-                    
-                    for line in new_lotecart_lines:
-                        # Adapter les lignes LOTECART à la nouvelle logique des colonnes
-                        parts = line.split(";")
-                        if len(parts) >= 15:
-                            # Pour LOTECART : 
-                            # Colonne 5 (F) = 0 (quantité originale était 0)
-                            # Colonne 6 (G) = quantité trouvée (quantité théorique ajustée)
-                            qte_lotecart = parts[5]  # Quantité trouvée
-                            parts[5] = "0"  # Colonne 5 (F) = Quantité originale (était 0 pour LOTECART)
-                            parts[6] = qte_lotecart  # Colonne 6 (G) = Quantité théorique ajustée
-                            line = ";".join(parts)
-                        
-                        f.write(line + "\n")
-                
-                logger.info(f"✅ Fichier final généré avec {len(distributed_df)} ajustements dont {len(lotecart_adjustments)} nouvelles lignes LOTECART")
+            file_stats = final_file_writer.write(
+                final_file_path, header_lines, original_df, adjusted_quantities, lotecart_adjustments,
+                LineStore.for_session(session_service, session_id), progress
+            )
+            logger.info(f"✅ Fichier final généré avec {len(distributed_df)} ajustements dont {len(lotecart_adjustments)} nouvelles lignes LOTECART")
+            
+            if lotecart_adjustments:
+                lotecart_processor.validate_lotecart_processing(
+                    final_file_path, len(lotecart_adjustments), file_stats
+                )
             
             # Mettre à jour la session
             session_service.update_session(session_id, 
@@ -416,6 +380,234 @@ class InventoryProcessor:
 # Instance globale du processeur
 processor = InventoryProcessor()
 
+# Étapes des jobs en arrière-plan
+UPLOAD_STAGES = ['parse', 'save', 'aggregate', 'template']
+PROCESS_STAGES = ['discrepancies', 'distribution', 'final_file']
+REDISTRIBUTE_STAGES = ['distribution', 'final_file']
+# Stratégies de répartition des écarts sur les lots
+DISTRIBUTION_STRATEGIES = ['FIFO', 'LIFO']
+
+def _no_progress(stage: str):
+    pass
+
+# Étapes lourdes, exécutées dans le pool de processus (stage_pool) s'il est
+# activé : fonctions de module, qui relisent et écrivent les données de la
+# session sur disque plutôt que de les recevoir en arguments. Les lignes
+# traitées en cours d'étape sont publiées directement (progress_service).
+def parse_stage(file_path: str, file_extension: str, created_at: str, session_id: str):
+    # Les lignes brutes sont stockées une seule fois, sur disque, au fil de l'analyse
+    return file_processor.validate_and_process_sage_file(
+        file_path, file_extension, datetime.fromisoformat(created_at),
+        LineStore.for_session(session_service, session_id),
+        progress_service.row_reporter(session_id, 'upload', 'parse')
+    )
+
+def aggregate_stage(session_id: str) -> pd.DataFrame:
+    original_df = session_service.load_dataframe(session_id, "original_df")
+    aggregated_df = file_processor.aggregate_data(original_df, executor=partition_executor)
+    session_service.save_dataframe(session_id, "aggregated_df", aggregated_df)
+    return aggregated_df
+
+def template_stage(session_id: str) -> str:
+    aggregated_df = session_service.load_dataframe(session_id, "aggregated_df")
+    return file_processor.generate_template(aggregated_df, session_id, config.PROCESSED_FOLDER)
+
+def distribute_stage(session_id: str, strategy: str) -> pd.DataFrame:
+    return processor.distribute_discrepancies(session_id, strategy)
+
+def compare_stage(session_id: str, strategies: List[str], limit: int) -> Tuple[dict, list]:
+    # Synthèse et lots dont la quantité corrigée change (limit premiers), sans transférer le DataFrame complet
+    comparison_df, summary = processor.compare_strategies(session_id, strategies)
+    changed = comparison_df.filter(like='DELTA_').abs().gt(DELTA_TOLERANCE).any(axis=1)
+    lots = comparison_df[changed].head(limit)
+    return summary, json.loads(lots.to_json(orient='records', date_format='iso'))
+
+def final_file_stage(session_id: str, pipeline: str) -> Tuple[str, int]:
+    written = progress_service.row_reporter(session_id, pipeline, 'final_file')
+    return processor.generate_final_file(session_id, written), written.rows
+
+def run_upload_pipeline(payload: dict, progress=_no_progress) -> dict:
+    """Traitement initial d'un fichier uploadé : lecture, sauvegarde, agrégation, template"""
+    with progress_service.tracker(payload['session_id'], 'upload', progress) as tracker:
+        response = _upload_pipeline(payload, tracker)
+        tracker.finish(response)
+    return response
+
+def _upload_pipeline(payload: dict, tracker) -> dict:
+    session_id = payload['session_id']
+    file_path = payload['file_path']
+    file_extension = os.path.splitext(payload['filename'])[1].lower()
+    session_timestamp = datetime.fromisoformat(payload['created_at'])
+    content_hash = payload.get('content_hash')
+    config_version = payload.get('config_version') or ingest_cache.config_version()
+    
+    # Fichier déjà importé (même empreinte, même configuration) : données reprises
+    tracker.stage('parse')
+    reused = None
+    if content_hash:
+        reused = ingest_cache.restore(
+            content_hash, config_version, file_extension, session_id, config.PROCESSED_FOLDER
+        )
+    
+    if reused:
+        result = session_service.load_dataframe(session_id, "original_df")
+        aggregated_df = session_service.load_dataframe(session_id, "aggregated_df")
+        template_path = reused['template_file_path']
+        header_lines = reused['header_lines']
+        # L'année de la date d'inventaire est celle de la session
+        inventory_date = file_processor._extract_inventory_date(
+            str(result['NUMERO_INVENTAIRE'].iloc[0]), session_timestamp
+        )
+        tracker.rows(len(result))
+    else:
+        # Traitement du fichier
+        success, result, headers, inventory_date = stage_pool.run(
+            parse_stage, file_path, file_extension, payload['created_at'], session_id
+        )
+        
+        if not success:
+            session_service.update_session(session_id, status='error')
+            raise JobFailed(result)
+        
+        # Sauvegarder les données originales et leur index (article, inventaire)
+        tracker.rows(len(result))
+        tracker.stage('save')
+        lot_index = LotIndex.build(result)
+        result = lot_index.with_ids(result)
+        session_service.save_dataframe(session_id, "original_df", result)
+        lot_index.save(session_service, session_id)
+        tracker.rows(len(result))
+        
+        # Agrégation des données
+        tracker.stage('aggregate')
+        aggregated_df = stage_pool.run(aggregate_stage, session_id)
+        tracker.rows(len(aggregated_df))
+        
+        # Génération du template (une ligne par article agrégé)
+        tracker.stage('template')
+        template_path = stage_pool.run(template_stage, session_id)
+        tracker.rows(len(aggregated_df))
+        header_lines = json.dumps(headers)
+    
+    # Mise à jour de la session
+    session_service.update_session(
+        session_id,
+        template_file_path=template_path,
+        inventory_date=inventory_date,
+        nb_articles=len(aggregated_df),
+        nb_lots=len(result),
+        total_quantity=float(result['QUANTITE'].sum()),
+        status='template_generated',
+        header_lines=header_lines
+    )
+    # Les prochains imports du même fichier reprendront cette session
+    if content_hash:
+        ingest_cache.register(
+            content_hash, config_version, file_extension, session_id, payload.get('file_size')
+        )
+    
+    response = {
+        'message': 'Fichier traité avec succès',
+        'session_id': session_id,
+        'template_url': f'/api/download/template/{session_id}',
+        'stats': {
+            'nb_articles': len(aggregated_df),
+            'total_quantity': float(result['QUANTITE'].sum()),
+            'nb_lots': len(result),
+            'inventory_date': inventory_date.isoformat() if inventory_date else None
+        }
+    }
+    if reused:
+        response['reused_session_id'] = reused['source_session_id']
+    return response
+
+def run_process_pipeline(payload: dict, progress=_no_progress) -> dict:
+    """Traitement du template complété : écarts, répartition, fichier final"""
+    with progress_service.tracker(payload['session_id'], 'process', progress) as tracker:
+        response = _process_pipeline(payload, tracker)
+        tracker.finish(response)
+    return response
+
+def _process_pipeline(payload: dict, tracker) -> dict:
+    session_id = payload['session_id']
+    completed_file_path = payload['completed_file_path']
+    strategy = payload.get('strategy', 'FIFO')
+    
+    tracker.stage('discrepancies')
+    # Template déjà lu par l'endpoint : repris depuis la session, sans relecture du fichier
+    completed_df = None
+    if payload.get('template_parsed'):
+        completed_df = session_service.load_dataframe(session_id, "completed_df")
+    discrepancies = processor.process_completed_file(session_id, completed_file_path, completed_df)
+    tracker.rows(len(discrepancies))
+    response = _distribution_pipeline(session_id, strategy, tracker)
+    
+    session_service.update_session(session_id, completed_file_path=completed_file_path)
+    return response
+
+def run_redistribute_pipeline(payload: dict, progress=_no_progress) -> dict:
+    """Nouvelle répartition des écarts déjà calculés (autre stratégie) et fichier final"""
+    with progress_service.tracker(payload['session_id'], 'redistribute', progress) as tracker:
+        response = _distribution_pipeline(payload['session_id'], payload.get('strategy', 'FIFO'), tracker)
+        tracker.finish(response)
+    return response
+
+def _distribution_pipeline(session_id: str, strategy: str, tracker) -> dict:
+    """Répartition des écarts de la session (discrepancies_df, lotecart_candidates) et fichier final"""
+    tracker.stage('distribution')
+    distributed_df = stage_pool.run(distribute_stage, session_id, strategy)
+    tracker.rows(len(distributed_df))
+    tracker.stage('final_file')
+    final_file_path, written = stage_pool.run(final_file_stage, session_id, tracker.pipeline)
+    tracker.rows(written)
+    
+    # Mise à jour de la session
+    session_service.update_session(session_id, final_file_path=final_file_path)
+    
+    # Calcul des statistiques finales
+    total_discrepancy = distributed_df['AJUSTEMENT'].sum()
+    adjusted_items = len(distributed_df[distributed_df['AJUSTEMENT'] != 0])
+    
+    return {
+        'message': 'Traitement terminé avec succès',
+        'session_id': session_id,
+        'final_url': f'/api/download/final/{session_id}',
+        'stats': {
+            'total_discrepancy': float(total_discrepancy),
+            'adjusted_items': adjusted_items,
+            'strategy_used': strategy
+        }
+    }
+
+job_service.register('upload', run_upload_pipeline, UPLOAD_STAGES)
+job_service.register('process', run_process_pipeline, PROCESS_STAGES)
+job_service.register('redistribute', run_redistribute_pipeline, REDISTRIBUTE_STAGES)
+# Application Celery (si JOB_BROKER_URL est défini) : celery -A app.celery_app worker
+celery_app = job_service.celery_app
+# Les processus du pool d'étapes (qui importent ce module) ne démarrent ni pool ni jobs
+if multiprocessing.parent_process() is None:
+    # Processus démarrés avant les threads des jobs
+    stage_pool.start()
+    if config.ASYNC_JOBS and celery_app is None:
+        # Reprise des jobs restés en file lors d'un redémarrage
+        job_service.start()
+
+def _wants_async() -> bool:
+    """Mode asynchrone demandé par la requête (champ ou paramètre 'async') ou par défaut"""
+    value = request.form.get('async', request.args.get('async'))
+    if value is None:
+        return config.ASYNC_JOBS
+    return value.lower() in ('1', 'true', 'yes')
+
+def _job_accepted(job_id: str, session_id: str):
+    return jsonify({
+        'message': 'Traitement en cours',
+        'session_id': session_id,
+        'job_id': job_id,
+        'status_url': f'/api/jobs/{job_id}',
+        'events_url': f'/api/sessions/{session_id}/events'
+    }), 202
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Endpoint de santé de l'API"""
@@ -424,6 +616,7 @@ def health_check():
         return jsonify({
             'status': 'healthy' if db_health else 'degraded',
             'database': 'connected' if db_health else 'disconnected',
+            'dataframe_cache': dataframe_cache.stats(),
             'timestamp': datetime.now().isoformat()
         })
     except Exception as e:
@@ -433,6 +626,11 @@ def health_check():
             'timestamp': datetime.now().isoformat()
         }), 500
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Métriques au format texte Prometheus (étapes, endpoints, cache des DataFrames)"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/api/upload', methods=['POST'])
 @apply_rate_limit('upload')
 @handle_api_errors('upload')
@@ -456,7 +654,8 @@ def upload_file():
     timestamped_filename = f"{session_id}_{filename}"
     file_path = os.path.join(config.UPLOAD_FOLDER, timestamped_filename)
     
-    file.save(file_path)
+    # Écriture en flux avec calcul de l'empreinte (reprise d'un import identique)
+    content_hash = ingest_cache.save_upload(file, file_path)
     logger.info(f"Fichier sauvegardé: {file_path}")
     
     # Créer la session en base
@@ -468,49 +667,24 @@ def upload_file():
         status='uploaded'
     )
     
-    # Traitement du fichier
-    file_extension = os.path.splitext(filename)[1].lower()
-    success, result, headers, inventory_date = file_processor.validate_and_process_sage_file(
-        file_path, file_extension, session_creation_timestamp
-    )
-    
-    if not success:
-        session_service.update_session(session_id, status='error')
-        return jsonify({'error': result}), 400
-    
-    # Sauvegarder les données originales
-    session_service.save_dataframe(session_id, "original_df", result)
-    
-    # Agrégation des données
-    aggregated_df = file_processor.aggregate_data(result)
-    session_service.save_dataframe(session_id, "aggregated_df", aggregated_df)
-    
-    # Génération du template
-    template_path = file_processor.generate_template(aggregated_df, session_id, config.PROCESSED_FOLDER)
-    
-    # Mise à jour de la session
-    session_service.update_session(
-        session_id,
-        template_file_path=template_path,
-        inventory_date=inventory_date,
-        nb_articles=len(aggregated_df),
-        nb_lots=len(result),
-        total_quantity=float(result['QUANTITE'].sum()),
-        status='template_generated',
-        header_lines=json.dumps(headers)
-    )
-    
-    return jsonify({
-        'message': 'Fichier traité avec succès',
+    payload = {
         'session_id': session_id,
-        'template_url': f'/api/download/template/{session_id}',
-        'stats': {
-            'nb_articles': len(aggregated_df),
-            'total_quantity': float(result['QUANTITE'].sum()),
-            'nb_lots': len(result),
-            'inventory_date': inventory_date.isoformat() if inventory_date else None
-        }
-    })
+        'file_path': file_path,
+        'filename': filename,
+        'created_at': session_creation_timestamp.isoformat(),
+        'content_hash': content_hash,
+        'config_version': ingest_cache.config_version(),
+        'file_size': os.path.getsize(file_path)
+    }
+    
+    if _wants_async():
+        job_id = job_service.submit('upload', session_id, payload)
+        return _job_accepted(job_id, session_id)
+    
+    try:
+        return jsonify(run_upload_pipeline(payload))
+    except JobFailed as e:
+        return jsonify({'error': str(e)}), 400
 
 @app.route('/api/process', methods=['POST'])
 @apply_rate_limit('upload')
@@ -530,9 +704,15 @@ def process_completed_file():
     if file.filename == '':
         return jsonify({'error': 'Nom de fichier vide'}), 400
     
-    # Validation du fichier complété
+    # Lecture unique du template complété (validation, LOTECART et écarts)
     logger.info(f"Début validation fichier complété: {file.filename}")
-    is_valid, validation_message, validation_errors = file_processor.validate_completed_template(file)
+    try:
+        template = file_processor.parse_completed_template(file)
+    except Exception as read_error:
+        logger.error(f"Erreur lecture template complété: {read_error}")
+        return jsonify({'error': str(read_error), 'details': []}), 400
+    
+    is_valid, validation_message, validation_errors = template.validate()
     logger.info(f"Résultat validation: valid={is_valid}, message={validation_message}")
     
     if not is_valid:
@@ -542,102 +722,131 @@ def process_completed_file():
             'details': validation_errors
         }), 400
     
-    # Sauvegarde du fichier complété avec validation
+    # Sauvegarde du fichier complété et du DataFrame lu
     completed_filename = f"completed_{session_id}_{secure_filename(file.filename)}"
     completed_file_path = os.path.join(config.PROCESSED_FOLDER, completed_filename)
     
     try:
-        # Diagnostic du fichier avant sauvegarde
-        file.seek(0)
-        file_content = file.read()
-        file.seek(0)
-        
-        logger.info(f"Fichier reçu: {file.filename}, taille: {len(file_content)} bytes")
-        
-        # Sauvegarde avec gestion d'erreur améliorée
-        try:
-            file.save(completed_file_path)
-        except Exception as save_error:
-            logger.error(f"Erreur lors de la sauvegarde: {save_error}")
-            # Tentative de sauvegarde alternative
-            with open(completed_file_path, 'wb') as f:
-                f.write(file_content)
-            logger.info("Sauvegarde alternative réussie")
-        
-        # Vérifier que le fichier existe
-        if not os.path.exists(completed_file_path):
-            raise FileNotFoundError("Fichier non sauvegardé correctement")
-        
-        file_size = os.path.getsize(completed_file_path)
-        if file_size == 0:
-            raise ValueError("Fichier sauvegardé vide")
-        
-        logger.info(f"Fichier sauvegardé: {completed_file_path} ({file_size} bytes)")
-        
-        # Attendre un peu pour que le système de fichiers se synchronise
-        import time
-        time.sleep(0.1)
-        
-        # Test de lecture avec diagnostic détaillé
-        try:
-            # Essayer d'abord avec openpyxl
-            test_df = pd.read_excel(completed_file_path, engine='openpyxl', nrows=1)
-            logger.info(f"Fichier validé avec openpyxl: {len(test_df.columns)} colonnes")
-        except Exception as openpyxl_error:
-            logger.warning(f"Échec lecture avec openpyxl: {openpyxl_error}")
-            try:
-                # Essayer avec xlrd
-                test_df = pd.read_excel(completed_file_path, engine='xlrd', nrows=1)
-                logger.info(f"Fichier validé avec xlrd: {len(test_df.columns)} colonnes")
-            except Exception as xlrd_error:
-                logger.error(f"Échec lecture avec xlrd: {xlrd_error}")
-                
-                # Diagnostic avancé du fichier
-                try:
-                    import zipfile
-                    with zipfile.ZipFile(completed_file_path, 'r') as zip_ref:
-                        file_list = zip_ref.namelist()
-                        logger.info(f"Contenu ZIP du fichier Excel: {file_list}")
-                except Exception as zip_error:
-                    logger.error(f"Fichier n'est pas un ZIP valide: {zip_error}")
-                
-                # Supprimer le fichier corrompu
-                if os.path.exists(completed_file_path):
-                    os.remove(completed_file_path)
-                
-                raise ValueError(f"Fichier Excel corrompu. Erreurs: openpyxl={openpyxl_error}, xlrd={xlrd_error}")
-            
+        template.save(completed_file_path)
+        session_service.save_dataframe(session_id, "completed_df", template.df)
     except Exception as save_error:
         logger.error(f"Erreur sauvegarde fichier complété: {save_error}")
         return jsonify({'error': f'Erreur sauvegarde fichier: {save_error}'}), 500
     
-    # Traitement
-    discrepancies_df = processor.process_completed_file(session_id, completed_file_path)
-    distributed_df = processor.distribute_discrepancies(session_id, strategy)
-    final_file_path = processor.generate_final_file(session_id)
+    payload = {
+        'session_id': session_id,
+        'completed_file_path': completed_file_path,
+        'strategy': strategy,
+        'template_parsed': True
+    }
     
-    # Mise à jour de la session
-    session_service.update_session(
-        session_id,
-        completed_file_path=completed_file_path,
-        final_file_path=final_file_path
-    )
+    if _wants_async():
+        job_id = job_service.submit('process', session_id, payload)
+        return _job_accepted(job_id, session_id)
     
-    # Calcul des statistiques finales
-    total_discrepancy = distributed_df['AJUSTEMENT'].sum()
-    adjusted_items = len(distributed_df[distributed_df['AJUSTEMENT'] != 0])
+    return jsonify(run_process_pipeline(payload))
+
+@app.route('/api/distribute/<strategy>', methods=['POST'])
+@apply_rate_limit('upload')
+@handle_api_errors('redistribute')
+def redistribute(strategy):
+    """
+    Répartit à nouveau les écarts d'une session selon une autre stratégie
+
+    Les écarts et candidats LOTECART calculés par /api/process sont repris
+    tels quels : seuls la répartition et le fichier final sont recalculés,
+    sans renvoyer ni relire le template complété.
+    """
+    session_id = request.form.get('session_id', request.form.get('sessionId'))
+    if not session_id:
+        return jsonify({'error': 'ID de session manquant'}), 400
+    
+    strategy = strategy.upper()
+    if strategy not in DISTRIBUTION_STRATEGIES:
+        return jsonify({'error': f'Stratégie non supportée: {strategy}'}), 400
+    
+    if not session_service.get_session_data(session_id):
+        return jsonify({'error': 'Session non trouvée'}), 404
+    if not session_service.has_dataframe(session_id, "discrepancies_df"):
+        return jsonify({'error': 'Écarts non calculés pour cette session, traiter d\'abord le template complété'}), 409
+    
+    payload = {'session_id': session_id, 'strategy': strategy}
+    
+    if _wants_async():
+        job_id = job_service.submit('redistribute', session_id, payload)
+        return _job_accepted(job_id, session_id)
     
+    return jsonify(run_redistribute_pipeline(payload))
+
+@app.route('/api/sessions/<session_id>/compare', methods=['GET'])
+@apply_rate_limit('upload')
+@handle_api_errors('compare_strategies')
+def compare_strategies(session_id):
+    """
+    Compare les stratégies de répartition sur les écarts de la session
+
+    Paramètres : strategies (défaut FIFO,LIFO ; la première sert de
+    référence) et limit (nombre maximal de lots détaillés, défaut 500).
+    Lecture seule : ni la répartition ni le fichier final de la session
+    ne sont modifiés.
+    """
+    strategies = [s.strip().upper() for s in request.args.get('strategies', 'FIFO,LIFO').split(',') if s.strip()]
+    unsupported = [s for s in strategies if s not in DISTRIBUTION_STRATEGIES]
+    if len(strategies) < 2 or unsupported:
+        return jsonify({'error': f'Stratégies à comparer invalides: {unsupported or strategies}'}), 400
+    limit = request.args.get('limit', 500, type=int)
+    if limit < 0:
+        return jsonify({'error': 'Le paramètre limit doit être positif ou nul'}), 400
+    
+    if not session_service.get_session_data(session_id):
+        return jsonify({'error': 'Session non trouvée'}), 404
+    if not session_service.has_dataframe(session_id, "discrepancies_df"):
+        return jsonify({'error': 'Écarts non calculés pour cette session, traiter d\'abord le template complété'}), 409
+    
+    summary, lots = stage_pool.run(compare_stage, session_id, strategies, limit)
     return jsonify({
-        'message': 'Traitement terminé avec succès',
         'session_id': session_id,
-        'final_url': f'/api/download/final/{session_id}',
-        'stats': {
-            'total_discrepancy': float(total_discrepancy),
-            'adjusted_items': adjusted_items,
-            'strategy_used': strategy
-        }
+        'strategies': strategies,
+        'summary': summary,
+        'lots': lots
     })
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+@handle_api_errors('job_status')
+def get_job_status(job_id):
+    """Statut d'un job en arrière-plan et de chacune de ses étapes"""
+    job = job_service.get_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job non trouvé'}), 404
+    return jsonify(job)
+
+@app.route('/api/sessions/<session_id>/events', methods=['GET'])
+@handle_api_errors('session_events')
+def stream_session_events(session_id):
+    """
+    Flux Server-Sent Events de la progression d'une session
+
+    Événements : started, stage (started/completed avec nombre de lignes),
+    progress (lignes traitées en cours d'étape), completed (résultat) ou
+    failed (erreur). Sans Last-Event-ID, le dernier traitement est rejoué ;
+    le paramètre 'pipeline' (upload, process, redistribute) restreint le flux à un traitement.
+    """
+    if not session_service.get_session_data(session_id):
+        return jsonify({'error': 'Session non trouvée'}), 404
+    
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id'))
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return jsonify({'error': 'Last-Event-ID invalide'}), 400
+    
+    events = progress_service.stream(session_id, last_event_id, request.args.get('pipeline'))
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/api/download/<file_type>/<session_id>', methods=['GET'])
 @handle_api_errors('download')
 def download_file(file_type, session_id):
@@ -15,9 +15,43 @@ class Config:
     
     # Limites
     MAX_FILE_SIZE: int = int(os.getenv('MAX_FILE_SIZE', 16 * 1024 * 1024))  # 16MB
+    # Analyse des exports par lots de CHUNK_ROWS lignes S; (tampons d'analyse bornés)
+    CHUNK_ROWS: int = int(os.getenv('CHUNK_ROWS', 50000))
+    # Traitement parallèle par numéro d'inventaire (0 ou 1 worker : traitement en série)
+    PARTITION_WORKERS: int = int(os.getenv('PARTITION_WORKERS', 0))
+    PARTITION_MIN_ROWS: int = int(os.getenv('PARTITION_MIN_ROWS', 100000))
+    # Processus dédiés aux étapes lourdes (0 : exécution dans le worker de la requête)
+    STAGE_POOL_WORKERS: int = int(os.getenv('STAGE_POOL_WORKERS', 0))
     MAX_SESSIONS: int = int(os.getenv('MAX_SESSIONS', 100))
     SESSION_TIMEOUT: int = int(os.getenv('SESSION_TIMEOUT', 3600))  # 1 heure
     
+    # Cache mémoire des DataFrames de session (par processus)
+    DATAFRAME_CACHE_MAX_MB: int = int(os.getenv('DATAFRAME_CACHE_MAX_MB', 512))
+    DATAFRAME_CACHE_TTL: int = int(os.getenv('DATAFRAME_CACHE_TTL', 1800))  # 30 minutes
+    # Stockage des DataFrames de session : 'arrow' (Arrow IPC mappé en mémoire) ou 'parquet'
+    SESSION_STORAGE_FORMAT: str = os.getenv('SESSION_STORAGE_FORMAT', 'arrow')
+    # Reprise des données d'une session précédente pour un fichier identique (même empreinte, même configuration)
+    INGEST_CACHE_ENABLED: bool = os.getenv('INGEST_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    
+    # Jobs en arrière-plan (upload / traitement)
+    # Par défaut, upload/process/redistribute répondent 202 (job suivi sur /api/jobs/<id>) : les
+    # traitements longs ne dépassent pas le --timeout gunicorn ; async=false pour une réponse synchrone
+    ASYNC_JOBS: bool = os.getenv('ASYNC_JOBS', 'true').lower() in ('1', 'true', 'yes')
+    JOB_BROKER_URL: str = os.getenv('JOB_BROKER_URL', '')  # ex. redis://redis:6379/0, vide = file SQLite
+    JOB_WORKER_THREADS: int = int(os.getenv('JOB_WORKER_THREADS', 1))
+    JOB_POLL_INTERVAL: float = float(os.getenv('JOB_POLL_INTERVAL', 1.0))
+    # Job 'running' sans signal de vie depuis JOB_STALE_TIMEOUT secondes : remis en file
+    JOB_HEARTBEAT_INTERVAL: float = float(os.getenv('JOB_HEARTBEAT_INTERVAL', 30))
+    JOB_STALE_TIMEOUT: int = int(os.getenv('JOB_STALE_TIMEOUT', 300))
+    # Flux SSE de progression des sessions
+    PROGRESS_POLL_INTERVAL: float = float(os.getenv('PROGRESS_POLL_INTERVAL', 0.5))
+    PROGRESS_HEARTBEAT: float = float(os.getenv('PROGRESS_HEARTBEAT', 15))
+    # Durée maximale d'un flux SSE (le client se reconnecte) : inférieure au --timeout gunicorn (120 s)
+    PROGRESS_STREAM_TIMEOUT: float = float(os.getenv('PROGRESS_STREAM_TIMEOUT', 60))
+    # Métriques Prometheus : répertoire partagé entre les workers (vide = processus courant seulement)
+    METRICS_DIR: str = os.getenv('METRICS_DIR', '')
+    METRICS_FLUSH_INTERVAL: float = float(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+    
     # Sécurité
     SECRET_KEY: str = os.getenv('SECRET_KEY', 'une-cle-secrete-vraiment-aleatoire-et-difficile-a-deviner')
     ALLOWED_EXTENSIONS: set = field(default_factory=lambda: {'.csv', '.xlsx', '.xls'})
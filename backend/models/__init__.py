@@ -1,4 +1,7 @@
 from .session import Session
 from .inventory_item import InventoryItem
+from .job import Job
+from .ingest_cache import IngestCacheEntry
+from .progress_event import ProgressEvent
 
-__all__ = ['Session', 'InventoryItem']
\ No newline at end of file
+__all__ = ['Session', 'InventoryItem', 'Job', 'IngestCacheEntry', 'ProgressEvent']
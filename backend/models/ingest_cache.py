@@ -0,0 +1,20 @@
+from datetime import datetime
+from sqlalchemy import Column, String, DateTime, Integer
+from .session import Base
+
+class IngestCacheEntry(Base):
+    __tablename__ = 'ingest_cache'
+
+    # Empreinte SHA-256 du fichier importé et version de la configuration
+    content_hash = Column(String(64), primary_key=True)
+    config_version = Column(String(64), primary_key=True)
+    file_extension = Column(String(10), primary_key=True)
+
+    # Dernière session dont les données peuvent être reprises
+    session_id = Column(String(8), nullable=False)
+    file_size = Column(Integer)
+    hits = Column(Integer, default=0)
+
+    # Métadonnées
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,46 @@
+import json
+import uuid
+from datetime import datetime
+from sqlalchemy import Column, String, DateTime, Integer, Text
+from .session import Base
+
+class Job(Base):
+    __tablename__ = 'jobs'
+
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    job_type = Column(String(50), nullable=False)
+    session_id = Column(String(8), index=True)
+
+    # queued -> running -> completed | failed
+    status = Column(String(20), default='queued', index=True)
+    current_stage = Column(String(50))
+    attempts = Column(Integer, default=0)
+    worker = Column(String(100))
+
+    # Données sérialisées (JSON)
+    stages = Column(Text)   # [{"name", "status", "started_at", "finished_at"}]
+    payload = Column(Text)
+    result = Column(Text)
+    error = Column(Text)
+
+    # Métadonnées
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'job_type': self.job_type,
+            'session_id': self.session_id,
+            'status': self.status,
+            'current_stage': self.current_stage,
+            'stages': json.loads(self.stages) if self.stages else [],
+            'result': json.loads(self.result) if self.result else None,
+            'error': self.error,
+            'attempts': self.attempts,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
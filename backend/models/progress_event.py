@@ -0,0 +1,36 @@
+import json
+from datetime import datetime
+from sqlalchemy import Column, String, DateTime, Integer, Text
+from .session import Base
+
+class ProgressEvent(Base):
+    __tablename__ = 'progress_events'
+
+    # Identifiant croissant : sert d'identifiant d'événement SSE (Last-Event-ID)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    session_id = Column(String(8), nullable=False, index=True)
+
+    # Traitement (upload, process, redistribute), type d'événement et étape concernée
+    # started -> stage / progress -> completed | failed
+    pipeline = Column(String(50))
+    event = Column(String(20), nullable=False)
+    stage = Column(String(50))
+    rows = Column(Integer)
+
+    # Données complémentaires sérialisées (JSON) : statut d'étape, résultat, erreur
+    data = Column(Text)
+
+    # Métadonnées
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'session_id': self.session_id,
+            'pipeline': self.pipeline,
+            'event': self.event,
+            'stage': self.stage,
+            'rows': self.rows,
+            **(json.loads(self.data) if self.data else {}),
+            'timestamp': self.created_at.isoformat() if self.created_at else None
+        }
@@ -0,0 +1,51 @@
+import io
+import logging
+from typing import List, Tuple
+
+import pandas as pd
+
+from utils.validators import DataValidator
+
+logger = logging.getLogger(__name__)
+
+
+class CompletedTemplate:
+    """
+    Template complété, lu une seule fois à partir du fichier téléversé
+
+    Le contenu brut est conservé pour la sauvegarde sur disque et le
+    DataFrame lu sert à la validation, à la détection LOTECART et au calcul
+    des écarts, sans relecture du fichier.
+    """
+
+    def __init__(self, filename: str, content: bytes, df: pd.DataFrame):
+        self.filename = filename
+        self.content = content
+        self.df = df
+
+    @classmethod
+    def from_upload(cls, file, reader) -> "CompletedTemplate":
+        """
+        Lit le fichier téléversé (flux) avec reader(source) -> DataFrame
+
+        Lève ValueError si le fichier est vide ou illisible.
+        """
+        file.seek(0)
+        content = file.read()
+        if not content:
+            raise ValueError("Fichier vide")
+
+        logger.info(f"Template complété reçu: {file.filename}, taille: {len(content)} bytes")
+        df = reader(io.BytesIO(content))
+        logger.info(f"Template complété lu: {len(df)} lignes, {len(df.columns)} colonnes")
+        return cls(file.filename, content, df)
+
+    def validate(self) -> Tuple[bool, str, List[str]]:
+        """Valide les colonnes et quantités saisies"""
+        return DataValidator.validate_template_completion(self.df)
+
+    def save(self, path: str):
+        """Écrit le fichier d'origine sur disque"""
+        with open(path, "wb") as f:
+            f.write(self.content)
+        logger.info(f"Fichier sauvegardé: {path} ({len(self.content)} bytes)")
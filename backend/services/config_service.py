@@ -1,3 +1,5 @@
+import hashlib
+import json
 import yaml
 import os
 from typing import Dict, Any, List
@@ -95,6 +97,11 @@ class ConfigService:
         """Retourne l'ordre de priorité des types de lots"""
         return self._config.get('sage_x3', {}).get('lot_priority', ['type1', 'type2', 'type3', 'legacy', 'unknown'])
     
+    def get_config_version(self) -> str:
+        """Empreinte de la configuration chargée (change dès qu'une valeur change)"""
+        serialized = json.dumps(self._config, sort_keys=True, default=str)
+        return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+    
     def reload_config(self):
         """Recharge la configuration depuis le fichier"""
         self.load_config()
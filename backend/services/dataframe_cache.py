@@ -0,0 +1,136 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class DataFrameCache:
+    """
+    Cache mémoire des DataFrames de session, borné en octets
+
+    - taille de chaque entrée mesurée avec memory_usage(deep=True)
+    - éviction LRU dès que le budget est dépassé
+    - expiration des entrées non consultées depuis ttl secondes
+    - compteurs hits/misses/evictions pour le suivi
+    - version optionnelle par entrée (ex. date de modification du fichier)
+      pour ignorer une entrée réécrite par un autre worker
+
+    Les DataFrames sont stockés et retournés sans copie : ils sont partagés
+    entre les appelants et ne doivent pas être modifiés sur place.
+    """
+
+    def __init__(self, max_bytes: int, ttl: Optional[float] = None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # clé -> (DataFrame, taille en octets, dernier accès, version)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str, version: Any = None) -> Optional[pd.DataFrame]:
+        """Retourne le DataFrame en cache (None si absent, expiré ou d'une autre version)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            dataframe, size, last_access, entry_version = entry
+            now = time.monotonic()
+            expired = self.ttl is not None and now - last_access > self.ttl
+            if expired or (version is not None and version != entry_version):
+                self._remove(key)
+                self.evictions += int(expired)
+                self.misses += 1
+                return None
+
+            self._entries[key] = (dataframe, size, now, entry_version)
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dataframe
+
+    def put(self, key: str, dataframe: pd.DataFrame, version: Any = None):
+        """Ajoute (ou remplace) un DataFrame puis applique le budget mémoire"""
+        size = int(dataframe.memory_usage(deep=True).sum())
+        with self._lock:
+            self._remove(key)
+            if size > self.max_bytes:
+                logger.debug(f"DataFrame {key} trop volumineux pour le cache ({size} octets)")
+                return
+
+            self._entries[key] = (dataframe, size, time.monotonic(), version)
+            self.current_bytes += size
+            self._evict()
+
+    def invalidate(self, key: str):
+        """Retire une entrée du cache"""
+        with self._lock:
+            self._remove(key)
+
+    def invalidate_prefix(self, prefix: str):
+        """Retire toutes les entrées dont la clé commence par prefix"""
+        with self._lock:
+            for key in [k for k in self._entries if k.startswith(prefix)]:
+                self._remove(key)
+
+    def clear(self):
+        """Vide le cache"""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """Statistiques d'utilisation du cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "current_bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry[1]
+
+    def _evict(self):
+        """Expire les entrées trop anciennes puis les moins récemment utilisées"""
+        if self.ttl is not None:
+            cutoff = time.monotonic() - self.ttl
+            for key in [k for k, entry in self._entries.items() if entry[2] < cutoff]:
+                self._remove(key)
+                self.evictions += 1
+
+        while self.current_bytes > self.max_bytes and self._entries:
+            key, entry = self._entries.popitem(last=False)
+            self.current_bytes -= entry[1]
+            self.evictions += 1
+            logger.debug(f"DataFrame {key} évincé du cache")
+
+
+# Instance globale, partagée par tous les services du processus
+dataframe_cache = DataFrameCache(
+    max_bytes=config.DATAFRAME_CACHE_MAX_MB * 1024 * 1024,
+    ttl=config.DATAFRAME_CACHE_TTL or None,
+)
@@ -0,0 +1,221 @@
+import logging
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+GROUP_KEYS = ["CODE_ARTICLE", "NUMERO_INVENTAIRE"]
+# Numéro entier de la clé (article, inventaire), s'il est présent
+GROUP_ID = "KEY_ID"
+LOT_ORDER_KEYS = ["Date_Lot", "NUMERO_LOT"]
+# Stratégies comparables en une passe (un seul tri, ordre FIFO)
+COMPARABLE_STRATEGIES = ["FIFO", "LIFO"]
+# Colonnes d'identification des lots reprises dans la comparaison
+COMPARISON_COLUMNS = [
+    "CODE_ARTICLE", "NUMERO_INVENTAIRE", "NUMERO_LOT", "Date_Lot", "TYPE_LOT",
+    "QUANTITE_ORIGINALE", "QUANTITE_REELLE_SAISIE_TOTALE", "ROW_ID", "KEY_ID",
+]
+# Écart de quantité corrigée en deçà duquel deux stratégies sont considérées identiques
+DELTA_TOLERANCE = 1e-9
+
+
+class DistributionEngine:
+    """
+    Répartition vectorisée des écarts d'inventaire sur les lots (FIFO/LIFO)
+
+    Les lots sont triés une seule fois pour toutes les paires
+    (article, inventaire). Pour chaque lot, l'ajustement vaut :
+
+        signe(écart) * min(quantité du lot, max(|écart| - cumul des lots précédents, 0))
+
+    ce qui reproduit la consommation lot par lot de l'écart : un lot n'est
+    jamais ajusté de plus que sa quantité d'origine, et la part qui ne peut
+    pas être répartie est signalée par article.
+    """
+
+    def distribute(
+        self, discrepancies_df: pd.DataFrame, strategy: str = "FIFO", executor=None
+    ) -> pd.DataFrame:
+        """
+        Calcule AJUSTEMENT, QUANTITE_CORRIGEE et QUANTITE_REELLE_SAISIE
+
+        Args:
+            discrepancies_df: écarts par lot (une ligne par lot original)
+            strategy: 'FIFO' (lots les plus anciens d'abord), 'LIFO' (plus
+                récents d'abord) ou autre valeur (ordre d'origine)
+            executor: PartitionExecutor ; les inventaires d'une session
+                multi-inventaires sont alors répartis en parallèle
+
+        Returns:
+            DataFrame trié par article, inventaire puis ordre de consommation,
+            en conservant l'index d'origine des lignes
+        """
+        partitions = executor.partitions(discrepancies_df) if executor is not None else None
+        if partitions:
+            # Un groupe (article, inventaire) est entier dans sa partition : le
+            # tri stable par clés redonne exactement l'ordre du calcul en série
+            distributed = executor.map(distribute_partition, partitions, strategy)
+            return pd.concat(distributed).sort_values(GROUP_KEYS, kind="stable")
+
+        df = discrepancies_df.dropna(subset=GROUP_KEYS)
+
+        if strategy == "FIFO":
+            df = df.sort_values(GROUP_KEYS + LOT_ORDER_KEYS, na_position="last")
+        elif strategy == "LIFO":
+            df = df.sort_values(
+                GROUP_KEYS + LOT_ORDER_KEYS,
+                ascending=[True, True, False, False],
+                na_position="first",
+            )
+        else:
+            df = df.sort_values(GROUP_KEYS, kind="stable")
+
+        df = df.copy()
+        if df.empty:
+            df["QUANTITE_REELLE_SAISIE"] = pd.Series(dtype="float64")
+            return df
+
+        # Regroupement sur le numéro de clé (entier) plutôt que sur les chaînes
+        group_keys = [GROUP_ID] if GROUP_ID in df.columns else GROUP_KEYS
+        quantities = pd.to_numeric(df["QUANTITE_ORIGINALE"]).astype("float64")
+        grouped = quantities.groupby([df[key] for key in group_keys], sort=False)
+
+        total_quantities = grouped.transform("sum")
+        real_quantities = pd.to_numeric(
+            df.groupby(group_keys, sort=False)["QUANTITE_REELLE_SAISIE_TOTALE"].transform("first")
+        ).astype("float64")
+        ecarts = real_quantities - total_quantities
+
+        # Écart encore disponible au moment de traiter chaque lot
+        consumed_before = grouped.cumsum() - quantities
+        remaining = (ecarts.abs() - consumed_before).clip(lower=0)
+        adjustments = np.sign(ecarts) * np.minimum(remaining, quantities)
+
+        df["AJUSTEMENT"] = adjustments
+        df["QUANTITE_CORRIGEE"] = quantities + adjustments
+        df["QUANTITE_REELLE_SAISIE"] = real_quantities
+
+        self._log_undistributed(df, ecarts, total_quantities)
+
+        logger.info(
+            f"📊 Répartition {strategy}: {grouped.ngroups} articles, {len(df)} lots, "
+            f"{int((adjustments != 0).sum())} lots ajustés"
+        )
+        return df
+
+    def compare(self, discrepancies_df: pd.DataFrame, strategies=("FIFO", "LIFO")) -> pd.DataFrame:
+        """
+        Répartition simultanée selon plusieurs stratégies, sans fichier final
+
+        Les lots sont triés une seule fois (ordre FIFO). L'ordre LIFO est
+        l'ordre FIFO dont les blocs de lots de même (date, numéro) sont
+        inversés dans chaque article : l'écart consommé avant un lot se
+        déduit des cumuls du tri FIFO (lots des blocs suivants + lots qui le
+        précèdent dans son bloc), ce qui reproduit exactement distribute().
+
+        Returns:
+            Une ligne par lot (ordre FIFO, index d'origine) avec, pour chaque
+            stratégie, AJUSTEMENT_<stratégie> et QUANTITE_CORRIGEE_<stratégie>,
+            puis DELTA_<stratégie> : quantité corrigée moins celle de la
+            première stratégie (référence)
+        """
+        strategies = [strategy.upper() for strategy in strategies]
+        unknown = [strategy for strategy in strategies if strategy not in COMPARABLE_STRATEGIES]
+        if unknown or not strategies:
+            raise ValueError(f"Stratégies non comparables: {unknown or strategies}")
+
+        df = discrepancies_df.dropna(subset=GROUP_KEYS).sort_values(
+            GROUP_KEYS + LOT_ORDER_KEYS, na_position="last"
+        )
+        comparison = df[[name for name in COMPARISON_COLUMNS if name in df.columns]].copy()
+
+        group_keys = [GROUP_ID] if GROUP_ID in df.columns else GROUP_KEYS
+        quantities = pd.to_numeric(df["QUANTITE_ORIGINALE"]).astype("float64")
+        grouped = quantities.groupby([df[key] for key in group_keys], sort=False)
+
+        total_quantities = grouped.transform("sum")
+        real_quantities = pd.to_numeric(
+            df.groupby(group_keys, sort=False)["QUANTITE_REELLE_SAISIE_TOTALE"].transform("first")
+        ).astype("float64")
+        ecarts = real_quantities - total_quantities
+
+        # Cumul des lots précédents dans l'ordre FIFO
+        consumed_before = grouped.cumsum() - quantities
+        consumed = {"FIFO": consumed_before}
+        if "LIFO" in strategies:
+            blocks = [df[key] for key in group_keys + LOT_ORDER_KEYS]
+            block_start = consumed_before.groupby(blocks, sort=False, dropna=False).transform("first")
+            block_end = (consumed_before + quantities).groupby(blocks, sort=False, dropna=False).transform("last")
+            consumed["LIFO"] = (total_quantities - block_end) + (consumed_before - block_start)
+
+        for strategy in strategies:
+            remaining = (ecarts.abs() - consumed[strategy]).clip(lower=0)
+            adjustments = np.sign(ecarts) * np.minimum(remaining, quantities)
+            comparison[f"AJUSTEMENT_{strategy}"] = adjustments
+            comparison[f"QUANTITE_CORRIGEE_{strategy}"] = quantities + adjustments
+
+        reference = strategies[0]
+        for strategy in strategies[1:]:
+            comparison[f"DELTA_{strategy}"] = (
+                comparison[f"QUANTITE_CORRIGEE_{strategy}"] - comparison[f"QUANTITE_CORRIGEE_{reference}"]
+            )
+
+        logger.info(
+            f"📊 Comparaison {'/'.join(strategies)}: {grouped.ngroups} articles, {len(df)} lots"
+        )
+        return comparison
+
+    def summarize_comparison(self, comparison: pd.DataFrame, strategies=("FIFO", "LIFO")) -> dict:
+        """
+        Synthèse d'une comparaison : totaux par stratégie et écarts à la référence
+
+        Pour chaque stratégie autre que la première : lots et articles dont la
+        quantité corrigée change, et quantité déplacée d'un lot à l'autre.
+        """
+        strategies = [strategy.upper() for strategy in strategies]
+        summary = {
+            "reference": strategies[0],
+            "lots": len(comparison),
+            "strategies": {},
+            "deltas": {},
+        }
+        for strategy in strategies:
+            adjustments = comparison[f"AJUSTEMENT_{strategy}"]
+            summary["strategies"][strategy] = {
+                "adjusted_lots": int((adjustments != 0).sum()),
+                "total_adjustment": float(adjustments.sum()),
+                "total_corrected_quantity": float(comparison[f"QUANTITE_CORRIGEE_{strategy}"].sum()),
+            }
+        for strategy in strategies[1:]:
+            deltas = comparison[f"DELTA_{strategy}"]
+            changed = deltas.abs() > DELTA_TOLERANCE
+            summary["deltas"][strategy] = {
+                "lots_changed": int(changed.sum()),
+                "articles_changed": int(len(comparison.loc[changed, GROUP_KEYS].drop_duplicates())),
+                "quantity_shifted": float(deltas.clip(lower=0).sum()),
+            }
+        return summary
+
+    def _log_undistributed(
+        self, df: pd.DataFrame, ecarts: pd.Series, total_quantities: pd.Series
+    ):
+        """Signale les articles dont l'écart dépasse la capacité des lots"""
+        leftovers = np.sign(ecarts) * (ecarts.abs() - total_quantities).clip(lower=0)
+        # Tolérance pour les erreurs d'arrondi
+        mask = leftovers.abs() > 0.01
+        if not mask.any():
+            return
+
+        first_rows = ~df.duplicated(subset=GROUP_KEYS) & mask
+        for code_article, leftover in zip(
+            df.loc[first_rows, "CODE_ARTICLE"], leftovers[first_rows]
+        ):
+            logger.warning(f"⚠️ Écart non complètement distribué pour {code_article}: {leftover}")
+
+
+def distribute_partition(discrepancies_df: pd.DataFrame, strategy: str) -> pd.DataFrame:
+    """Répartition d'une partition (fonction de module, exécutée dans le pool de processus)"""
+    return distribution_engine.distribute(discrepancies_df, strategy)
+
+
+distribution_engine = DistributionEngine()
@@ -4,12 +4,73 @@ import openpyxl
 from datetime import datetime, date
 import re
 import logging
-from typing import Tuple, Dict, List, Union
+from contextlib import nullcontext
+from typing import Callable, Tuple, Dict, List, Optional, Union
+from config import config
 from utils.validators import FileValidator, DataValidator
 from services.config_service import config_service
+from services.sage_parser import SageStreamParser, SageParseResult
+from services.xlsx_reader import XlsxReader, XlsxReadError, read_xlsx_table
+from services.xlsx_writer import write_xlsx_table
+from services.lot_index import KEY_ID_COLUMN, TEMPLATE_KEY_COLUMN
+from services.line_store import LineStore, LineStoreWriter, LINE_OFFSET_COLUMN, LINE_LENGTH_COLUMN
+from services.completed_template import CompletedTemplate
+from services.frame_schema import LOT_TYPE_PRIORITY, LOT_TYPE_DTYPE, apply_schema
+from services.partition_executor import PartitionExecutor
 
 logger = logging.getLogger(__name__)
 
+# Rang de tri des articles agrégés (types absents : 4)
+LOT_TYPE_SORT_RANK = {"type1": 1, "type2": 2, "lotecart": 3}
+
+# Colonnes du template d'inventaire (seules colonnes lues dans le template complété)
+COMPLETED_TEMPLATE_COLUMNS = [
+    "Numéro Session",
+    "Numéro Inventaire",
+    "Code Article",
+    "Statut Article",
+    "Quantité Théorique",
+    "Quantité Réelle",
+    "Unites",
+    "Depots",
+    "Emplacements",
+    TEMPLATE_KEY_COLUMN,
+]
+
+
+def aggregate_lots(rows: pd.DataFrame, keys: List[str], with_key_ids: bool) -> pd.DataFrame:
+    """
+    Agrégat des lots par clés (index = clés)
+
+    Fonction de module : exécutable dans un processus du pool de partitions.
+    """
+    key_ids = {KEY_ID_COLUMN: (KEY_ID_COLUMN, "first")} if with_key_ids else {}
+    # Type de lot en catégoriel ordonné : le type prioritaire d'un groupe est son minimum
+    lots = rows[keys + ["QUANTITE", "NUMERO_SESSION", "SITE"] + list(key_ids)].assign(
+        Date_Lot=pd.to_datetime(rows["Date_Lot"], errors="coerce"),
+        Type_Lot=rows["Type_Lot"].astype(LOT_TYPE_DTYPE),
+    )
+    return lots.groupby(keys, observed=True).agg(
+        Quantite_Theorique_Totale=("QUANTITE", "sum"),
+        Numero_Session=("NUMERO_SESSION", "first"),
+        Site=("SITE", "first"),
+        Date_Min=("Date_Lot", "min"),
+        Type_Lot_Prioritaire=("Type_Lot", "min"),
+        **key_ids,
+    )
+
+
+def merge_partial_aggregates(partials: pd.DataFrame, keys: List[str], with_key_ids: bool) -> pd.DataFrame:
+    """Fusionne des agrégats partiels (concaténés, dans l'ordre des lignes) comme une agrégation unique"""
+    return partials.groupby(level=keys, observed=True).agg(
+        Quantite_Theorique_Totale=("Quantite_Theorique_Totale", "sum"),
+        Numero_Session=("Numero_Session", "first"),
+        Site=("Site", "first"),
+        Date_Min=("Date_Min", "min"),
+        Type_Lot_Prioritaire=("Type_Lot_Prioritaire", "min"),
+        **({KEY_ID_COLUMN: (KEY_ID_COLUMN, "first")} if with_key_ids else {}),
+    )
+
 
 class FileProcessorService:
     """Service pour le traitement des fichiers Sage X3"""
@@ -22,10 +83,10 @@ class FileProcessorService:
         self.processing_config = config_service.get_processing_config()
         self.lot_patterns = config_service.get_lot_patterns()
 
-        # Référence au service de session pour accéder aux DataFrames sauvegardés
-        from services.session_service import SessionService
+        # Service de session partagé (un seul cache de DataFrames par processus)
+        from services.session_service import session_service
 
-        self.session_service = SessionService()
+        self.session_service = session_service
 
         # Patterns pour les différents types de lots (depuis la configuration)
         self.LOT_PATTERNS = {
@@ -54,63 +115,6 @@ class FileProcessorService:
         self.lot_patterns = config_service.get_lot_patterns()
         logger.info("Configuration rechargée depuis le fichier externe")
 
-    def validate_completed_template(self, file) -> Tuple[bool, str, List[str]]:
-        """Valide le fichier template complété"""
-        try:
-            # Vérifier l'extension
-            filename = file.filename
-            if not filename.lower().endswith(('.xlsx', '.xls')):
-                return False, "Format de fichier non supporté. Utilisez Excel (.xlsx ou .xls)", []
-            
-            # Lire le contenu du fichier en mémoire
-            file.seek(0)
-            file_content = file.read()
-            file.seek(0)  # Remettre le curseur au début
-            
-            if len(file_content) == 0:
-                return False, "Fichier vide", []
-            
-            logger.info(f"Validation fichier: {filename}, taille: {len(file_content)} bytes")
-            
-            # Vérifier que c'est un fichier ZIP valide (Excel = ZIP)
-            import zipfile
-            import io
-            try:
-                with zipfile.ZipFile(io.BytesIO(file_content), 'r') as zip_ref:
-                    file_list = zip_ref.namelist()
-                    # Vérifier la présence de fichiers Excel essentiels
-                    required_excel_files = ['xl/workbook.xml', '[Content_Types].xml']
-                    missing_files = [f for f in required_excel_files if f not in file_list]
-                    if missing_files:
-                        return False, f"Fichier Excel invalide, fichiers manquants: {missing_files}", []
-            except zipfile.BadZipFile:
-                return False, "Fichier Excel corrompu (pas un ZIP valide)", []
-            
-            # Tester la lecture avec pandas
-            try:
-                df = pd.read_excel(io.BytesIO(file_content), engine='openpyxl')
-                logger.info(f"Lecture réussie: {len(df)} lignes, {len(df.columns)} colonnes")
-            except Exception as pandas_error:
-                logger.error(f"Erreur lecture pandas: {pandas_error}")
-                return False, f"Erreur lecture fichier Excel: {pandas_error}", []
-            
-            # Vérifier les colonnes requises
-            required_columns = ['Code Article', 'Numéro Inventaire', 'Quantité Théorique', 'Quantité Réelle']
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            
-            if missing_columns:
-                return False, f"Colonnes manquantes: {', '.join(missing_columns)}", missing_columns
-            
-            # Vérifier qu'il y a des données
-            if df.empty:
-                return False, "Le fichier ne contient aucune donnée", []
-            
-            return True, "Fichier valide", []
-                    
-        except Exception as e:
-            logger.error(f"Erreur validation template complété: {e}")
-            return False, f"Erreur validation: {e}", []
-
     def detect_file_format(self, filepath: str) -> Tuple[bool, str, Dict]:
         """Détecte automatiquement le format du fichier et sa structure"""
         try:
@@ -184,10 +188,23 @@ class FileProcessorService:
             return False, str(e), {}
 
     def validate_and_process_sage_file(
-        self, filepath: str, file_extension: str, session_creation_timestamp: datetime
+        self,
+        filepath: str,
+        file_extension: str,
+        session_creation_timestamp: datetime,
+        line_store: Optional[LineStore] = None,
+        progress: Optional[Callable[[int], None]] = None,
     ) -> Tuple[bool, Union[str, pd.DataFrame], List[str], Union[date, None]]:
         """
         Valide et traite un fichier Sage X3
+
+        Avec line_store, les lignes brutes sont écrites dans le fichier de la
+        session au fil de l'analyse (colonnes LINE_OFFSET/LINE_LENGTH au lieu
+        de original_s_line_raw). Les lignes S; sont converties par lots de
+        CHUNK_ROWS lignes : les tampons Python de l'analyse (chaînes par
+        colonne, lignes brutes) restent bornés quelle que soit la taille du
+        fichier. progress(lignes) est appelé après chaque lot converti avec
+        le nombre de lignes S; lues.
         """
         try:
             # Validation sécurisée du fichier
@@ -197,7 +214,7 @@ class FileProcessorService:
 
             # Validation de la taille du fichier
             file_size = os.path.getsize(filepath)
-            max_size = 16 * 1024 * 1024  # 16MB
+            max_size = config.MAX_FILE_SIZE
             if file_size > max_size:
                 return (
                     False,
@@ -209,34 +226,27 @@ class FileProcessorService:
             if file_size == 0:
                 return False, "Fichier vide", [], None
 
-            headers = []
-            data_rows = []
-            original_s_lines_raw = []
-            first_s_line_numero_inventaire = None
-
             expected_num_cols_for_data = len(self.SAGE_COLUMN_NAMES_ORDERED)
 
-            if file_extension == ".csv":
-                success, data, headers, inventory_date = self._process_csv_file(
-                    filepath, expected_num_cols_for_data, session_creation_timestamp
-                )
-            elif file_extension in [".xlsx", ".xls"]:
-                success, data, headers, inventory_date = self._process_xlsx_file(
-                    filepath, expected_num_cols_for_data, session_creation_timestamp
-                )
-            else:
-                return False, "Extension de fichier non supportée", [], None
+            with line_store.open_writer() if line_store else nullcontext() as line_writer:
+                if file_extension == ".csv":
+                    parser = self._new_parser("csv", config.CHUNK_ROWS, line_writer, progress)
+                    success, data, headers, inventory_date = self._process_csv_file(
+                        filepath, expected_num_cols_for_data, session_creation_timestamp, parser
+                    )
+                elif file_extension in [".xlsx", ".xls"]:
+                    parser = self._new_parser("xlsx", config.CHUNK_ROWS, line_writer, progress)
+                    success, data, headers, inventory_date = self._process_xlsx_file(
+                        filepath, expected_num_cols_for_data, session_creation_timestamp, parser
+                    )
+                else:
+                    return False, "Extension de fichier non supportée", [], None
 
+            # Les contrôles métier (quantités, codes articles) sont faits
+            # pendant l'analyse par SageStreamParser
             if not success:
                 return False, data, [], None
 
-            # Validation des données métier
-            is_valid, validation_msg = DataValidator.validate_sage_structure(
-                data, self.SAGE_COLUMNS
-            )
-            if not is_valid:
-                return False, validation_msg, [], None
-
             return True, data, headers, inventory_date
 
         except Exception as e:
@@ -248,62 +258,46 @@ class FileProcessorService:
             )
             return False, sanitized_error, [], None
 
+    def _new_parser(
+        self,
+        source: str,
+        chunk_rows: Optional[int] = None,
+        line_writer: Optional[LineStoreWriter] = None,
+        progress: Optional[Callable[[int], None]] = None,
+    ) -> SageStreamParser:
+        """Analyseur dont les lots sont convertis (et leurs lignes brutes stockées) au fil de l'eau"""
+        if chunk_rows is None and line_writer is None:
+            return SageStreamParser(self.SAGE_COLUMNS, source=source)
+
+        parsed_rows = 0
+
+        def handle_batch(df: pd.DataFrame, lines: List[str]) -> pd.DataFrame:
+            nonlocal parsed_rows
+            batch = self._process_dataframe(df, lines, line_writer)
+            parsed_rows += len(batch)
+            if progress is not None:
+                progress(parsed_rows)
+            return batch
+
+        return SageStreamParser(
+            self.SAGE_COLUMNS,
+            source=source,
+            batch_rows=chunk_rows,
+            batch_handler=handle_batch,
+        )
+
     def _process_csv_file(
-        self, filepath: str, expected_cols: int, session_timestamp: datetime
+        self,
+        filepath: str,
+        expected_cols: int,
+        session_timestamp: datetime,
+        parser: Optional[SageStreamParser] = None,
     ) -> Tuple[bool, Union[str, pd.DataFrame], List[str], Union[date, None]]:
-        """Traite un fichier CSV"""
-        headers = []
-        data_rows = []
-        original_s_lines_raw = []
-        first_s_line_numero_inventaire = None
-
+        """Traite un fichier CSV en une seule passe (analyse + validation)"""
         try:
-            with open(filepath, "r", encoding="utf-8") as f:
-                for i, line in enumerate(f):
-                    line = line.strip()
-                    if not line:
-                        continue
-
-                    if line.startswith("E;") or line.startswith("L;"):
-                        headers.append(line)
-                    elif line.startswith("S;"):
-                        parts = line.split(";")
-
-                        if len(parts) < expected_cols:
-                            return (
-                                False,
-                                f"Ligne {i+1} : Format invalide. {expected_cols} colonnes requises.",
-                                [],
-                                None,
-                            )
-
-                        if first_s_line_numero_inventaire is None:
-                            first_s_line_numero_inventaire = parts[
-                                self.SAGE_COLUMNS["NUMERO_INVENTAIRE"]
-                            ]
-
-                        processed_parts = parts[:expected_cols]
-                        if len(processed_parts) < expected_cols:
-                            processed_parts.extend(
-                                [""] * (expected_cols - len(processed_parts))
-                            )
-
-                        data_rows.append(processed_parts)
-                        original_s_lines_raw.append(";".join(processed_parts))
-
-            if not data_rows:
-                return False, "Aucune donnée S; trouvée", [], None
-
-            # Créer le DataFrame
-            df = pd.DataFrame(data_rows, columns=self.SAGE_COLUMN_NAMES_ORDERED)
-            df = self._process_dataframe(df, original_s_lines_raw)
-
-            # Extraire la date d'inventaire
-            inventory_date = self._extract_inventory_date(
-                first_s_line_numero_inventaire, session_timestamp
-            )
-
-            return True, df, headers, inventory_date
+            parser = parser or SageStreamParser(self.SAGE_COLUMNS, source="csv")
+            result = parser.parse_csv(filepath)
+            return self._finalize_parse_result(result, session_timestamp)
 
         except Exception as e:
             logger.error(f"Erreur traitement CSV: {e}")
@@ -315,16 +309,34 @@ class FileProcessorService:
             return False, sanitized_error, [], None
 
     def _process_xlsx_file(
-        self, filepath: str, expected_cols: int, session_timestamp: datetime
+        self,
+        filepath: str,
+        expected_cols: int,
+        session_timestamp: datetime,
+        parser: Optional[SageStreamParser] = None,
     ) -> Tuple[bool, Union[str, pd.DataFrame], List[str], Union[date, None]]:
         """Traite un fichier XLSX"""
-        headers = []
-        data_rows = []
-        original_s_lines_raw = []
-        first_s_line_numero_inventaire = None
-
         try:
-            # Lecture du fichier Excel avec gestion d'erreurs améliorée
+            max_col = max(self.SAGE_COLUMNS.values()) + 1
+            parser = parser or SageStreamParser(self.SAGE_COLUMNS, source="xlsx")
+
+            try:
+                reader = XlsxReader(filepath)
+            except XlsxReadError as e:
+                logger.warning(f"Lecteur XLSX natif non applicable ({e}), repli sur pandas")
+                reader = None
+
+            if reader is not None:
+                # Les lignes de la feuille alimentent directement l'analyseur
+                with reader:
+                    rows = (
+                        ["" if val is None else str(val).strip() for val in row]
+                        for row in reader.iter_rows(width=max_col)
+                    )
+                    result = parser.parse_rows(rows)
+                return self._finalize_parse_result(result, session_timestamp)
+
+            # Anciens formats (.xls) : lecture complète via pandas
             try:
                 temp_df = pd.read_excel(
                     filepath, header=None, dtype=str, engine="openpyxl"
@@ -346,74 +358,12 @@ class FileProcessorService:
                     )
 
             logger.info(f"Fichier Excel lu avec succès. Dimensions: {temp_df.shape}")
-            logger.info(f"Premières lignes du fichier:")
-            for i, row in temp_df.head(5).iterrows():
-                logger.info(f"Ligne {i}: {list(row.values)}")
-
-            for i, row_series in temp_df.iterrows():
-                parts = [
-                    str(val).strip() if pd.notna(val) else ""
-                    for val in row_series.iloc[: max(self.SAGE_COLUMNS.values()) + 1]
-                ]
-
-                if not parts:
-                    continue
-
-                line_type = (
-                    parts[self.SAGE_COLUMNS["TYPE_LIGNE"]]
-                    if len(parts) > self.SAGE_COLUMNS["TYPE_LIGNE"]
-                    else ""
-                )
-                logger.debug(
-                    f"Ligne {i+1}: Type='{line_type}', Colonnes={len(parts)}, Contenu: {parts[:5]}..."
-                )
-
-                if line_type in ["E", "L"]:
-                    headers.append(";".join(parts))
-                elif line_type == "S":
-                    if len(parts) < expected_cols:
-                        logger.error(
-                            f"Ligne {i+1} (S;): Format invalide. {expected_cols} colonnes requises, {len(parts)} trouvées."
-                        )
-                        logger.error(f"Contenu de la ligne: {parts}")
-                        return (
-                            False,
-                            f"Ligne {i+1} (S;): Format invalide. {expected_cols} colonnes requises, {len(parts)} trouvées.",
-                            [],
-                            None,
-                        )
-
-                    processed_parts = parts[:expected_cols]
-                    if len(processed_parts) < expected_cols:
-                        processed_parts.extend(
-                            [""] * (expected_cols - len(processed_parts))
-                        )
-
-                    if first_s_line_numero_inventaire is None:
-                        first_s_line_numero_inventaire = processed_parts[
-                            self.SAGE_COLUMNS["NUMERO_INVENTAIRE"]
-                        ]
-
-                    data_rows.append(processed_parts)
-                    original_s_lines_raw.append(";".join(processed_parts))
-
-            if not data_rows:
-                return False, "Aucune donnée S; trouvée dans le fichier XLSX", [], None
-
-            logger.info(
-                f"Traitement terminé. {len(data_rows)} lignes de données S; trouvées."
-            )
-
-            # Créer le DataFrame
-            df = pd.DataFrame(data_rows, columns=self.SAGE_COLUMN_NAMES_ORDERED)
-            df = self._process_dataframe(df, original_s_lines_raw)
-
-            # Extraire la date d'inventaire
-            inventory_date = self._extract_inventory_date(
-                first_s_line_numero_inventaire, session_timestamp
+            rows = (
+                [str(val).strip() if pd.notna(val) else "" for val in row[:max_col]]
+                for row in temp_df.itertuples(index=False, name=None)
             )
-
-            return True, df, headers, inventory_date
+            result = parser.parse_rows(rows)
+            return self._finalize_parse_result(result, session_timestamp)
 
         except Exception as e:
             logger.error(f"Erreur traitement XLSX: {e}")
@@ -424,25 +374,97 @@ class FileProcessorService:
             )
             return False, sanitized_error, [], None
 
+    def _finalize_parse_result(
+        self, result: SageParseResult, session_timestamp: datetime
+    ) -> Tuple[bool, Union[str, pd.DataFrame], List[str], Union[date, None]]:
+        """Transforme le résultat de l'analyseur en DataFrame de session"""
+        if not result.success:
+            logger.warning(f"Analyse du fichier en échec: {result.errors}")
+            return False, result.error_message, [], None
+
+        if result.batches:
+            # Lots déjà convertis ; les catégories diffèrent d'un lot à l'autre
+            df = apply_schema(result.dataframe, "original_df") if result.batches > 1 else result.dataframe
+        else:
+            df = self._process_dataframe(result.dataframe, result.raw_lines)
+
+        # Extraire la date d'inventaire
+        inventory_date = self._extract_inventory_date(
+            result.first_numero_inventaire, session_timestamp
+        )
+
+        return True, df, result.headers, inventory_date
+
     def _process_dataframe(
-        self, df: pd.DataFrame, original_lines: List[str]
+        self,
+        df: pd.DataFrame,
+        original_lines: List[str],
+        line_writer: Optional[LineStoreWriter] = None,
     ) -> pd.DataFrame:
-        """Traite le DataFrame après création"""
+        """Traite le DataFrame après création (ou un lot de l'analyse)"""
         # Conversion des types
         df["QUANTITE"] = pd.to_numeric(df["QUANTITE"], errors="coerce")
 
-        # Extraction des dates de lot et détection LOTECART
-        lot_info = df["NUMERO_LOT"].apply(self._extract_date_from_lot)
-        df["Date_Lot"] = lot_info.apply(lambda x: x[0] if x else None)
-        df["Type_Lot"] = lot_info.apply(lambda x: x[1] if x else "unknown")
+        # Extraction des dates de lot (classification par colonne)
+        df["Date_Lot"], df["Type_Lot"] = self._classify_lots(df["NUMERO_LOT"])
 
         # Pré-marquer les lignes avec quantité = 0 comme potentiels LOTECART
         # Ne pas pré-marquer ici, la détection LOTECART se fait lors du traitement du template complété
 
-        # Ajout des lignes originales
-        df["original_s_line_raw"] = original_lines
+        # Ajout des lignes originales (ou de leur position dans le fichier de la session)
+        if line_writer is not None:
+            df[LINE_OFFSET_COLUMN], df[LINE_LENGTH_COLUMN] = line_writer.append(original_lines)
+        else:
+            df["original_s_line_raw"] = original_lines
+
+        # Types compacts (catégoriels pour les colonnes de faible cardinalité)
+        return apply_schema(df, "original_df")
+
+    def _classify_lots(self, lot_numbers: pd.Series) -> Tuple[pd.Series, pd.Series]:
+        """
+        Version vectorisée de _extract_date_from_lot pour une colonne entière
+        Retourne (Date_Lot en datetime64, Type_Lot en catégoriel)
+        """
+        index = lot_numbers.index
+        lot_numbers = lot_numbers.reset_index(drop=True)
+        lots = lot_numbers.astype(str).str.strip()
+        present = lot_numbers.notna()
+        lot_types = pd.Series("unknown", index=lots.index, dtype=object)
+        dates = pd.Series(pd.NaT, index=lots.index, dtype="datetime64[ns]")
+
+        # Type 1: 5 caractères site + DDMMYY + 4 caractères
+        type1_mask = present & lots.str.match(self.LOT_PATTERNS["type1"])
+        if type1_mask.any():
+            groups = lots[type1_mask].str.extract(self.LOT_PATTERNS["type1"])
+            site_ok = groups[0].isin(self.PRIORITY1_SITE_CODES)
+            # Code de site non reconnu : "unknown", sans tester le type 2
+            priority1 = groups[site_ok]
+            lot_types[priority1.index] = "type1"
+
+            date_part = priority1[1]
+            day = pd.to_numeric(date_part.str[:2], errors="coerce")
+            month = pd.to_numeric(date_part.str[2:4], errors="coerce")
+            year = pd.to_numeric(date_part.str[4:6], errors="coerce") + 2000
+            in_range = day.between(1, 31) & month.between(1, 12)
+            parsed = pd.to_datetime(
+                pd.DataFrame({"year": year, "month": month, "day": day})[in_range],
+                errors="coerce",
+            )
+            dates[parsed.index] = parsed
+
+            invalid = priority1.index[dates[priority1.index].isna()]
+            if len(invalid):
+                logger.warning(
+                    f"Date invalide dans {len(invalid)} lots type 1 "
+                    f"(ex: {lots[invalid[:5]].tolist()})"
+                )
 
-        return df
+        # Type 2: LOT + caractères, pas d'extraction de date
+        type2_mask = present & ~type1_mask & lots.str.match(self.LOT_PATTERNS["type2"])
+        lot_types[type2_mask] = "type2"
+
+        dates.index = index
+        return dates, pd.Categorical(lot_types, categories=LOT_TYPE_PRIORITY)
 
     def _extract_date_from_lot(
         self, lot_number: str
@@ -516,16 +538,28 @@ class FileProcessorService:
                 )
         return None
 
-    def aggregate_data(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Agrège les données par clés métier en tenant compte des inventaires multiples"""
+    def aggregate_data(
+        self,
+        df: pd.DataFrame,
+        executor: Optional[PartitionExecutor] = None,
+    ) -> pd.DataFrame:
+        """
+        Agrège les données par clés métier en tenant compte des inventaires multiples
+
+        Avec executor, les inventaires sont agrégés en parallèle puis les
+        agrégats partiels fusionnés (somme des sommes, premier des premiers,
+        minimum des minimums).
+        """
         try:
             if df.empty:
                 raise ValueError("DataFrame vide pour l'agrégation")
 
-            # Clés d'agrégation depuis la configuration
-            aggregation_keys = self.processing_config.get(
-                "aggregation_keys",
-                ["CODE_ARTICLE", "STATUT", "EMPLACEMENT", "ZONE_PK", "UNITE"],
+            # Clés d'agrégation depuis la configuration (copie : la configuration n'est pas modifiée)
+            aggregation_keys = list(
+                self.processing_config.get(
+                    "aggregation_keys",
+                    ["CODE_ARTICLE", "STATUT", "EMPLACEMENT", "ZONE_PK", "UNITE"],
+                )
             )
 
             # Ajouter NUMERO_INVENTAIRE aux clés d'agrégation pour gérer les inventaires multiples
@@ -539,38 +573,29 @@ class FileProcessorService:
                     "Aucune clé d'agrégation valide trouvée dans les données"
                 )
 
+            # Numéro de clé (article, inventaire), constant dans chaque groupe
+            with_key_ids = KEY_ID_COLUMN in df.columns
+
+            # Sessions multi-inventaires : une partition par inventaire, agrégées en parallèle
+            partitions = executor.partitions(df) if executor is not None else None
+            if partitions:
+                partials = executor.map(aggregate_lots, partitions, existing_keys, with_key_ids)
+                aggregated = merge_partial_aggregates(pd.concat(partials), existing_keys, with_key_ids)
+            else:
+                aggregated = aggregate_lots(df, existing_keys, with_key_ids)
+            aggregated = aggregated.reset_index()
+            aggregated["Type_Lot_Prioritaire"] = (
+                aggregated["Type_Lot_Prioritaire"].fillna("unknown").astype(str)
+            )
+
+            # Tri : d'abord par type de lot prioritaire, puis par date (lots sans date en premier)
+            sort_rank = aggregated["Type_Lot_Prioritaire"].map(LOT_TYPE_SORT_RANK).fillna(4)
             aggregated = (
-                df.groupby(existing_keys)
-                .agg(
-                    Quantite_Theorique_Totale=("QUANTITE", "sum"),
-                    Numero_Session=("NUMERO_SESSION", "first"),
-                    Site=("SITE", "first"),
-                    Date_Min=(
-                        "Date_Lot",
-                        lambda x: (
-                            min(d for d in x if d is not None and pd.notna(d))
-                            if any(d for d in x if d is not None and pd.notna(d))
-                            else None
-                        ),
-                    ),
-                    Type_Lot_Prioritaire=(
-                        "Type_Lot",
-                        lambda x: self._get_priority_lot_type(x.tolist()),
-                    ),
-                )
-                .reset_index()
+                aggregated.assign(_sort_rank=sort_rank)
+                .sort_values(["_sort_rank", "Date_Min"], na_position="first", kind="stable")
+                .drop(columns="_sort_rank")
             )
 
-            # Tri intelligent : d'abord par type de lot prioritaire, puis par date si disponible
-            def sort_key(row):
-                type_priority = {"type1": 1, "type2": 2, "lotecart": 3, "unknown": 4}
-                priority = type_priority.get(row["Type_Lot_Prioritaire"], 4)
-                date_value = row["Date_Min"] if pd.notna(row["Date_Min"]) else datetime.min
-                return (priority, date_value)
-            
-            aggregated["_sort_key"] = aggregated.apply(sort_key, axis=1)
-            aggregated = aggregated.sort_values("_sort_key").drop("_sort_key", axis=1)
-            
             return aggregated
 
         except Exception as e:
@@ -580,9 +605,7 @@ class FileProcessorService:
     def _get_priority_lot_type(self, lot_types: List[str]) -> str:
         """Détermine le type de lot prioritaire selon la hiérarchie"""
         # Priorité: lots avec dates détectées > LOTECART > potential_lotecart > unknown
-        priority_order = ["type1", "type2", "lotecart", "potential_lotecart", "unknown"]
-
-        for priority_type in priority_order:
+        for priority_type in LOT_TYPE_PRIORITY:
             if priority_type in lot_types:
                 return priority_type
 
@@ -608,68 +631,33 @@ class FileProcessorService:
                 # Pour les inventaires multiples, utiliser le premier + indication
                 inventory_num = f"{inventory_nums[0]}_MULTI"
 
-            # Préparer les données du template avec les numéros de lot
-            template_rows = []
-
-            for _, row in aggregated_df.iterrows():
-                # Récupérer les lots originaux pour cet article et cet inventaire
-                original_lots = self._get_original_lots_for_article(
-                    row["CODE_ARTICLE"], row["NUMERO_INVENTAIRE"], session_id
-                )
-
-                if original_lots.empty:
-                    # Si pas de lots trouvés, créer une ligne avec les données agrégées
-                    template_rows.append(
-                        {
-                            "Numéro Session": row["Numero_Session"],
-                            "Numéro Inventaire": row["NUMERO_INVENTAIRE"],
-                            "Code Article": row["CODE_ARTICLE"],
-                            "Statut Article": row["STATUT"],
-                            "Quantité Théorique": row["Quantite_Theorique_Totale"],
-                            "Quantité Réelle": 0,
-                            "Unites": row["UNITE"],
-                            "Depots": row["ZONE_PK"],
-                            "Emplacements": row["EMPLACEMENT"],
-                        }
-                    )
-                else:
-                    # Créer une ligne par lot - mais maintenant on agrège vraiment par article
-                    # Plus besoin de créer une ligne par lot individuel
-                    template_rows.append(
-                        {
-                            "Numéro Session": row["Numero_Session"],
-                            "Numéro Inventaire": row["NUMERO_INVENTAIRE"],
-                            "Code Article": row["CODE_ARTICLE"],
-                            "Statut Article": row["STATUT"],
-                            "Quantité Théorique": row["Quantite_Theorique_Totale"],
-                            "Quantité Réelle": 0,
-                            "Unites": row["UNITE"],
-                            "Depots": row["ZONE_PK"],
-                            "Emplacements": row["EMPLACEMENT"],
-                        }
-                    )
-
-            template_df = pd.DataFrame(template_rows)
+            # Une ligne par article agrégé (les lots ne figurent pas dans le template)
+            template_df = pd.DataFrame(
+                {
+                    "Numéro Session": aggregated_df["Numero_Session"].to_numpy(),
+                    "Numéro Inventaire": aggregated_df["NUMERO_INVENTAIRE"].to_numpy(),
+                    "Code Article": aggregated_df["CODE_ARTICLE"].to_numpy(),
+                    "Statut Article": aggregated_df["STATUT"].to_numpy(),
+                    "Quantité Théorique": aggregated_df["Quantite_Theorique_Totale"].to_numpy(),
+                    "Quantité Réelle": 0,
+                    "Unites": aggregated_df["UNITE"].to_numpy(),
+                    "Depots": aggregated_df["ZONE_PK"].to_numpy(),
+                    "Emplacements": aggregated_df["EMPLACEMENT"].to_numpy(),
+                }
+            )
+            hidden_columns = []
+            if KEY_ID_COLUMN in aggregated_df.columns:
+                template_df[TEMPLATE_KEY_COLUMN] = aggregated_df[KEY_ID_COLUMN].to_numpy()
+                hidden_columns.append(TEMPLATE_KEY_COLUMN)
 
             # Construction du nom de fichier selon le format demandé
             filename = f"{site_code}_{session_num}_{inventory_num}_{session_id}.xlsx"
             filepath = os.path.join(output_folder, filename)
 
-            # Écriture Excel avec formatage
-            with pd.ExcelWriter(filepath, engine="openpyxl") as writer:
-                template_df.to_excel(writer, index=False, sheet_name="Inventaire")
-
-                worksheet = writer.sheets["Inventaire"]
-                for column in worksheet.columns:
-                    max_length = max(
-                        len(str(cell.value))
-                        for cell in column
-                        if cell.value is not None
-                    )
-                    adjusted_width = min(max_length + 2, 50)
-                    worksheet.column_dimensions[column[0].column_letter].width = (
-                        adjusted_width
-                    )
+            # Écriture Excel en flux, largeurs calculées à partir du DataFrame
+            write_xlsx_table(
+                filepath, template_df, sheet_name="Inventaire", hidden_columns=hidden_columns
+            )
 
             return filepath
 
@@ -677,36 +665,43 @@ class FileProcessorService:
             logger.error(f"Erreur génération template: {str(e)}", exc_info=True)
             raise
 
-    def _get_original_lots_for_article(
-        self, code_article: str, numero_inventaire: str, session_id: str
-    ) -> pd.DataFrame:
-        """Récupère les lots originaux pour un article et un inventaire donnés"""
-        try:
-            # Charger depuis le stockage persistant
-            original_df = self.session_service.load_dataframe(session_id, "original_df")
+    def read_completed_template(self, source) -> pd.DataFrame:
+        """
+        Lit un template complété (chemin ou fichier téléversé)
 
-            if original_df is None:
-                logger.warning(
-                    f"DataFrame original non trouvé pour session {session_id}"
-                )
-                return pd.DataFrame()
+        Seules les colonnes du template sont lues, avec le lecteur XLSX natif ;
+        les anciens formats (.xls) passent par pandas.
+        """
+        try:
+            return read_xlsx_table(source, COMPLETED_TEMPLATE_COLUMNS)
+        except XlsxReadError as e:
+            logger.warning(f"Lecteur XLSX natif non applicable ({e}), repli sur pandas")
 
-            # Filtrer par article et inventaire
-            lots = original_df[
-                (original_df["CODE_ARTICLE"] == code_article)
-                & (original_df["NUMERO_INVENTAIRE"] == numero_inventaire)
-            ].copy()
+        if hasattr(source, "seek"):
+            source.seek(0)
+        try:
+            df = pd.read_excel(source, engine="openpyxl")
+        except Exception as excel_error:
+            logger.error(f"Erreur lecture Excel avec openpyxl: {excel_error}")
+            if hasattr(source, "seek"):
+                source.seek(0)
+            try:
+                df = pd.read_excel(source, engine="xlrd")
+                logger.info("Lecture réussie avec xlrd")
+            except Exception as xlrd_error:
+                logger.error(f"Erreur lecture Excel avec xlrd: {xlrd_error}")
+                raise ValueError(f"Impossible de lire le fichier Excel: {excel_error}")
 
-            return lots
+        return df[[col for col in COMPLETED_TEMPLATE_COLUMNS if col in df.columns]]
 
-        except Exception as e:
-            logger.error(f"Erreur récupération lots originaux: {e}")
-            return pd.DataFrame()
+    def parse_completed_template(self, file) -> CompletedTemplate:
+        """Lit une seule fois le template complété téléversé (validation, LOTECART, écarts)"""
+        return CompletedTemplate.from_upload(file, self.read_completed_template)
 
     def validate_completed_template(self, filepath: str) -> Tuple[bool, str, List[str]]:
         """Valide le fichier template complété"""
         try:
-            df = pd.read_excel(filepath)
+            df = self.read_completed_template(filepath)
             return DataValidator.validate_template_completion(df)
         except Exception as e:
             logger.error(f"Erreur validation template: {e}")
@@ -0,0 +1,251 @@
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from services.lot_index import LotIndex, ROW_ID_COLUMN, LOT_ID_COLUMN
+from services.line_store import LineStore, raw_lines as read_raw_lines
+
+logger = logging.getLogger(__name__)
+
+# Découpe d'une ligne S; d'au moins 15 colonnes :
+# 1 = colonnes 0 à 5 (jusqu'à la quantité incluse), 2 = RANG (colonne 3),
+# 3 = QUANTITE (colonne 5), 4 = colonnes 8 et suivantes (précédées de ';')
+S_LINE_PATTERN = r"^((?:[^;]*;){3}([^;]*);[^;]*;([^;]*));[^;]*;[^;]*((?:;[^;]*){7,})$"
+INTEGER_PATTERN = r"\s*[+-]?\d+\s*"
+
+
+class FinalFileWriter:
+    """
+    Écriture du fichier final Sage X3 en une passe
+
+    Les colonnes des lignes originales sont modifiées pour toutes les lignes
+    à la fois :
+    - colonne 5 (F) : quantité originale, inchangée
+    - colonne 6 (G) : quantité théorique ajustée (ou quantité originale)
+    - colonne 7 (H) : indicateur de compte, "1" si la quantité ajustée est
+      non nulle, "2" sinon
+
+    Les lignes sont écrites par blocs, suivies des nouvelles lignes LOTECART.
+    Les statistiques retournées évitent de relire le fichier pour le valider.
+    """
+
+    CHUNK_SIZE = 50000
+
+    def __init__(self, lotecart_processor):
+        self.lotecart_processor = lotecart_processor
+
+    def adjusted_quantities(
+        self,
+        original_df: pd.DataFrame,
+        distributed_df: pd.DataFrame,
+        lot_index: LotIndex,
+    ) -> np.ndarray:
+        """
+        Quantité ajustée de chaque ligne originale (NaN si pas d'ajustement)
+
+        Rapprochement sur (article, inventaire, numéro de lot) : par simple
+        indexation avec ROW_ID et LOT_ID, ou par jointure pour les sessions
+        sans identifiants. Si plusieurs ajustements portent sur le même lot,
+        le dernier l'emporte.
+        """
+        if LOT_ID_COLUMN in original_df.columns and ROW_ID_COLUMN in distributed_df.columns:
+            lot_ids = original_df[LOT_ID_COLUMN].to_numpy(dtype=np.int64)
+            row_ids = pd.to_numeric(distributed_df[ROW_ID_COLUMN]).to_numpy(dtype=np.float64)
+            quantities = pd.to_numeric(distributed_df["QUANTITE_CORRIGEE"]).to_numpy(dtype=np.float64)
+
+            # Nouvelles lignes LOTECART (sans ligne originale) exclues
+            present = ~np.isnan(row_ids)
+            adjusted_lots = lot_ids[row_ids[present].astype(np.int64)]
+            quantities = quantities[present]
+            indexed = adjusted_lots >= 0
+
+            lot_quantities = np.full(int(lot_ids.max()) + 1 if len(lot_ids) else 0, np.nan)
+            # Affectation dans l'ordre : le dernier ajustement d'un lot l'emporte
+            last = ~pd.Series(adjusted_lots[indexed]).duplicated(keep="last").to_numpy()
+            lot_quantities[adjusted_lots[indexed][last]] = quantities[indexed][last]
+
+            adjusted = np.full(len(original_df), np.nan)
+            has_lot = lot_ids >= 0
+            adjusted[has_lot] = lot_quantities[lot_ids[has_lot]]
+            return adjusted
+
+        key_codes = lot_index.key_codes(
+            distributed_df["CODE_ARTICLE"], distributed_df["NUMERO_INVENTAIRE"]
+        )
+        adjustments = pd.DataFrame({
+            "KEY": key_codes,
+            "LOT": distributed_df["NUMERO_LOT"].astype(str).str.strip().to_numpy(),
+            "QTE": pd.to_numeric(distributed_df["QUANTITE_CORRIGEE"]).to_numpy(dtype=np.float64),
+        })
+        adjustments = adjustments[adjustments["KEY"] >= 0].drop_duplicates(
+            subset=["KEY", "LOT"], keep="last"
+        )
+
+        rows = pd.DataFrame({
+            "KEY": lot_index.row_codes(len(original_df)),
+            "LOT": original_df["NUMERO_LOT"].astype(str).str.strip().to_numpy(),
+        })
+        merged = rows.merge(adjustments, on=["KEY", "LOT"], how="left")
+        return merged["QTE"].to_numpy(dtype=np.float64)
+
+    def write(
+        self,
+        final_file_path: str,
+        header_lines: List[str],
+        original_df: pd.DataFrame,
+        adjusted_quantities: np.ndarray,
+        lotecart_adjustments: List[Dict[str, Any]],
+        line_store: Optional[LineStore] = None,
+        progress: Optional[Callable[[int], None]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Écrit le fichier final et retourne ses statistiques
+
+        Les lignes brutes sont lues dans line_store (ou dans la colonne
+        original_s_line_raw des anciennes sessions) par blocs de CHUNK_SIZE
+        lignes, transformées et écrites aussitôt : seul un bloc de lignes est
+        en mémoire. Les lignes originales de moins de 15 colonnes sont ignorées.
+        progress(lignes) est appelé après chaque bloc avec le nombre de lignes écrites.
+        """
+        written = 0
+        skipped = 0
+        adjusted_count = 0
+        max_line_number = 0
+        lotecart_stats = []
+
+        with open(final_file_path, "w", encoding="utf-8", buffering=1 << 20) as f:
+            if header_lines:
+                f.write("\n".join(header_lines) + "\n")
+
+            for start in range(0, len(original_df), self.CHUNK_SIZE):
+                positions = np.arange(start, min(start + self.CHUNK_SIZE, len(original_df)))
+                block = self._block_lines(
+                    read_raw_lines(original_df, line_store, positions), adjusted_quantities[positions]
+                )
+                if len(block["lines"]):
+                    f.write("\n".join(block["lines"]) + "\n")
+                lotecart_stats.extend(self._marked_line_stats(
+                    block["lines"], block["quantities"], block["column_7"], block["tails"],
+                    len(header_lines) + written,
+                ))
+                written += len(block["lines"])
+                skipped += block["skipped"]
+                adjusted_count += block["adjusted"]
+                max_line_number = max(max_line_number, block["max_line_number"])
+                if progress is not None:
+                    progress(written)
+
+            # Nouvelles lignes LOTECART, numérotées après le plus grand RANG du fichier
+            new_lines = self._lotecart_lines(lotecart_adjustments, max_line_number)
+            if new_lines:
+                f.write("\n".join(new_lines) + "\n")
+
+        lotecart_stats.extend(self._new_line_stats(new_lines, len(header_lines) + written + 1))
+        stats = {
+            "header_lines": len(header_lines),
+            "original_lines": written,
+            "skipped_lines": skipped,
+            "adjusted_lines": adjusted_count,
+            "lotecart_new_lines": len(new_lines),
+            "max_line_number": max_line_number,
+            "lotecart_lines": lotecart_stats,
+        }
+        logger.info(
+            f"Fichier final écrit: {stats['original_lines']} lignes S; "
+            f"({stats['adjusted_lines']} ajustées, {stats['skipped_lines']} ignorées), "
+            f"{stats['lotecart_new_lines']} nouvelles lignes LOTECART"
+        )
+        return stats
+
+    def _block_lines(self, raw_lines: np.ndarray, adjusted: np.ndarray) -> Dict[str, Any]:
+        """Lignes corrigées d'un bloc de lignes originales"""
+        fields = pd.Series(raw_lines, dtype=object).astype(str).str.extract(S_LINE_PATTERN)
+        valid = fields[0].notna().to_numpy()
+        fields = fields[valid]
+
+        heads = fields[0].to_numpy(dtype=object)
+        quantities = fields[2].to_numpy(dtype=object)
+        tails = fields[3].to_numpy(dtype=object)
+
+        adjusted = adjusted[valid]
+        has_adjustment = ~np.isnan(adjusted)
+        # Troncature comme int()
+        adjusted_int = np.trunc(adjusted[has_adjustment]).astype(np.int64)
+
+        column_6 = quantities.copy()
+        column_6[has_adjustment] = adjusted_int.astype(str)
+        column_7 = np.full(len(heads), "2", dtype=object)
+        column_7[has_adjustment] = np.where(adjusted_int == 0, "2", "1")
+
+        rangs = fields[1]
+        rangs = rangs[rangs.str.fullmatch(INTEGER_PATTERN)].astype(np.int64)
+
+        return {
+            "lines": heads + ";" + column_6 + ";" + column_7 + tails,
+            "quantities": quantities,
+            "column_7": column_7,
+            "tails": tails,
+            "skipped": int((~valid).sum()),
+            "adjusted": int(has_adjustment.sum()),
+            "max_line_number": max(int(rangs.max()), 0) if len(rangs) else 0,
+        }
+
+    def _lotecart_lines(
+        self, lotecart_adjustments: List[Dict[str, Any]], max_line_number: int
+    ) -> List[str]:
+        """Nouvelles lignes LOTECART, colonnes 5/6 au format du fichier final"""
+        if not lotecart_adjustments:
+            return []
+
+        new_lines = []
+        for line in self.lotecart_processor.generate_lotecart_lines(
+            lotecart_adjustments, max_line_number
+        ):
+            parts = line.split(";")
+            if len(parts) >= 15:
+                # Colonne 5 (F) = 0 (quantité originale était 0)
+                # Colonne 6 (G) = quantité trouvée (quantité théorique ajustée)
+                parts[5], parts[6] = "0", parts[5]
+                line = ";".join(parts)
+            new_lines.append(line)
+        return new_lines
+
+    def _marked_line_stats(
+        self,
+        lines: np.ndarray,
+        quantities: np.ndarray,
+        indicators: np.ndarray,
+        tails: np.ndarray,
+        lines_before: int,
+    ) -> List[Dict[str, Any]]:
+        """
+        Lignes S; d'un bloc contenant LOTECART, comme les relirait
+        validate_lotecart_processing (lines_before : lignes écrites avant le bloc)
+        """
+        stats = []
+        marked = np.flatnonzero(pd.Series(lines, dtype=object).str.contains("LOTECART", regex=False))
+        for i in marked:
+            stats.append({
+                "line_number": lines_before + int(i) + 1,
+                "article": tails[i].split(";")[1],
+                "quantite": quantities[i],
+                "indicateur": indicators[i],
+            })
+        return stats
+
+    def _new_line_stats(self, new_lines: List[str], first_new: int) -> List[Dict[str, Any]]:
+        """Nouvelles lignes LOTECART, numérotées à partir de first_new"""
+        stats = []
+        for offset, line in enumerate(new_lines):
+            if not (line.startswith("S;") and "LOTECART" in line):
+                continue
+            parts = line.split(";")
+            stats.append({
+                "line_number": first_new + offset,
+                "article": parts[8] if len(parts) > 8 else "N/A",
+                "quantite": parts[5] if len(parts) > 5 else "N/A",
+                "indicateur": parts[7] if len(parts) > 7 else "N/A",
+            })
+        return stats
@@ -0,0 +1,123 @@
+import logging
+from typing import Dict
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Types de lot, du plus prioritaire au moins prioritaire
+LOT_TYPE_PRIORITY = ["type1", "type2", "lotecart", "potential_lotecart", "unknown"]
+LOT_TYPE_DTYPE = pd.CategoricalDtype(LOT_TYPE_PRIORITY, ordered=True)
+
+# Types compacts des colonnes de chaque DataFrame de session.
+# Les colonnes de faible cardinalité (site, statut, unité, zone...) sont
+# catégorielles ; les clés de jointure (article, inventaire, lot) et les
+# lignes brutes restent des chaînes. Les colonnes absentes sont ignorées.
+ORIGINAL_SCHEMA = {
+    "TYPE_LIGNE": "category",
+    "NUMERO_SESSION": "category",
+    "RANG": "Int64",
+    "SITE": "category",
+    "QUANTITE": "float64",
+    "QUANTITE_REELLE_IN_INPUT": "category",
+    "INDICATEUR_COMPTE": "category",
+    "EMPLACEMENT": "category",
+    "STATUT": "category",
+    "UNITE": "category",
+    "VALEUR": "float64",
+    "ZONE_PK": "category",
+    "Date_Lot": "datetime64[ns]",
+    "Type_Lot": LOT_TYPE_DTYPE,
+    "LINE_OFFSET": "int64",
+    "LINE_LENGTH": "int32",
+    "ROW_ID": "int64",
+    "KEY_ID": "int64",
+    "LOT_ID": "int64",
+}
+
+AGGREGATED_SCHEMA = {
+    "STATUT": "category",
+    "EMPLACEMENT": "category",
+    "ZONE_PK": "category",
+    "UNITE": "category",
+    "Quantite_Theorique_Totale": "float64",
+    "Numero_Session": "category",
+    "Site": "category",
+    "Date_Min": "datetime64[ns]",
+    "Type_Lot_Prioritaire": "category",
+    "KEY_ID": "int64",
+}
+
+DISCREPANCIES_SCHEMA = {
+    "TYPE_LOT": LOT_TYPE_DTYPE,
+    "QUANTITE_ORIGINALE": "float64",
+    "QUANTITE_REELLE_SAISIE_TOTALE": "float64",
+    "AJUSTEMENT": "float64",
+    "QUANTITE_CORRIGEE": "float64",
+    "Date_Lot": "datetime64[ns]",
+    "LINE_OFFSET": "int64",
+    "LINE_LENGTH": "int32",
+    "ROW_ID": "int64",
+    "KEY_ID": "int64",
+}
+
+DISTRIBUTED_SCHEMA = {
+    **DISCREPANCIES_SCHEMA,
+    # Les nouvelles lignes LOTECART n'ont ni ligne brute ni ligne originale
+    "LINE_OFFSET": "Int64",
+    "LINE_LENGTH": "Int32",
+    "ROW_ID": "Int64",
+    "KEY_ID": "Int64",
+    "QUANTITE_REELLE_SAISIE": "float64",
+    "is_new_lotecart": "bool",
+    "is_existing_update": "bool",
+}
+
+FRAME_SCHEMAS: Dict[str, dict] = {
+    "original_df": ORIGINAL_SCHEMA,
+    "aggregated_df": AGGREGATED_SCHEMA,
+    "discrepancies_df": DISCREPANCIES_SCHEMA,
+    "distributed_df": DISTRIBUTED_SCHEMA,
+}
+
+
+def _convert(values: pd.Series, dtype) -> pd.Series:
+    if dtype == "bool":
+        # Drapeaux absents (lignes non LOTECART) : False
+        return values.eq(True)
+    if dtype == "datetime64[ns]":
+        return pd.to_datetime(values, errors="coerce")
+    if dtype in ("float64", "int64", "int32", "Int64", "Int32"):
+        return pd.to_numeric(values, errors="coerce").astype(dtype)
+    if isinstance(dtype, pd.CategoricalDtype):
+        # Valeur hors catégories (ex. 'lotecart' concaténé) : la colonne reste en chaînes
+        if values.dropna().isin(dtype.categories).all():
+            return values.astype(dtype)
+        return values
+    return values.astype(dtype)
+
+
+def apply_schema(df: pd.DataFrame, df_name: str) -> pd.DataFrame:
+    """
+    Convertit les colonnes d'un DataFrame de session vers leurs types compacts
+
+    Retourne le DataFrame lui-même s'il n'a pas de schéma ou si tout est
+    déjà au bon type, sinon une copie superficielle avec les colonnes converties.
+    """
+    schema = FRAME_SCHEMAS.get(df_name)
+    if schema is None or df is None:
+        return df
+
+    converted = {}
+    for name, dtype in schema.items():
+        if name not in df.columns or df[name].dtype == dtype:
+            continue
+        try:
+            values = _convert(df[name], dtype)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Colonne {name} de {df_name} conservée en {df[name].dtype}: {e}")
+            continue
+        if values is not df[name]:
+            converted[name] = values
+
+    return df.assign(**converted) if converted else df
@@ -0,0 +1,204 @@
+import hashlib
+import logging
+import os
+from datetime import datetime
+from typing import Optional
+
+from config import config
+from database import db_manager
+from models.ingest_cache import IngestCacheEntry
+from services.config_service import config_service
+from services.session_service import session_service, link_file
+
+logger = logging.getLogger(__name__)
+
+# Version du format des données d'import (à incrémenter dès que original_df,
+# aggregated_df, l'index des lots ou le template changent de forme)
+INGEST_FORMAT_VERSION = "1"
+
+# DataFrames de l'import repris tels quels (les lignes brutes suivent)
+INGEST_DATAFRAMES = ["original_df", "lot_index_groups", "lot_index_order", "aggregated_df"]
+
+
+class IngestCacheService:
+    """
+    Reprise des données d'import pour un fichier déjà traité
+
+    Le fichier téléversé est haché (SHA-256) pendant son écriture sur disque.
+    Si une session précédente a importé un fichier de même empreinte, avec la
+    même extension et la même version de configuration, ses DataFrames
+    d'import, ses lignes brutes et son template sont repris (liens physiques)
+    au lieu d'être recalculés. La table ingest_cache retient la dernière
+    session de chaque empreinte ; une entrée dont la session n'a plus ses
+    fichiers est supprimée à la lecture.
+    """
+
+    def __init__(self, enabled: bool = True, chunk_size: int = 1 << 20):
+        self.db = db_manager
+        self.enabled = enabled
+        self.chunk_size = chunk_size
+
+    def save_upload(self, file, path: str) -> str:
+        """Écrit le fichier téléversé (FileStorage) par blocs et retourne son empreinte SHA-256"""
+        digest = hashlib.sha256()
+        with open(path, "wb") as target:
+            while True:
+                chunk = file.stream.read(self.chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                target.write(chunk)
+        return digest.hexdigest()
+
+    def config_version(self) -> str:
+        """Version de la configuration d'import (format des données + configuration Sage X3)"""
+        return f"{INGEST_FORMAT_VERSION}:{config_service.get_config_version()[:32]}"
+
+    def lookup(self, content_hash: str, config_version: str, file_extension: str) -> Optional[dict]:
+        """Données de la session à reprendre pour cette empreinte, None si aucune"""
+        if not self.enabled or not content_hash:
+            return None
+
+        db_session = self.db.get_session()
+        try:
+            entry = db_session.query(IngestCacheEntry).filter(
+                IngestCacheEntry.content_hash == content_hash,
+                IngestCacheEntry.config_version == config_version,
+                IngestCacheEntry.file_extension == file_extension,
+            ).first()
+            source_session_id = entry.session_id if entry else None
+        except Exception as e:
+            logger.error(f"Erreur lecture cache d'import {content_hash[:12]}: {e}")
+            return None
+        finally:
+            db_session.close()
+
+        if source_session_id is None:
+            return None
+
+        source = session_service.get_session_data(source_session_id)
+        template_path = source.get("template_file_path") if source else None
+        if not template_path or not os.path.exists(template_path):
+            logger.info(f"Session {source_session_id} du cache d'import indisponible, entrée supprimée")
+            self.forget(content_hash, config_version, file_extension)
+            return None
+        return source
+
+    def restore(
+        self,
+        content_hash: str,
+        config_version: str,
+        file_extension: str,
+        session_id: str,
+        output_folder: str,
+    ) -> Optional[dict]:
+        """
+        Reprend les données d'import d'une session précédente pour session_id
+
+        Retourne {'source_session_id', 'template_file_path', 'header_lines'}
+        ou None si aucune session ne peut être reprise.
+        """
+        source = self.lookup(content_hash, config_version, file_extension)
+        if source is None:
+            return None
+
+        source_session_id = source["id"]
+        if not session_service.link_session_data(source_session_id, session_id, INGEST_DATAFRAMES):
+            self.forget(content_hash, config_version, file_extension)
+            return None
+
+        # Le template ne dépend de la session que par son nom de fichier
+        template_name = os.path.basename(source["template_file_path"])
+        stem = os.path.splitext(template_name)[0]
+        suffix = f"_{source_session_id}"
+        if stem.endswith(suffix):
+            stem = stem[:-len(suffix)]
+        template_path = os.path.join(output_folder, f"{stem}_{session_id}.xlsx")
+        try:
+            link_file(source["template_file_path"], template_path)
+        except OSError as e:
+            logger.error(f"Erreur reprise du template de {source_session_id}: {e}")
+            session_service.cleanup_session_data(session_id)
+            return None
+
+        self._record_hit(content_hash, config_version, file_extension)
+        logger.info(f"Import repris de la session {source_session_id} pour session {session_id}")
+        return {
+            "source_session_id": source_session_id,
+            "template_file_path": template_path,
+            "header_lines": source.get("header_lines"),
+        }
+
+    def register(
+        self,
+        content_hash: str,
+        config_version: str,
+        file_extension: str,
+        session_id: str,
+        file_size: Optional[int] = None,
+    ):
+        """Associe l'empreinte à la session (la plus récente remplace la précédente)"""
+        if not self.enabled or not content_hash:
+            return
+
+        db_session = self.db.get_session()
+        try:
+            entry = db_session.query(IngestCacheEntry).filter(
+                IngestCacheEntry.content_hash == content_hash,
+                IngestCacheEntry.config_version == config_version,
+                IngestCacheEntry.file_extension == file_extension,
+            ).first()
+            if entry is None:
+                entry = IngestCacheEntry(
+                    content_hash=content_hash,
+                    config_version=config_version,
+                    file_extension=file_extension,
+                    hits=0,
+                )
+                db_session.add(entry)
+            entry.session_id = session_id
+            entry.file_size = file_size
+            db_session.commit()
+        except Exception as e:
+            db_session.rollback()
+            logger.error(f"Erreur enregistrement cache d'import {content_hash[:12]}: {e}")
+        finally:
+            db_session.close()
+
+    def forget(self, content_hash: str, config_version: str, file_extension: str):
+        """Supprime l'entrée d'une empreinte"""
+        db_session = self.db.get_session()
+        try:
+            db_session.query(IngestCacheEntry).filter(
+                IngestCacheEntry.content_hash == content_hash,
+                IngestCacheEntry.config_version == config_version,
+                IngestCacheEntry.file_extension == file_extension,
+            ).delete()
+            db_session.commit()
+        except Exception as e:
+            db_session.rollback()
+            logger.error(f"Erreur suppression cache d'import {content_hash[:12]}: {e}")
+        finally:
+            db_session.close()
+
+    def _record_hit(self, content_hash: str, config_version: str, file_extension: str):
+        db_session = self.db.get_session()
+        try:
+            db_session.query(IngestCacheEntry).filter(
+                IngestCacheEntry.content_hash == content_hash,
+                IngestCacheEntry.config_version == config_version,
+                IngestCacheEntry.file_extension == file_extension,
+            ).update({
+                IngestCacheEntry.hits: IngestCacheEntry.hits + 1,
+                IngestCacheEntry.updated_at: datetime.utcnow(),
+            })
+            db_session.commit()
+        except Exception as e:
+            db_session.rollback()
+            logger.error(f"Erreur mise à jour cache d'import {content_hash[:12]}: {e}")
+        finally:
+            db_session.close()
+
+
+# Instance globale
+ingest_cache = IngestCacheService(enabled=config.INGEST_CACHE_ENABLED)
@@ -0,0 +1,355 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from config import config
+from database import db_manager
+from models.job import Job
+
+try:
+    from celery import Celery
+
+    CELERY_AVAILABLE = True
+except ImportError:
+    CELERY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class JobFailed(Exception):
+    """Erreur métier d'un job (message destiné à l'utilisateur)"""
+
+
+class JobService:
+    """
+    File de jobs en arrière-plan, persistée dans la base SQLite
+
+    Chaque job est une ligne de la table jobs : les workers (threads de
+    chaque processus gunicorn) réclament les jobs en attente par une mise à
+    jour conditionnelle, si bien qu'un job n'est exécuté qu'une fois même
+    avec plusieurs processus. Un job en cours est signalé vivant toutes les
+    heartbeat_interval secondes ; les workers remettent périodiquement en
+    file les jobs 'running' sans signal depuis stale_timeout secondes
+    (processus tué ou redémarré).
+
+    Si un broker Celery est configuré (et celery installé), les jobs sont
+    envoyés au broker ; la table reste la source de vérité pour le statut.
+    """
+
+    def __init__(
+        self,
+        broker_url: Optional[str] = None,
+        threads: int = 1,
+        poll_interval: float = 1.0,
+        stale_timeout: int = 300,
+        heartbeat_interval: float = 30.0,
+    ):
+        self.db = db_manager
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.stale_timeout = stale_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self._last_recovery = 0.0
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        # type de job -> (fonction, étapes)
+        self._handlers: Dict[str, tuple] = {}
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+        self.celery_app = None
+        if broker_url:
+            if CELERY_AVAILABLE:
+                self.celery_app = Celery("inventory_jobs", broker=broker_url)
+                self._celery_task = self.celery_app.task(name="inventory_jobs.run_job")(
+                    self.run_job
+                )
+                logger.info(f"Jobs envoyés au broker Celery: {broker_url}")
+            else:
+                logger.warning("Celery non installé, utilisation de la file SQLite locale")
+
+    def register(self, job_type: str, handler: Callable, stages: List[str]):
+        """
+        Déclare un type de job
+
+        handler(payload, progress) reçoit le payload JSON du job et une
+        fonction progress(stage) à appeler au début de chaque étape ; sa
+        valeur de retour (JSON) est le résultat du job.
+        """
+        self._handlers[job_type] = (handler, stages)
+
+    def submit(
+        self, job_type: str, session_id: Optional[str] = None, payload: Optional[dict] = None
+    ) -> str:
+        """Met un job en file et retourne son identifiant"""
+        if job_type not in self._handlers:
+            raise ValueError(f"Type de job inconnu: {job_type}")
+
+        _, stages = self._handlers[job_type]
+        db_session = self.db.get_session()
+        try:
+            job = Job(
+                job_type=job_type,
+                session_id=session_id,
+                status="queued",
+                stages=json.dumps([{"name": name, "status": "pending"} for name in stages]),
+                payload=json.dumps(payload or {}),
+            )
+            db_session.add(job)
+            db_session.commit()
+            job_id = job.id
+        except Exception as e:
+            db_session.rollback()
+            logger.error(f"Erreur création job {job_type}: {e}")
+            raise
+        finally:
+            db_session.close()
+
+        logger.info(f"Job {job_type} {job_id} mis en file (session {session_id})")
+        if self.celery_app is not None:
+            self._celery_task.delay(job_id)
+        else:
+            self.start()
+            self._wake.set()
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        """Retourne l'état d'un job"""
+        db_session = self.db.get_session()
+        try:
+            job = db_session.query(Job).filter(Job.id == job_id).first()
+            return job.to_dict() if job else None
+        except Exception as e:
+            logger.error(f"Erreur récupération job {job_id}: {e}")
+            return None
+        finally:
+            db_session.close()
+
+    def start(self, threads: Optional[int] = None):
+        """Démarre les threads workers (idempotent)"""
+        threads = threads or self.threads
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            self.recover_stale_jobs()
+            for i in range(threads):
+                thread = threading.Thread(
+                    target=self._worker_loop, name=f"job-worker-{i}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+            logger.info(f"{threads} worker(s) de jobs démarré(s) ({self.worker_id})")
+
+    def stop(self, timeout: Optional[float] = None):
+        """Arrête les threads workers après le job en cours"""
+        with self._lock:
+            self._stop.set()
+            self._wake.set()
+            for thread in self._threads:
+                thread.join(timeout)
+            self._threads = []
+
+    def run_job(self, job_id: str) -> bool:
+        """Exécute un job en file ; False s'il a déjà été réclamé ailleurs"""
+        if not self._claim(job_id):
+            return False
+
+        job = self._get(job_id)
+        handler, _ = self._handlers[job.job_type]
+        logger.info(f"▶️ Job {job.job_type} {job_id} démarré")
+
+        # Signal de vie pendant toute l'exécution (une étape peut durer longtemps)
+        done = threading.Event()
+        heartbeat = threading.Thread(
+            target=self._heartbeat_loop, args=(job_id, done), name=f"job-heartbeat-{job_id[:8]}", daemon=True
+        )
+        heartbeat.start()
+        try:
+            result = handler(
+                json.loads(job.payload or "{}"),
+                lambda stage: self._set_stage(job_id, stage),
+            )
+            self._finish(job_id, "completed", result=result)
+            logger.info(f"✅ Job {job.job_type} {job_id} terminé")
+        except JobFailed as e:
+            logger.warning(f"⚠️ Job {job.job_type} {job_id} échoué: {e}")
+            self._finish(job_id, "failed", error=str(e))
+        except Exception as e:
+            logger.error(f"❌ Job {job.job_type} {job_id} échoué: {e}", exc_info=True)
+            self._finish(job_id, "failed", error=str(e))
+        finally:
+            done.set()
+            heartbeat.join()
+        return True
+
+    def recover_stale_jobs(self) -> int:
+        """Remet en file les jobs 'running' sans nouvelles depuis stale_timeout"""
+        db_session = self.db.get_session()
+        try:
+            cutoff = datetime.utcnow() - timedelta(seconds=self.stale_timeout)
+            count = (
+                db_session.query(Job)
+                .filter(Job.status == "running", Job.updated_at < cutoff)
+                .update({"status": "queued", "worker": None}, synchronize_session=False)
+            )
+            db_session.commit()
+            if count:
+                logger.warning(f"{count} job(s) interrompu(s) remis en file")
+            return count
+        except Exception as e:
+            db_session.rollback()
+            logger.error(f"Erreur reprise des jobs interrompus: {e}")
+            return 0
+        finally:
+            db_session.close()
+
+    def _worker_loop(self):
+        while not self._stop.is_set():
+            try:
+                self._maybe_recover()
+                job_id = self._next_queued()
+                if job_id is not None:
+                    self.run_job(job_id)
+                    continue
+            except Exception as e:
+                logger.error(f"Erreur worker de jobs: {e}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def _maybe_recover(self):
+        """Reprise des jobs interrompus, au plus une fois par heartbeat_interval"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_recovery < self.heartbeat_interval:
+                return
+            self._last_recovery = now
+        self.recover_stale_jobs()
+
+    def _heartbeat_loop(self, job_id: str, done: threading.Event):
+        while not done.wait(self.heartbeat_interval):
+            self._touch(job_id)
+
+    def _touch(self, job_id: str):
+        """Met à jour updated_at du job tant qu'il est en cours sur ce worker"""
+        db_session = self.db.get_session()
+        try:
+            db_session.query(Job).filter(
+                Job.id == job_id, Job.status == "running", Job.worker == self.worker_id
+            ).update({"updated_at": datetime.utcnow()}, synchronize_session=False)
+            db_session.commit()
+        except Exception as e:
+            db_session.rollback()
+            logger.error(f"Erreur signal de vie job {job_id}: {e}")
+        finally:
+            db_session.close()
+
+    def _next_queued(self) -> Optional[str]:
+        db_session = self.db.get_session()
+        try:
+            job = (
+                db_session.query(Job.id)
+                .filter(Job.status == "queued", Job.job_type.in_(list(self._handlers)))
+                .order_by(Job.created_at)
+                .first()
+            )
+            return job.id if job else None
+        finally:
+            db_session.close()
+
+    def _claim(self, job_id: str) -> bool:
+        """Passe le job en 'running' si personne ne l'a réclamé avant"""
+        db_session = self.db.get_session()
+        try:
+            claimed = (
+                db_session.query(Job)
+                .filter(Job.id == job_id, Job.status == "queued")
+                .update(
+                    {
+                        "status": "running",
+                        "worker": self.worker_id,
+                        "attempts": Job.attempts + 1,
+                        "started_at": datetime.utcnow(),
+                        "updated_at": datetime.utcnow(),
+                    },
+                    synchronize_session=False,
+                )
+            )
+            db_session.commit()
+            return claimed == 1
+        except Exception as e:
+            db_session.rollback()
+            logger.error(f"Erreur réclamation job {job_id}: {e}")
+            return False
+        finally:
+            db_session.close()
+
+    def _get(self, job_id: str) -> Job:
+        db_session = self.db.get_session()
+        try:
+            return db_session.query(Job).filter(Job.id == job_id).first()
+        finally:
+            db_session.close()
+
+    def _set_stage(self, job_id: str, current: str):
+        """Termine l'étape en cours et démarre la suivante"""
+        now = datetime.utcnow().isoformat()
+        db_session = self.db.get_session()
+        try:
+            job = db_session.query(Job).filter(Job.id == job_id).first()
+            stages = json.loads(job.stages or "[]")
+            for stage in stages:
+                if stage["status"] == "running":
+                    stage["status"] = "completed"
+                    stage["finished_at"] = now
+                if stage["name"] == current:
+                    stage["status"] = "running"
+                    stage["started_at"] = now
+            job.stages = json.dumps(stages)
+            job.current_stage = current
+            db_session.commit()
+        except Exception as e:
+            db_session.rollback()
+            logger.error(f"Erreur mise à jour étape job {job_id}: {e}")
+        finally:
+            db_session.close()
+
+    def _finish(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None):
+        now = datetime.utcnow().isoformat()
+        db_session = self.db.get_session()
+        try:
+            job = db_session.query(Job).filter(Job.id == job_id).first()
+            stages = json.loads(job.stages or "[]")
+            for stage in stages:
+                if stage["status"] == "running":
+                    stage["status"] = "completed" if status == "completed" else "failed"
+                    stage["finished_at"] = now
+                elif status == "completed" and stage["status"] == "pending":
+                    stage["status"] = "skipped"
+            job.stages = json.dumps(stages)
+            job.status = status
+            job.result = json.dumps(result) if result is not None else None
+            job.error = error
+            job.finished_at = datetime.utcnow()
+            db_session.commit()
+        except Exception as e:
+            db_session.rollback()
+            logger.error(f"Erreur finalisation job {job_id}: {e}")
+        finally:
+            db_session.close()
+
+
+# Instance globale
+job_service = JobService(
+    broker_url=config.JOB_BROKER_URL or None,
+    threads=config.JOB_WORKER_THREADS,
+    poll_interval=config.JOB_POLL_INTERVAL,
+    stale_timeout=config.JOB_STALE_TIMEOUT,
+    heartbeat_interval=config.JOB_HEARTBEAT_INTERVAL,
+)
@@ -0,0 +1,156 @@
+import logging
+import mmap
+import os
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+RAW_LINE_COLUMN = "original_s_line_raw"
+LINE_OFFSET_COLUMN = "LINE_OFFSET"
+LINE_LENGTH_COLUMN = "LINE_LENGTH"
+
+
+class LineStore:
+    """
+    Lignes S; brutes d'une session, stockées une seule fois sur disque
+
+    Les lignes sont écrites à l'import dans un fichier texte UTF-8 (une par
+    ligne) ; les DataFrames ne portent plus que leur position
+    (LINE_OFFSET, LINE_LENGTH en octets). Les lignes sont relues à la
+    demande dans le fichier mappé en mémoire.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @classmethod
+    def for_session(cls, session_service, session_id: str) -> "LineStore":
+        return cls(os.path.join(session_service.data_folder, f"{session_id}_lines.txt"))
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def write(self, lines: Sequence[str]):
+        """
+        Écrit les lignes et retourne (offsets, longueurs) en octets
+
+        Le fichier est écrit à côté puis renommé, comme les DataFrames.
+        """
+        with self.open_writer() as writer:
+            return writer.append(lines)
+
+    def open_writer(self) -> "LineStoreWriter":
+        """Écriture par lots successifs (analyse par lots), à utiliser comme gestionnaire de contexte"""
+        return LineStoreWriter(self.path)
+
+    def lines(self, offsets: Sequence[int], lengths: Sequence[int]) -> np.ndarray:
+        """Lignes (tableau d'objets str) aux positions données"""
+        offsets = np.asarray(offsets, dtype=np.int64)
+        lengths = np.asarray(lengths, dtype=np.int64)
+        if len(offsets) == 0:
+            return np.array([], dtype=object)
+
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            # Lignes consécutives (cas du fichier final) : un seul décodage
+            # (sauf si une cellule Excel contenait elle-même un saut de ligne)
+            if len(offsets) > 1 and np.array_equal(offsets[1:], offsets[:-1] + lengths[:-1] + 1):
+                start, stop = int(offsets[0]), int(offsets[-1] + lengths[-1])
+                lines = buffer[start:stop].decode("utf-8").split("\n")
+                if len(lines) == len(offsets):
+                    return np.array(lines, dtype=object)
+
+            return np.array(
+                [buffer[o:o + n].decode("utf-8") for o, n in zip(offsets.tolist(), lengths.tolist())],
+                dtype=object,
+            )
+
+    def detach(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Remplace la colonne des lignes brutes par leurs positions dans le fichier
+
+        Retourne un nouveau DataFrame (LINE_OFFSET, LINE_LENGTH à la place de
+        original_s_line_raw).
+        """
+        offsets, lengths = self.write(df[RAW_LINE_COLUMN].tolist())
+        return df.drop(columns=RAW_LINE_COLUMN).assign(
+            **{LINE_OFFSET_COLUMN: offsets, LINE_LENGTH_COLUMN: lengths}
+        )
+
+
+class LineStoreWriter:
+    """
+    Écriture des lignes brutes par lots
+
+    Chaque lot est ajouté à la suite du fichier temporaire ; ses positions
+    tiennent compte des lots précédents. Le fichier n'est renommé qu'à la
+    fermeture sans erreur.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.tmp_path = f"{path}.{os.getpid()}.tmp"
+        self.position = 0
+        self.count = 0
+        self._file = open(self.tmp_path, "wb", buffering=1 << 20)
+
+    def append(self, lines: Sequence[str]):
+        """Ajoute des lignes et retourne leurs (offsets, longueurs) en octets"""
+        encoded = [line.encode("utf-8") for line in lines]
+        lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+        offsets = np.full(len(encoded), self.position, dtype=np.int64)
+        # Chaque ligne est suivie d'un saut de ligne
+        np.cumsum(lengths[:-1] + 1, out=offsets[1:])
+        offsets[1:] += self.position
+
+        if encoded:
+            self._file.write(b"\n".join(encoded))
+            self._file.write(b"\n")
+            self.position = int(offsets[-1] + lengths[-1] + 1)
+        self.count += len(encoded)
+        return offsets, lengths.astype(np.int32)
+
+    def close(self):
+        self._file.close()
+        os.replace(self.tmp_path, self.path)
+        logger.info(f"Lignes brutes stockées: {self.path} ({self.count} lignes)")
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def __enter__(self) -> "LineStoreWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def raw_lines(
+    df: pd.DataFrame, line_store: Optional[LineStore] = None, positions: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Lignes brutes des lignes d'un DataFrame (toutes, ou aux positions iloc données)
+
+    Utilise la colonne original_s_line_raw si elle est présente (sessions
+    créées avant le stockage des lignes), sinon le LineStore.
+    """
+    if RAW_LINE_COLUMN in df.columns:
+        values = df[RAW_LINE_COLUMN].to_numpy(dtype=object)
+        return values if positions is None else values[positions]
+
+    if line_store is None or LINE_OFFSET_COLUMN not in df.columns:
+        count = len(df) if positions is None else len(positions)
+        return np.full(count, None, dtype=object)
+
+    offsets = df[LINE_OFFSET_COLUMN].to_numpy(dtype=np.int64)
+    lengths = df[LINE_LENGTH_COLUMN].to_numpy(dtype=np.int64)
+    if positions is not None:
+        offsets, lengths = offsets[positions], lengths[positions]
+    return line_store.lines(offsets, lengths)
@@ -0,0 +1,233 @@
+import logging
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+LOT_INDEX_KEYS = ["CODE_ARTICLE", "NUMERO_INVENTAIRE"]
+# Identifiants entiers portés par les DataFrames de toutes les étapes
+ROW_ID_COLUMN = "ROW_ID"  # position de la ligne dans original_df
+KEY_ID_COLUMN = "KEY_ID"  # numéro de la clé (article, inventaire), -1 si non indexée
+LOT_ID_COLUMN = "LOT_ID"  # numéro du lot (article, inventaire, numéro de lot), -1 si non indexé
+# Colonne masquée du template : numéro de clé de la ligne
+TEMPLATE_KEY_COLUMN = "Clé Ligne"
+
+
+class LotIndex:
+    """
+    Index (article, inventaire) -> lignes des lots originaux
+
+    Construit une seule fois à l'import à partir de original_df :
+    - order : positions des lignes triées par clé (tri stable, l'ordre
+      d'origine est conservé à l'intérieur d'une clé)
+    - starts/stops : plage de chaque clé dans order
+
+    Une recherche coûte O(log n) au lieu d'un parcours complet du DataFrame.
+    """
+
+    def __init__(
+        self,
+        keys: pd.MultiIndex,
+        starts: np.ndarray,
+        stops: np.ndarray,
+        order: np.ndarray,
+    ):
+        self.keys = keys
+        self.starts = starts
+        self.stops = stops
+        self.order = order
+
+    @classmethod
+    def build(cls, original_df: pd.DataFrame) -> "LotIndex":
+        """Construit l'index à partir des lots originaux"""
+        if original_df is None or original_df.empty:
+            return cls._empty()
+
+        # Les clés incomplètes (NaN) ne sont pas indexées
+        key_frame = original_df[LOT_INDEX_KEYS]
+        valid = np.flatnonzero(key_frame.notna().all(axis=1).to_numpy())
+        if len(valid) == 0:
+            return cls._empty()
+
+        codes, keys = pd.MultiIndex.from_frame(key_frame.iloc[valid]).factorize()
+        codes = np.asarray(codes, dtype=np.int64)
+
+        order = valid[np.argsort(codes, kind="stable")].astype(np.int64)
+        counts = np.bincount(codes, minlength=len(keys))
+        stops = np.cumsum(counts)
+        starts = stops - counts
+
+        keys = pd.MultiIndex.from_arrays(
+            [keys.get_level_values(0), keys.get_level_values(1)], names=LOT_INDEX_KEYS
+        )
+        logger.info(f"Index des lots construit: {len(keys)} clés, {len(order)} lots")
+        return cls(keys, starts, stops, order)
+
+    @classmethod
+    def _empty(cls) -> "LotIndex":
+        empty = np.array([], dtype=np.int64)
+        keys = pd.MultiIndex.from_arrays([[], []], names=LOT_INDEX_KEYS)
+        return cls(keys, empty, empty, empty)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def key_codes(
+        self, codes_article: Sequence, numeros_inventaire: Sequence
+    ) -> np.ndarray:
+        """Numéro de clé pour chaque couple (article, inventaire), -1 si absent"""
+        if len(self.keys) == 0:
+            return np.full(len(codes_article), -1, dtype=np.int64)
+        lookup = pd.MultiIndex.from_arrays([list(codes_article), list(numeros_inventaire)])
+        return self.keys.get_indexer(lookup).astype(np.int64)
+
+    def positions(self, code_article, numero_inventaire) -> np.ndarray:
+        """Positions (iloc) des lots d'un article dans un inventaire, dans l'ordre d'origine"""
+        try:
+            code = self.keys.get_loc((code_article, numero_inventaire))
+        except (KeyError, TypeError):
+            return np.array([], dtype=np.int64)
+        return self.order[self.starts[code]:self.stops[code]]
+
+    def lots(self, original_df: pd.DataFrame, code_article, numero_inventaire) -> pd.DataFrame:
+        """Lots originaux d'un article dans un inventaire"""
+        return original_df.iloc[self.positions(code_article, numero_inventaire)]
+
+    def first_positions(self, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Première position (ordre d'origine) de chaque clé, -1 si aucune
+
+        Avec mask (booléen par ligne originale), seules les lignes retenues
+        sont prises en compte, ex. les lots de quantité nulle.
+        """
+        firsts = np.full(len(self.keys), -1, dtype=np.int64)
+        if len(self.order) == 0:
+            return firsts
+
+        key_of_order = np.repeat(np.arange(len(self.keys)), self.stops - self.starts)
+        order = self.order
+        if mask is not None:
+            selected = np.asarray(mask, dtype=bool)[order]
+            key_of_order, order = key_of_order[selected], order[selected]
+
+        # order est trié par clé puis par position : la première occurrence de chaque clé est son minimum
+        keys, first = np.unique(key_of_order, return_index=True)
+        firsts[keys] = order[first]
+        return firsts
+
+    def row_codes(self, nb_rows: Optional[int] = None) -> np.ndarray:
+        """Numéro de clé de chaque ligne originale (-1 pour les clés non indexées)"""
+        nb_rows = nb_rows if nb_rows is not None else (int(self.order.max()) + 1 if len(self.order) else 0)
+        codes = np.full(nb_rows, -1, dtype=np.int64)
+        codes[self.order] = np.repeat(np.arange(len(self.keys)), self.stops - self.starts)
+        return codes
+
+    def with_ids(self, original_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Ajoute ROW_ID, KEY_ID et LOT_ID aux lignes originales
+
+        Les étapes suivantes (agrégation, template, écarts, répartition,
+        fichier final) se rapprochent par ces entiers plutôt que par les
+        chaînes (article, inventaire, lot). Les lignes d'un même lot
+        (numéro de lot sans espaces) partagent le même LOT_ID.
+        """
+        row_codes = self.row_codes(len(original_df))
+        numero_lot = original_df["NUMERO_LOT"]
+        lot_ids, _ = pd.MultiIndex.from_arrays(
+            [row_codes, numero_lot.astype(str).str.strip().to_numpy()]
+        ).factorize()
+        lot_ids = np.asarray(lot_ids, dtype=np.int64)
+        lot_ids[(row_codes < 0) | numero_lot.isna().to_numpy()] = -1
+
+        return original_df.assign(**{
+            ROW_ID_COLUMN: np.arange(len(original_df), dtype=np.int64),
+            KEY_ID_COLUMN: row_codes,
+            LOT_ID_COLUMN: lot_ids,
+        })
+
+    def resolve_key_codes(
+        self,
+        codes_article: Sequence,
+        numeros_inventaire: Sequence,
+        key_ids: Optional[Sequence] = None,
+    ) -> np.ndarray:
+        """
+        Numéro de clé de chaque ligne du template, -1 si absente des données
+
+        Les numéros lus dans la colonne masquée (key_ids) sont vérifiés par
+        simple indexation : un numéro valide dont les libellés sont ceux de
+        la ligne est utilisé tel quel. Seules les autres lignes (ajoutées ou
+        modifiées à la main, anciens templates) sont recherchées par
+        libellés (articles et inventaires comparés en chaînes).
+        """
+        articles = pd.Series(codes_article, dtype=object).astype(str).to_numpy(dtype=object)
+        inventaires = pd.Series(numeros_inventaire, dtype=object).astype(str).to_numpy(dtype=object)
+        codes = np.full(len(articles), -1, dtype=np.int64)
+        resolved = np.zeros(len(articles), dtype=bool)
+
+        if key_ids is not None and len(self.keys):
+            ids = pd.to_numeric(pd.Series(key_ids, dtype=object), errors="coerce").to_numpy(dtype=np.float64)
+            valid = np.flatnonzero(~np.isnan(ids) & (ids >= 0) & (ids < len(self.keys)))
+            candidates = ids[valid].astype(np.int64)
+            key_articles = self.keys.get_level_values(0).astype(str).to_numpy(dtype=object)
+            key_inventaires = self.keys.get_level_values(1).astype(str).to_numpy(dtype=object)
+            consistent = (key_articles[candidates] == articles[valid]) & (
+                key_inventaires[candidates] == inventaires[valid]
+            )
+            codes[valid[consistent]] = candidates[consistent]
+            resolved[valid[consistent]] = True
+
+        if not resolved.all():
+            codes[~resolved] = self.key_codes(articles[~resolved], inventaires[~resolved])
+        return codes
+
+    def to_frames(self):
+        """Représentation tabulaire pour la persistance (clés, ordre)"""
+        groups = self.keys.to_frame(index=False)
+        groups["START"] = self.starts
+        groups["STOP"] = self.stops
+        order = pd.DataFrame({"ROW": self.order})
+        return groups, order
+
+    @classmethod
+    def from_frames(cls, groups: pd.DataFrame, order: pd.DataFrame) -> "LotIndex":
+        keys = pd.MultiIndex.from_frame(groups[LOT_INDEX_KEYS])
+        return cls(
+            keys,
+            groups["START"].to_numpy(dtype=np.int64),
+            groups["STOP"].to_numpy(dtype=np.int64),
+            order["ROW"].to_numpy(dtype=np.int64),
+        )
+
+    def save(self, session_service, session_id: str):
+        """Sauvegarde l'index avec les DataFrames de la session"""
+        groups, order = self.to_frames()
+        session_service.save_dataframe(session_id, "lot_index_groups", groups)
+        session_service.save_dataframe(session_id, "lot_index_order", order)
+
+    @classmethod
+    def load(
+        cls,
+        session_service,
+        session_id: str,
+        original_df: Optional[pd.DataFrame] = None,
+    ) -> Optional["LotIndex"]:
+        """
+        Charge l'index d'une session
+
+        Pour les sessions créées avant l'index, il est reconstruit à partir
+        de original_df (si fourni) puis sauvegardé.
+        """
+        groups = session_service.load_dataframe(session_id, "lot_index_groups")
+        order = session_service.load_dataframe(session_id, "lot_index_order")
+        if groups is not None and order is not None:
+            return cls.from_frames(groups, order)
+
+        if original_df is None:
+            return None
+
+        lot_index = cls.build(original_df)
+        lot_index.save(session_service, session_id)
+        return lot_index
@@ -1,7 +1,10 @@
+import numpy as np
 import pandas as pd
 import logging
 from typing import Tuple, List, Dict, Any, Optional
 import json
+from services.lot_index import LotIndex, TEMPLATE_KEY_COLUMN
+from services.line_store import LineStore, raw_lines
 
 logger = logging.getLogger(__name__)
 
@@ -81,7 +84,9 @@ class LotecartProcessor:
     def create_lotecart_adjustments(
         self, 
         lotecart_candidates: pd.DataFrame, 
-        original_df: pd.DataFrame
+        original_df: pd.DataFrame,
+        lot_index: Optional[LotIndex] = None,
+        line_store: Optional[LineStore] = None
     ) -> List[Dict[str, Any]]:
         """
         Crée les ajustements pour les lots LOTECART en vérifiant d'abord si des lignes existent déjà
@@ -89,6 +94,10 @@ class LotecartProcessor:
         Args:
             lotecart_candidates: DataFrame des candidats LOTECART
             original_df: DataFrame des données originales Sage X3
+            lot_index: Index (article, inventaire) des lots originaux,
+                construit à la volée s'il n'est pas fourni
+            line_store: Lignes brutes de la session (seules les lignes
+                retenues sont lues)
             
         Returns:
             Liste des ajustements à appliquer
@@ -100,40 +109,85 @@ class LotecartProcessor:
                 logger.info("ℹ️ Aucun candidat LOTECART à traiter")
                 return adjustments
             
-            for _, candidate in lotecart_candidates.iterrows():
-                code_article = candidate["Code Article"]
-                numero_inventaire = candidate.get("Numéro Inventaire", "")
-                quantite_reelle = float(candidate["Quantité Réelle"])
-                
+            if lot_index is None:
+                lot_index = LotIndex.build(original_df)
+            
+            codes_article = lotecart_candidates["Code Article"].tolist()
+            if "Numéro Inventaire" in lotecart_candidates.columns:
+                numeros_inventaire = lotecart_candidates["Numéro Inventaire"].tolist()
+            else:
+                numeros_inventaire = [""] * len(lotecart_candidates)
+            quantites_reelles = pd.to_numeric(lotecart_candidates["Quantité Réelle"]).astype(float).tolist()
+            
+            # Résolution groupée des candidats sur l'index (article, inventaire) :
+            # première ligne de quantité nulle et première ligne de chaque clé.
+            # Les numéros de clé du template évitent la recherche par libellés.
+            key_codes = lot_index.resolve_key_codes(
+                codes_article, numeros_inventaire, lotecart_candidates.get(TEMPLATE_KEY_COLUMN)
+            )
+            found = key_codes >= 0
+            zero_positions = np.full(len(key_codes), -1, dtype=np.int64)
+            reference_positions = np.full(len(key_codes), -1, dtype=np.int64)
+            zero_mask = (original_df["QUANTITE"] == 0).to_numpy()
+            zero_positions[found] = lot_index.first_positions(zero_mask)[key_codes[found]]
+            reference_positions[found] = lot_index.first_positions()[key_codes[found]]
+            
+            # Sans numéro d'inventaire : première ligne de l'article, tous inventaires confondus
+            without_inventory = np.array([not numero for numero in numeros_inventaire], dtype=bool)
+            if without_inventory.any():
+                articles = original_df["CODE_ARTICLE"]
+                first_by_article = pd.Index(articles[~articles.duplicated()].dropna())
+                first_rows = np.flatnonzero((~articles.duplicated() & articles.notna()).to_numpy())
+                lookup = first_by_article.get_indexer(
+                    [code for code, missing in zip(codes_article, without_inventory) if missing]
+                )
+                reference_positions[without_inventory] = np.where(lookup >= 0, first_rows[lookup], -1)
+            
+            # Colonnes des lignes retenues, extraites une seule fois
+            columns = {
+                name: original_df[name].to_numpy(dtype=object) if name in original_df.columns else None
+                for name in ["NUMERO_LOT", "Date_Lot", "SITE", "EMPLACEMENT"]
+            }
+            # Lignes brutes des seules lignes retenues
+            retained = np.unique(np.concatenate([zero_positions, reference_positions]))
+            retained = retained[retained >= 0]
+            columns["original_s_line_raw"] = dict(
+                zip(retained.tolist(), raw_lines(original_df, line_store, retained))
+            )
+            
+            def value(name, position, default=None):
+                values = columns[name]
+                return default if values is None else values[position]
+            
+            for code_article, numero_inventaire, quantite_reelle, key_code, zero_position, reference_position in zip(
+                codes_article, numeros_inventaire, quantites_reelles, key_codes.tolist(),
+                zero_positions.tolist(), reference_positions.tolist()
+            ):
                 # Vérifier d'abord s'il existe déjà une ligne avec quantité théorique = 0 pour cet article
-                existing_zero_qty_line = original_df[
-                    (original_df["CODE_ARTICLE"] == code_article) &
-                    (original_df["NUMERO_INVENTAIRE"] == numero_inventaire) &
-                    (original_df["QUANTITE"] == 0)
-                ]
-                
-                if not existing_zero_qty_line.empty:
+                if zero_position >= 0:
                     # Ligne existante trouvée avec quantité = 0, la mettre à jour
-                    existing_line = existing_zero_qty_line.iloc[0]
+                    numero_lot = value("NUMERO_LOT", zero_position, "")
                     
                     adjustment = {
                         "CODE_ARTICLE": code_article,
                         "NUMERO_INVENTAIRE": numero_inventaire,
-                        "NUMERO_LOT": existing_line.get("NUMERO_LOT", ""),  # Garder le lot original
+                        "NUMERO_LOT": numero_lot,  # Garder le lot original
                         "TYPE_LOT": "lotecart",
                         "QUANTITE_ORIGINALE": 0,  # Était 0 dans le fichier original
                         "AJUSTEMENT": quantite_reelle,
                         "QUANTITE_CORRIGEE": quantite_reelle,
-                        "Date_Lot": existing_line.get("Date_Lot"),
-                        "original_s_line_raw": existing_line.get("original_s_line_raw"),
+                        "Date_Lot": value("Date_Lot", zero_position),
+                        "original_s_line_raw": value("original_s_line_raw", zero_position),
                         "is_new_lotecart": False,  # Pas une nouvelle ligne, mise à jour d'une existante
                         "is_existing_update": True,  # Flag pour indiquer que c'est une mise à jour
+                        "ROW_ID": zero_position,  # Ligne originale mise à jour
+                        "KEY_ID": key_code,
                         # Métadonnées pour traçabilité
                         "metadata": {
                             "detection_reason": "qty_theo_0_qty_real_positive",
-                            "existing_lot": existing_line.get("NUMERO_LOT", ""),
-                            "existing_site": existing_line.get("SITE", ""),
-                            "existing_emplacement": existing_line.get("EMPLACEMENT", ""),
+                            "existing_lot": numero_lot,
+                            "existing_site": value("SITE", zero_position, ""),
+                            "existing_emplacement": value("EMPLACEMENT", zero_position, ""),
                             "update_type": "existing_line_update"
                         }
                     }
@@ -142,22 +196,12 @@ class LotecartProcessor:
                     
                     logger.info(
                         f"✅ Mise à jour ligne existante LOTECART: {code_article} "
-                        f"(Lot={existing_line.get('NUMERO_LOT', 'N/A')}, Qté=0→{quantite_reelle})"
+                        f"(Lot={value('NUMERO_LOT', zero_position, 'N/A')}, Qté=0→{quantite_reelle})"
                     )
                     continue
                 
-                # Si aucune ligne existante avec quantité = 0, chercher une ligne de référence pour créer une nouvelle ligne
-                reference_query = original_df["CODE_ARTICLE"] == code_article
-                
-                if numero_inventaire:
-                    reference_query &= original_df["NUMERO_INVENTAIRE"] == numero_inventaire
-                
-                reference_lots = original_df[reference_query]
-                
-                if not reference_lots.empty:
-                    # Prendre la première ligne comme référence
-                    ref_lot = reference_lots.iloc[0]
-                    
+                # Si aucune ligne existante avec quantité = 0, prendre la première ligne comme référence
+                if reference_position >= 0:
                     # Créer un nouvel ajustement LOTECART (nouvelle ligne)
                     adjustment = {
                         "CODE_ARTICLE": code_article,
@@ -169,15 +213,17 @@ class LotecartProcessor:
                         "QUANTITE_CORRIGEE": quantite_reelle,
                         "Date_Lot": None,  # Pas de date pour LOTECART
                         "original_s_line_raw": None,  # Nouvelle ligne à créer
-                        "reference_line": ref_lot.get("original_s_line_raw"),
+                        "reference_line": value("original_s_line_raw", reference_position),
                         "is_new_lotecart": True,  # Flag spécial LOTECART
                         "is_existing_update": False,  # Pas une mise à jour, nouvelle ligne
+                        "ROW_ID": None,  # Pas de ligne originale
+                        "KEY_ID": key_code if key_code >= 0 else None,
                         # Métadonnées pour traçabilité
                         "metadata": {
                             "detection_reason": "qty_theo_0_qty_real_positive",
-                            "reference_lot": ref_lot.get("NUMERO_LOT", ""),
-                            "reference_site": ref_lot.get("SITE", ""),
-                            "reference_emplacement": ref_lot.get("EMPLACEMENT", ""),
+                            "reference_lot": value("NUMERO_LOT", reference_position, ""),
+                            "reference_site": value("SITE", reference_position, ""),
+                            "reference_emplacement": value("EMPLACEMENT", reference_position, ""),
                             "update_type": "new_line_creation"
                         }
                     }
@@ -186,7 +232,7 @@ class LotecartProcessor:
                     
                     logger.info(
                         f"✅ Nouvelle ligne LOTECART créée: {code_article} "
-                        f"(Qté={quantite_reelle}, Ref={ref_lot.get('NUMERO_LOT', 'N/A')})"
+                        f"(Qté={quantite_reelle}, Ref={value('NUMERO_LOT', reference_position, 'N/A')})"
                     )
                 else:
                     logger.warning(
@@ -310,7 +356,8 @@ class LotecartProcessor:
     def validate_lotecart_processing(
         self, 
         final_file_path: str, 
-        expected_lotecart_count: int
+        expected_lotecart_count: int,
+        file_stats: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         """
         Valide que le traitement LOTECART s'est bien déroulé
@@ -318,6 +365,8 @@ class LotecartProcessor:
         Args:
             final_file_path: Chemin vers le fichier final généré
             expected_lotecart_count: Nombre de LOTECART attendus
+            file_stats: Statistiques produites par FinalFileWriter.write ;
+                si fournies, le fichier n'est pas relu
             
         Returns:
             Dictionnaire avec les résultats de validation
@@ -337,17 +386,20 @@ class LotecartProcessor:
             # Lire et analyser le fichier final
             lotecart_lines = []
             
-            with open(final_file_path, 'r', encoding='utf-8') as f:
-                for line_num, line in enumerate(f, 1):
-                    line = line.strip()
-                    if line.startswith('S;') and 'LOTECART' in line:
-                        parts = line.split(';')
-                        lotecart_lines.append({
-                            'line_number': line_num,
-                            'article': parts[8] if len(parts) > 8 else 'N/A',
-                            'quantite': parts[5] if len(parts) > 5 else 'N/A',
-                            'indicateur': parts[7] if len(parts) > 7 else 'N/A'
-                        })
+            if file_stats is not None:
+                lotecart_lines = file_stats["lotecart_lines"]
+            else:
+                with open(final_file_path, 'r', encoding='utf-8') as f:
+                    for line_num, line in enumerate(f, 1):
+                        line = line.strip()
+                        if line.startswith('S;') and 'LOTECART' in line:
+                            parts = line.split(';')
+                            lotecart_lines.append({
+                                'line_number': line_num,
+                                'article': parts[8] if len(parts) > 8 else 'N/A',
+                                'quantite': parts[5] if len(parts) > 5 else 'N/A',
+                                'indicateur': parts[7] if len(parts) > 7 else 'N/A'
+                            })
             
             validation_result["lotecart_lines_found"] = len(lotecart_lines)
             
@@ -0,0 +1,261 @@
+import atexit
+import glob
+import json
+import logging
+import math
+import os
+import socket
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from config import config
+from services.dataframe_cache import dataframe_cache
+
+logger = logging.getLogger(__name__)
+
+# Bornes des histogrammes
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+ROWS_PER_SECOND_BUCKETS = (100, 1000, 10000, 50000, 100000, 250000, 500000, 1000000, 5000000)
+BYTES_BUCKETS = (1 << 10, 10 << 10, 100 << 10, 1 << 20, 10 << 20, 100 << 20, 1 << 30)
+
+
+def _label_key(labels: Dict[str, str]) -> str:
+    """Clé stable d'un jeu d'étiquettes (sérialisable dans les fichiers partagés)"""
+    return json.dumps(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(pairs: List[List[str]], extra: Optional[tuple] = None) -> str:
+    pairs = list(pairs) + ([list(extra)] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class MetricsRegistry:
+    """
+    Registre de métriques du processus (compteurs et histogrammes)
+
+    Chaque worker enregistre ses observations en mémoire ; avec directory
+    (répertoire partagé entre les workers gunicorn), l'état du processus y
+    est écrit (au plus toutes les flush_interval secondes, et à l'arrêt) et
+    l'exposition Prometheus additionne les fichiers de tous les processus.
+    Les collecteurs (register_collector) fournissent des compteurs tenus
+    ailleurs, ex. les hits/misses du cache des DataFrames de session ; les
+    ratios (ratio) sont calculés après l'addition des processus.
+    """
+
+    def __init__(self, directory: Optional[str] = None, flush_interval: float = 5.0):
+        self.directory = directory or None
+        self.flush_interval = flush_interval
+        self._metrics: Dict[str, dict] = {}
+        self._collectors: List[Callable[[], Dict[str, float]]] = []
+        # nom -> (aide, numérateur, compteurs du dénominateur)
+        self._ratios: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            atexit.register(self.flush)
+
+    def counter(self, name: str, help_text: str):
+        """Déclare un compteur (nom terminé par _total)"""
+        self._declare(name, "counter", help_text)
+
+    def ratio(self, name: str, help_text: str, numerator: str, denominators: List[str]):
+        """Jauge numerator / somme(denominators), calculée sur les compteurs additionnés"""
+        self._ratios[name] = (help_text, numerator, denominators)
+
+    def histogram(self, name: str, help_text: str, buckets: tuple = DURATION_BUCKETS):
+        """Déclare un histogramme"""
+        self._declare(name, "histogram", help_text, list(buckets))
+
+    def register_collector(self, collector: Callable[[], Dict[str, float]]):
+        """collector() -> {nom de compteur: valeur courante du processus}"""
+        self._collectors.append(collector)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        with self._lock:
+            samples = self._metrics[name]["samples"]
+            key = _label_key(labels)
+            samples[key] = samples.get(key, 0) + value
+        self._maybe_flush()
+
+    def observe(self, name: str, value: float, **labels):
+        with self._lock:
+            metric = self._metrics[name]
+            key = _label_key(labels)
+            state = metric["samples"].get(key)
+            if state is None:
+                state = metric["samples"][key] = {"buckets": [0] * len(metric["buckets"]), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(metric["buckets"]):
+                if value <= bound:
+                    state["buckets"][i] += 1
+            state["sum"] += value
+            state["count"] += 1
+        self._maybe_flush()
+
+    def observe_stage(self, pipeline: str, stage: str, duration: float, rows: Optional[int] = None):
+        """Durée d'une étape de traitement et débit en lignes/s"""
+        self.observe("inventory_stage_duration_seconds", duration, pipeline=pipeline, stage=stage)
+        if rows:
+            self.inc("inventory_stage_rows_total", rows, pipeline=pipeline, stage=stage)
+            if duration > 0:
+                self.observe("inventory_stage_rows_per_second", rows / duration, pipeline=pipeline, stage=stage)
+
+    def observe_request(self, endpoint: str, method: str, status: int, duration: float,
+                        bytes_in: Optional[int] = None, bytes_out: Optional[int] = None):
+        """Durée d'une requête HTTP et volumes reçus/envoyés"""
+        labels = {"endpoint": endpoint, "method": method}
+        self.observe("http_request_duration_seconds", duration, status=str(status), **labels)
+        if bytes_in is not None:
+            self.observe("http_request_size_bytes", bytes_in, **labels)
+        if bytes_out is not None:
+            self.observe("http_response_size_bytes", bytes_out, **labels)
+
+    def snapshot(self) -> Dict[str, dict]:
+        """État du processus (métriques déclarées + collecteurs), sérialisable en JSON"""
+        collected = {}
+        for collector in self._collectors:
+            try:
+                collected.update(collector())
+            except Exception as e:
+                logger.error(f"Erreur collecteur de métriques: {e}")
+
+        with self._lock:
+            snapshot = json.loads(json.dumps(self._metrics))
+        for name, value in collected.items():
+            if name in snapshot:
+                snapshot[name]["samples"][_label_key({})] = value
+        return snapshot
+
+    def flush(self):
+        """Écrit l'état du processus dans le répertoire partagé (fichier remplacé atomiquement)"""
+        if not self.directory:
+            return
+        self._last_flush = time.monotonic()
+        # Nom calculé à chaque écriture : un worker forké écrit son propre fichier
+        path = os.path.join(self.directory, f"metrics_{socket.gethostname()}_{os.getpid()}.json")
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"Erreur écriture des métriques {path}: {e}")
+
+    def collect(self) -> Dict[str, dict]:
+        """Métriques additionnées sur tous les processus du répertoire partagé"""
+        if not self.directory:
+            return self.snapshot()
+
+        self.flush()
+        merged: Dict[str, dict] = {}
+        for path in sorted(glob.glob(os.path.join(self.directory, "metrics_*.json"))):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Fichier de métriques ignoré {path}: {e}")
+                continue
+            for name, metric in snapshot.items():
+                target = merged.setdefault(name, {**metric, "samples": {}})
+                if metric.get("buckets") != target.get("buckets"):
+                    continue
+                for key, value in metric["samples"].items():
+                    target["samples"][key] = self._merge(target["samples"].get(key), value)
+        return merged
+
+    def render(self) -> str:
+        """Exposition au format texte Prometheus (version 0.0.4)"""
+        collected = self.collect()
+        for name, (help_text, numerator, denominators) in self._ratios.items():
+            total = sum(sum(collected.get(counter, {}).get("samples", {}).values()) for counter in denominators)
+            value = sum(collected.get(numerator, {}).get("samples", {}).values()) / total if total else 0.0
+            collected[name] = {"type": "gauge", "help": help_text, "buckets": None, "samples": {_label_key({}): value}}
+
+        lines = []
+        for name, metric in sorted(collected.items()):
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['type']}")
+            for key, value in sorted(metric["samples"].items()):
+                labels = json.loads(key)
+                if metric["type"] != "histogram":
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                    continue
+                # Compteurs de classes déjà cumulés (valeur <= borne)
+                for bound, count in zip(metric["buckets"], value["buckets"]):
+                    lines.append(f"{name}_bucket{_format_labels(labels, ('le', _format_value(bound)))} {count}")
+                lines.append(f"{name}_bucket{_format_labels(labels, ('le', '+Inf'))} {value['count']}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(value['sum'])}")
+                lines.append(f"{name}_count{_format_labels(labels)} {value['count']}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        """Remet à zéro les valeurs du processus (les déclarations sont conservées)"""
+        with self._lock:
+            for metric in self._metrics.values():
+                metric["samples"] = {}
+
+    def _declare(self, name: str, metric_type: str, help_text: str, buckets: Optional[list] = None):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = {"type": metric_type, "help": help_text, "buckets": buckets, "samples": {}}
+
+    def _maybe_flush(self):
+        if self.directory and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    @staticmethod
+    def _merge(current, value):
+        if current is None:
+            return json.loads(json.dumps(value))
+        if isinstance(value, dict):
+            return {
+                "buckets": [a + b for a, b in zip(current["buckets"], value["buckets"])],
+                "sum": current["sum"] + value["sum"],
+                "count": current["count"] + value["count"],
+            }
+        return current + value
+
+
+def _dataframe_cache_counters() -> Dict[str, float]:
+    stats = dataframe_cache.stats()
+    return {
+        "session_dataframe_cache_hits_total": stats["hits"],
+        "session_dataframe_cache_misses_total": stats["misses"],
+        "session_dataframe_cache_evictions_total": stats["evictions"],
+    }
+
+
+# Instance globale
+metrics = MetricsRegistry(directory=config.METRICS_DIR, flush_interval=config.METRICS_FLUSH_INTERVAL)
+metrics.histogram(
+    "inventory_stage_duration_seconds", "Durée des étapes de traitement (parse, aggregate, template, discrepancies, distribution, final_file)"
+)
+metrics.histogram(
+    "inventory_stage_rows_per_second", "Débit des étapes de traitement en lignes par seconde", ROWS_PER_SECOND_BUCKETS
+)
+metrics.counter("inventory_stage_rows_total", "Lignes traitées par étape")
+metrics.histogram("http_request_duration_seconds", "Durée des requêtes HTTP par endpoint")
+metrics.histogram("http_request_size_bytes", "Taille des requêtes HTTP reçues par endpoint", BYTES_BUCKETS)
+metrics.histogram("http_response_size_bytes", "Taille des réponses HTTP envoyées par endpoint", BYTES_BUCKETS)
+metrics.counter("session_dataframe_cache_hits_total", "Lectures de DataFrames de session servies par le cache")
+metrics.counter("session_dataframe_cache_misses_total", "Lectures de DataFrames de session lues sur disque")
+metrics.counter("session_dataframe_cache_evictions_total", "DataFrames de session évincés du cache")
+metrics.register_collector(_dataframe_cache_counters)
+metrics.ratio(
+    "session_dataframe_cache_hit_ratio", "Part des lectures de DataFrames de session servies par le cache",
+    "session_dataframe_cache_hits_total", ["session_dataframe_cache_hits_total", "session_dataframe_cache_misses_total"],
+)
@@ -0,0 +1,87 @@
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# Les inventaires d'une session sont indépendants (clés, écarts, répartition)
+PARTITION_KEY = "NUMERO_INVENTAIRE"
+
+
+class PartitionExecutor:
+    """
+    Exécution parallèle par numéro d'inventaire
+
+    Une session multi-inventaires est découpée en une partition par
+    inventaire (dans l'ordre de première apparition) ; chaque partition est
+    traitée dans un pool de processus, puis l'appelant fusionne les
+    résultats dans l'ordre du traitement en série. Avec moins de deux
+    workers, moins de min_rows lignes ou un seul inventaire, partitions()
+    retourne None et le traitement reste en série.
+
+    Le pool est créé au premier usage et conservé ; s'il est cassé (worker
+    tué), la partition en cours est traitée en série et le pool recréé.
+    """
+
+    def __init__(self, workers: int = 0, min_rows: int = 100000):
+        self.workers = workers
+        self.min_rows = min_rows
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 1
+
+    def partitions(self, df: pd.DataFrame, key: str = PARTITION_KEY) -> Optional[List[pd.DataFrame]]:
+        """Partitions de df par valeur de key, None si le traitement doit rester en série"""
+        if not self.enabled or df is None or len(df) < self.min_rows or key not in df.columns:
+            return None
+
+        positions = df.groupby(key, sort=False, observed=True).indices
+        if len(positions) < 2:
+            return None
+
+        # Ordre de première apparition : fusion déterministe
+        groups = sorted(positions.values(), key=lambda rows: rows[0])
+        logger.info(f"Traitement parallèle: {len(groups)} partitions par {key}, {len(df)} lignes")
+        return [df.iloc[np.sort(rows)] for rows in groups]
+
+    def map(self, func: Callable, partitions: List[pd.DataFrame], *args) -> list:
+        """func(partition, *args) pour chaque partition, résultats dans l'ordre des partitions"""
+        try:
+            pool = self._get_pool()
+            futures = [pool.submit(func, partition, *args) for partition in partitions]
+            return [future.result() for future in futures]
+        except BrokenProcessPool as e:
+            logger.error(f"Pool de processus indisponible ({e}), traitement en série")
+            self.shutdown()
+            return [func(partition, *args) for partition in partitions]
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                logger.info(f"Pool de processus démarré: {self.workers} workers")
+            return self._pool
+
+    def shutdown(self, wait: bool = False):
+        """Arrête le pool (recréé au prochain usage)"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+
+# Instance globale
+partition_executor = PartitionExecutor(
+    workers=config.PARTITION_WORKERS,
+    min_rows=config.PARTITION_MIN_ROWS,
+)
@@ -0,0 +1,234 @@
+import json
+import logging
+import time
+from typing import Callable, Iterator, List, Optional
+
+from config import config
+from database import db_manager
+from models.progress_event import ProgressEvent
+from services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Événements qui terminent un traitement (fin du flux SSE)
+TERMINAL_EVENTS = ("completed", "failed")
+
+
+def format_sse(event_id: int, event: str, data: dict) -> str:
+    """Message Server-Sent Events (id, type, données JSON)"""
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class PipelineProgress:
+    """
+    Suivi d'un traitement (upload, process, redistribute) d'une session
+
+    Utilisé comme gestionnaire de contexte : 'started' à l'entrée, 'failed'
+    si une exception sort du bloc. stage() termine l'étape en cours et
+    démarre la suivante (en relayant l'étape au job éventuel), rows() fixe le
+    nombre de lignes de l'étape en cours et finish() publie le résultat.
+    La durée et le débit de chaque étape terminée alimentent les métriques.
+    """
+
+    def __init__(self, service: "ProgressService", session_id: str, pipeline: str,
+                 job_progress: Optional[Callable[[str], None]] = None):
+        self.service = service
+        self.session_id = session_id
+        self.pipeline = pipeline
+        self.job_progress = job_progress
+        self.current: Optional[str] = None
+        self._rows: Optional[int] = None
+        self._started: Optional[float] = None
+
+    def __enter__(self):
+        self._publish("started")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self._publish("failed", stage=self.current, data={"error": str(exc)})
+        return False
+
+    def stage(self, name: str):
+        """Termine l'étape en cours et démarre name"""
+        self._complete_stage()
+        if self.job_progress is not None:
+            self.job_progress(name)
+        self.current = name
+        self._started = time.perf_counter()
+        self._publish("stage", stage=name, data={"status": "started"})
+
+    def rows(self, count: int):
+        """Nombre de lignes traitées par l'étape en cours (publié à sa fin)"""
+        self._rows = int(count)
+
+    def finish(self, result: Optional[dict] = None):
+        """Termine la dernière étape et publie le résultat du traitement"""
+        self._complete_stage()
+        self._publish("completed", data={"result": result})
+
+    def _complete_stage(self):
+        if self.current is not None:
+            duration = time.perf_counter() - self._started
+            metrics.observe_stage(self.pipeline, self.current, duration, self._rows)
+            self._publish(
+                "stage", stage=self.current, rows=self._rows,
+                data={"status": "completed", "duration": round(duration, 3)},
+            )
+        self.current = None
+        self._rows = None
+
+    def _publish(self, event: str, **kwargs):
+        self.service.publish(self.session_id, event, pipeline=self.pipeline, **kwargs)
+
+
+class RowReporter:
+    """Publie les lignes traitées pendant une étape et retient le dernier décompte"""
+
+    def __init__(self, service: "ProgressService", session_id: str, pipeline: str, stage: str):
+        self.service = service
+        self.session_id = session_id
+        self.pipeline = pipeline
+        self.stage = stage
+        self.rows = 0
+
+    def __call__(self, rows: int):
+        self.rows = int(rows)
+        self.service.publish(self.session_id, "progress", pipeline=self.pipeline, stage=self.stage, rows=rows)
+
+
+class ProgressService:
+    """
+    Événements de progression des sessions, diffusés en Server-Sent Events
+
+    Les traitements publient leurs transitions d'étapes et leurs nombres de
+    lignes dans la table progress_events ; les flux SSE (un par client)
+    relisent la table. Les événements sont ainsi partagés entre workers
+    gunicorn et processus du pool d'étapes, et un client déconnecté reprend
+    le flux après son dernier événement (Last-Event-ID) sans perdre le
+    résultat, porté par l'événement 'completed'.
+    """
+
+    def __init__(self, poll_interval: float = 0.5, heartbeat: float = 15.0, stream_timeout: float = 300.0):
+        self.db = db_manager
+        self.poll_interval = poll_interval
+        self.heartbeat = heartbeat
+        self.stream_timeout = stream_timeout
+
+    def tracker(self, session_id: str, pipeline: str,
+                job_progress: Optional[Callable[[str], None]] = None) -> PipelineProgress:
+        """Suivi d'un traitement de la session"""
+        return PipelineProgress(self, session_id, pipeline, job_progress)
+
+    def row_reporter(self, session_id: str, pipeline: str, stage: str) -> "RowReporter":
+        """Fonction rows -> événement 'progress' (lignes traitées pendant une étape)"""
+        return RowReporter(self, session_id, pipeline, stage)
+
+    def publish(
+        self,
+        session_id: str,
+        event: str,
+        pipeline: Optional[str] = None,
+        stage: Optional[str] = None,
+        rows: Optional[int] = None,
+        data: Optional[dict] = None,
+    ) -> Optional[int]:
+        """Enregistre un événement ; une erreur est journalisée sans interrompre le traitement"""
+        db_session = self.db.get_session()
+        try:
+            entry = ProgressEvent(
+                session_id=session_id,
+                pipeline=pipeline,
+                event=event,
+                stage=stage,
+                rows=int(rows) if rows is not None else None,
+                data=json.dumps(data, default=str) if data else None,
+            )
+            db_session.add(entry)
+            db_session.commit()
+            return entry.id
+        except Exception as e:
+            db_session.rollback()
+            logger.error(f"Erreur publication événement {event} session {session_id}: {e}")
+            return None
+        finally:
+            db_session.close()
+
+    def events(self, session_id: str, after_id: int = 0, pipeline: Optional[str] = None) -> List[dict]:
+        """Événements de la session postérieurs à after_id"""
+        db_session = self.db.get_session()
+        try:
+            query = db_session.query(ProgressEvent).filter(
+                ProgressEvent.session_id == session_id, ProgressEvent.id > after_id
+            )
+            if pipeline:
+                query = query.filter(ProgressEvent.pipeline == pipeline)
+            return [entry.to_dict() for entry in query.order_by(ProgressEvent.id).all()]
+        except Exception as e:
+            logger.error(f"Erreur lecture événements session {session_id}: {e}")
+            return []
+        finally:
+            db_session.close()
+
+    def run_start(self, session_id: str, pipeline: Optional[str] = None) -> int:
+        """
+        Position de départ d'un flux sans Last-Event-ID
+
+        Juste avant le dernier 'started' (du traitement demandé) : le dernier
+        traitement est rejoué. Sans traitement démarré, après le dernier
+        événement de la session : le flux attend le prochain traitement.
+        """
+        db_session = self.db.get_session()
+        try:
+            query = db_session.query(ProgressEvent.id).filter(ProgressEvent.session_id == session_id)
+            started = query.filter(ProgressEvent.event == "started")
+            if pipeline:
+                started = started.filter(ProgressEvent.pipeline == pipeline)
+            last_started = started.order_by(ProgressEvent.id.desc()).first()
+            if last_started is not None:
+                return last_started.id - 1
+            last = query.order_by(ProgressEvent.id.desc()).first()
+            return last.id if last is not None else 0
+        except Exception as e:
+            logger.error(f"Erreur lecture événements session {session_id}: {e}")
+            return 0
+        finally:
+            db_session.close()
+
+    def stream(
+        self,
+        session_id: str,
+        last_event_id: Optional[int] = None,
+        pipeline: Optional[str] = None,
+    ) -> Iterator[str]:
+        """
+        Flux SSE des événements de la session
+
+        Se termine après un événement 'completed' ou 'failed', ou au bout de
+        stream_timeout secondes (le client se reconnecte avec Last-Event-ID).
+        Un commentaire est envoyé toutes les heartbeat secondes sans événement.
+        """
+        cursor = last_event_id if last_event_id is not None else self.run_start(session_id, pipeline)
+        yield f"retry: {int(self.poll_interval * 2000)}\n\n"
+
+        deadline = time.monotonic() + self.stream_timeout
+        last_sent = time.monotonic()
+        while time.monotonic() < deadline:
+            for event in self.events(session_id, cursor, pipeline):
+                cursor = event["id"]
+                last_sent = time.monotonic()
+                yield format_sse(event["id"], event["event"], event)
+                if event["event"] in TERMINAL_EVENTS:
+                    return
+            if time.monotonic() - last_sent >= self.heartbeat:
+                last_sent = time.monotonic()
+                yield ": keep-alive\n\n"
+            time.sleep(self.poll_interval)
+
+
+# Instance globale
+progress_service = ProgressService(
+    poll_interval=config.PROGRESS_POLL_INTERVAL,
+    heartbeat=config.PROGRESS_HEARTBEAT,
+    stream_timeout=config.PROGRESS_STREAM_TIMEOUT,
+)
@@ -0,0 +1,285 @@
+import math
+import logging
+from array import array
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SageParseResult:
+    """Résultat de l'analyse d'un export Sage X3"""
+
+    headers: List[str] = field(default_factory=list)
+    dataframe: Optional[pd.DataFrame] = None
+    raw_lines: List[str] = field(default_factory=list)
+    first_numero_inventaire: Optional[str] = None
+    errors: List[str] = field(default_factory=list)
+    # Nombre de lots transmis au gestionnaire de lots (0 : analyse classique)
+    batches: int = 0
+
+    @property
+    def success(self) -> bool:
+        return not self.errors and self.dataframe is not None
+
+    @property
+    def error_message(self) -> str:
+        return "; ".join(self.errors)
+
+
+class SageStreamParser:
+    """
+    Analyseur en une passe des exports Sage X3
+
+    Les lignes E;/L; sont conservées comme en-têtes, les lignes S; sont
+    ventilées directement dans des tampons par colonne :
+    - QUANTITE : flottant (les valeurs invalides ou négatives sont comptées)
+    - VALEUR : flottant avec virgule décimale acceptée
+    - RANG : entier (NA si non numérique)
+    - autres colonnes : chaînes
+
+    Les contrôles métier de DataValidator.validate_sage_structure sont faits
+    pendant l'analyse, ce qui évite de reconvertir les quantités ensuite.
+
+    Avec batch_handler, les lignes S; sont transmises par lots de batch_rows
+    lignes (un seul lot si batch_rows est None) sous la forme
+    batch_handler(DataFrame, lignes brutes) -> DataFrame ; les tampons sont
+    vidés après chaque lot et le résultat est la concaténation des DataFrames
+    retournés. La mémoire de l'analyse reste bornée par la taille d'un lot.
+    """
+
+    def __init__(
+        self,
+        sage_columns: Dict[str, int],
+        source: str = "csv",
+        batch_rows: Optional[int] = None,
+        batch_handler: Optional[Callable[[pd.DataFrame, List[str]], pd.DataFrame]] = None,
+    ):
+        self.sage_columns = sage_columns
+        self.column_names = list(sage_columns.keys())
+        self.expected_cols = len(self.column_names)
+        self.source = source
+        self.batch_rows = batch_rows
+        self.batch_handler = batch_handler
+
+        self._qty_idx = sage_columns["QUANTITE"]
+        self._valeur_idx = sage_columns.get("VALEUR")
+        self._rang_idx = sage_columns.get("RANG")
+        self._article_idx = sage_columns["CODE_ARTICLE"]
+        self._inventaire_idx = sage_columns["NUMERO_INVENTAIRE"]
+        self._typed_idx = {
+            i for i in (self._qty_idx, self._valeur_idx, self._rang_idx) if i is not None
+        }
+        self.reset()
+
+    def reset(self):
+        """Réinitialise les tampons pour une nouvelle analyse"""
+        self.headers: List[str] = []
+        self.first_numero_inventaire: Optional[str] = None
+        self._fatal_error: Optional[str] = None
+        self._batches: List[pd.DataFrame] = []
+        self._batched_rows = 0
+        self._reset_buffers()
+
+        self._invalid_quantities = 0
+        self._negative_quantities = 0
+        self._empty_articles = 0
+
+    def _reset_buffers(self):
+        self.raw_lines: List[str] = []
+        self._str_buffers: Dict[int, list] = {
+            i: [] for i in range(self.expected_cols) if i not in self._typed_idx
+        }
+        self._quantities = array("d")
+        self._valeurs = array("d")
+        self._rangs: List[Optional[int]] = []
+
+    @property
+    def row_count(self) -> int:
+        return self._batched_rows + len(self._quantities)
+
+    def add_header(self, line: str):
+        """Enregistre une ligne d'en-tête E; ou L;"""
+        self.headers.append(line)
+
+    def add_data(
+        self, parts: List[str], line_number: int, raw_line: Optional[str] = None
+    ) -> bool:
+        """
+        Ventile une ligne S; déjà découpée dans les tampons
+
+        Retourne False si la ligne est structurellement invalide, auquel cas
+        l'analyse doit s'arrêter.
+        """
+        if len(parts) < self.expected_cols:
+            self._fatal_error = self._short_line_message(line_number, len(parts))
+            return False
+
+        if self.first_numero_inventaire is None:
+            self.first_numero_inventaire = parts[self._inventaire_idx]
+
+        if len(parts) > self.expected_cols:
+            parts = parts[: self.expected_cols]
+            raw_line = None
+        self.raw_lines.append(raw_line if raw_line is not None else ";".join(parts))
+
+        for idx, buffer in self._str_buffers.items():
+            buffer.append(parts[idx])
+
+        try:
+            quantity = float(parts[self._qty_idx])
+        except ValueError:
+            quantity = math.nan
+        if math.isnan(quantity):
+            self._invalid_quantities += 1
+        elif quantity < 0:
+            self._negative_quantities += 1
+        self._quantities.append(quantity)
+
+        if self._valeur_idx is not None:
+            try:
+                valeur = float(parts[self._valeur_idx].replace(",", "."))
+            except ValueError:
+                valeur = math.nan
+            self._valeurs.append(valeur)
+
+        if self._rang_idx is not None:
+            try:
+                rang = int(parts[self._rang_idx])
+            except ValueError:
+                rang = None
+            self._rangs.append(rang)
+
+        if not parts[self._article_idx].strip():
+            self._empty_articles += 1
+
+        if self.batch_rows and len(self._quantities) >= self.batch_rows and self.batch_handler:
+            self._flush_batch()
+
+        return True
+
+    def _flush_batch(self):
+        """Transmet les lignes en tampon au gestionnaire de lots puis vide les tampons"""
+        frame = self._buffer_frame()
+        self._batches.append(self.batch_handler(frame, self.raw_lines))
+        self._batched_rows += len(frame)
+        self._reset_buffers()
+
+    def parse_csv(self, filepath: str, encoding: str = "utf-8") -> SageParseResult:
+        """Analyse un fichier CSV Sage X3 ligne par ligne"""
+        self.reset()
+        with open(filepath, "r", encoding=encoding) as f:
+            for i, line in enumerate(f):
+                line = line.strip()
+                if not line:
+                    continue
+
+                if line.startswith("E;") or line.startswith("L;"):
+                    self.add_header(line)
+                elif line.startswith("S;"):
+                    parts = line.split(";")
+                    if not self.add_data(parts, i + 1, line):
+                        break
+
+        return self.finish()
+
+    def parse_rows(self, rows: Iterable[List[str]]) -> SageParseResult:
+        """Analyse des lignes déjà découpées en cellules (fichiers Excel)"""
+        self.reset()
+        type_idx = self.sage_columns["TYPE_LIGNE"]
+        for i, parts in enumerate(rows):
+            if not parts:
+                continue
+
+            line_type = parts[type_idx] if len(parts) > type_idx else ""
+            if line_type in ("E", "L"):
+                self.add_header(";".join(parts))
+            elif line_type == "S":
+                if not self.add_data(parts, i + 1):
+                    break
+
+        return self.finish()
+
+    def finish(self) -> SageParseResult:
+        """Construit le DataFrame typé et la liste des erreurs de validation"""
+        if self.batch_handler and len(self._quantities) and not self._fatal_error:
+            self._flush_batch()
+
+        result = SageParseResult(
+            headers=self.headers,
+            raw_lines=self.raw_lines,
+            first_numero_inventaire=self.first_numero_inventaire,
+            batches=len(self._batches),
+        )
+
+        if self._fatal_error:
+            result.errors.append(self._fatal_error)
+            return result
+
+        if self.row_count == 0:
+            result.errors.append(
+                "Aucune donnée S; trouvée"
+                if self.source == "csv"
+                else "Aucune donnée S; trouvée dans le fichier XLSX"
+            )
+            return result
+
+        # Mêmes contrôles (et mêmes messages) que DataValidator.validate_sage_structure
+        if self._invalid_quantities:
+            result.errors.append(
+                f"{self._invalid_quantities} valeurs de quantité invalides détectées"
+            )
+        if self._negative_quantities:
+            result.errors.append(
+                f"{self._negative_quantities} quantités négatives détectées"
+            )
+        if self._empty_articles:
+            result.errors.append(
+                f"{self._empty_articles} codes articles vides détectés"
+            )
+
+        if self._batches:
+            result.dataframe = (
+                pd.concat(self._batches, ignore_index=True)
+                if len(self._batches) > 1
+                else self._batches[0]
+            )
+            self._batches = []
+        else:
+            result.dataframe = self._buffer_frame()
+
+        logger.info(
+            f"Analyse {self.source.upper()} terminée: {len(self.headers)} en-têtes, "
+            f"{self.row_count} lignes S;, {result.batches or 1} lot(s), "
+            f"{len(result.errors)} erreurs de validation"
+        )
+        return result
+
+    def _buffer_frame(self) -> pd.DataFrame:
+        """DataFrame typé des lignes S; en tampon"""
+        columns = {}
+        for idx, name in enumerate(self.column_names):
+            if idx == self._qty_idx:
+                columns[name] = np.array(self._quantities, dtype=np.float64)
+            elif idx == self._valeur_idx:
+                columns[name] = np.array(self._valeurs, dtype=np.float64)
+            elif idx == self._rang_idx:
+                columns[name] = pd.array(self._rangs, dtype="Int64")
+            else:
+                columns[name] = np.array(self._str_buffers[idx], dtype=object)
+        return pd.DataFrame(columns)
+
+    def _short_line_message(self, line_number: int, found: int) -> str:
+        if self.source == "csv":
+            return (
+                f"Ligne {line_number} : Format invalide. "
+                f"{self.expected_cols} colonnes requises."
+            )
+        return (
+            f"Ligne {line_number} (S;): Format invalide. {self.expected_cols} "
+            f"colonnes requises, {found} trouvées."
+        )
@@ -1,15 +1,37 @@
 import json
 from datetime import datetime, timedelta
 import os
+import shutil
 from sqlalchemy.orm import Session as DBSession
 from models.session import Session
 from models.inventory_item import InventoryItem
+from models.progress_event import ProgressEvent
+from models.job import Job
 from database import db_manager
+from services.dataframe_cache import dataframe_cache
+from services.frame_schema import apply_schema
+from services.line_store import LineStore
 import logging
 import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc
+from config import config
 
 logger = logging.getLogger(__name__)
 
+# Extension des fichiers de DataFrames selon le format de stockage
+STORAGE_EXTENSIONS = {"arrow": ".arrow", "parquet": ".parquet"}
+
+
+def link_file(source_path: str, target_path: str):
+    """Lien physique vers un fichier immuable, copie à défaut (autre volume, Windows...)"""
+    if os.path.exists(target_path):
+        os.remove(target_path)
+    try:
+        os.link(source_path, target_path)
+    except OSError:
+        shutil.copy2(source_path, target_path)
+
 
 class SessionService:
     def __init__(self):
@@ -17,8 +39,13 @@ class SessionService:
         # Dossiers pour la persistance des DataFrames
         self.data_folder = "data/session_data"
         os.makedirs(self.data_folder, exist_ok=True)
-        # Cache en mémoire pour éviter les rechargements répétés
-        self._dataframe_cache = {}
+        self.storage_format = (
+            config.SESSION_STORAGE_FORMAT
+            if config.SESSION_STORAGE_FORMAT in STORAGE_EXTENSIONS
+            else "parquet"
+        )
+        # Cache mémoire borné, partagé par tout le processus
+        self._dataframe_cache = dataframe_cache
 
     def create_session(
         self, original_filename: str, original_file_path: str, **kwargs
@@ -43,17 +70,45 @@ class SessionService:
         finally:
             db_session.close()
 
+    def _dataframe_path(self, session_id: str, df_name: str, storage_format: str) -> str:
+        extension = STORAGE_EXTENSIONS[storage_format]
+        return os.path.join(self.data_folder, f"{session_id}_{df_name}{extension}")
+
     def save_dataframe(self, session_id: str, df_name: str, dataframe: pd.DataFrame):
-        """Sauvegarde un DataFrame en format Parquet pour une session"""
+        """
+        Sauvegarde un DataFrame pour une session
+
+        Format 'arrow' : Arrow IPC (Feather v2) non compressé, relu par
+        mappage mémoire ; format 'parquet' : fichier Parquet classique.
+        Le fichier est écrit à côté puis renommé pour que les autres workers
+        ne lisent jamais un fichier partiel. Les DataFrames d'étape sont
+        d'abord convertis vers leur schéma compact (voir frame_schema), qui
+        est conservé par la relecture.
+        """
         try:
-            file_path = os.path.join(
-                self.data_folder, f"{session_id}_{df_name}.parquet"
+            dataframe = apply_schema(dataframe, df_name)
+            file_path = self._dataframe_path(session_id, df_name, self.storage_format)
+            tmp_path = f"{file_path}.{os.getpid()}.tmp"
+            if self.storage_format == "arrow":
+                table = pa.Table.from_pandas(dataframe, preserve_index=False)
+                with pa.OSFile(tmp_path, "wb") as sink:
+                    with pa.ipc.new_file(sink, table.schema) as writer:
+                        writer.write_table(table)
+            else:
+                dataframe.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, file_path)
+
+            # Un fichier de l'autre format (ancienne session) serait désormais obsolète
+            for storage_format in STORAGE_EXTENSIONS:
+                if storage_format != self.storage_format:
+                    stale_path = self._dataframe_path(session_id, df_name, storage_format)
+                    if os.path.exists(stale_path):
+                        os.remove(stale_path)
+
+            # Mettre à jour le cache (sans copie, le DataFrame ne doit plus être modifié)
+            self._dataframe_cache.put(
+                f"{session_id}_{df_name}", dataframe, os.stat(file_path).st_mtime_ns
             )
-            dataframe.to_parquet(file_path, index=False)
-
-            # Mettre à jour le cache
-            cache_key = f"{session_id}_{df_name}"
-            self._dataframe_cache[cache_key] = dataframe.copy()
 
             logger.info(f"DataFrame {df_name} sauvegardé pour session {session_id}")
         except Exception as e:
@@ -62,48 +117,117 @@ class SessionService:
             )
             raise
 
+    def has_dataframe(self, session_id: str, df_name: str) -> bool:
+        """Indique si un DataFrame est sauvegardé pour la session (sans le charger)"""
+        return any(
+            os.path.exists(self._dataframe_path(session_id, df_name, storage_format))
+            for storage_format in STORAGE_EXTENSIONS
+        )
+
     def load_dataframe(self, session_id: str, df_name: str) -> pd.DataFrame:
-        """Charge un DataFrame depuis le stockage pour une session avec cache"""
+        """
+        Charge un DataFrame depuis le stockage pour une session avec cache
+
+        Les fichiers Arrow sont mappés en mémoire : les colonnes numériques
+        restent adossées au cache de pages partagé entre les workers. Un
+        fichier réécrit par un autre worker (date de modification différente)
+        invalide l'entrée du cache local.
+        """
         cache_key = f"{session_id}_{df_name}"
 
-        # Vérifier le cache d'abord
-        if cache_key in self._dataframe_cache:
-            logger.debug(
-                f"DataFrame {df_name} récupéré du cache pour session {session_id}"
-            )
-            return self._dataframe_cache[cache_key]
-
         try:
-            file_path = os.path.join(
-                self.data_folder, f"{session_id}_{df_name}.parquet"
-            )
-            if os.path.exists(file_path):
-                df = pd.read_parquet(file_path)
+            # Format courant d'abord, puis l'autre format (sessions existantes)
+            formats = [self.storage_format] + [
+                f for f in STORAGE_EXTENSIONS if f != self.storage_format
+            ]
+            for storage_format in formats:
+                file_path = self._dataframe_path(session_id, df_name, storage_format)
+                try:
+                    version = os.stat(file_path).st_mtime_ns
+                except FileNotFoundError:
+                    continue
+
+                # Vérifier le cache d'abord
+                cached = self._dataframe_cache.get(cache_key, version)
+                if cached is not None:
+                    logger.debug(
+                        f"DataFrame {df_name} récupéré du cache pour session {session_id}"
+                    )
+                    return cached
+
+                if storage_format == "arrow":
+                    with pa.memory_map(file_path, "r") as source:
+                        table = pa.ipc.open_file(source).read_all()
+                    df = table.to_pandas(split_blocks=True)
+                else:
+                    df = pd.read_parquet(file_path)
+
                 # Mettre en cache
-                self._dataframe_cache[cache_key] = df
+                self._dataframe_cache.put(cache_key, df, version)
                 logger.info(f"DataFrame {df_name} chargé pour session {session_id}")
                 return df
-            else:
-                logger.warning(
-                    f"DataFrame {df_name} non trouvé pour session {session_id}"
-                )
-                return None
+
+            logger.warning(
+                f"DataFrame {df_name} non trouvé pour session {session_id}"
+            )
+            return None
         except Exception as e:
             logger.error(
                 f"Erreur chargement DataFrame {df_name} pour session {session_id}: {e}"
             )
             return None
 
+    def link_session_data(self, source_session_id: str, session_id: str, df_names: list) -> bool:
+        """
+        Reprend les DataFrames (et les lignes brutes) d'une autre session
+
+        Les fichiers de session ne sont jamais modifiés sur place (écriture
+        puis renommage) : un lien physique suffit, avec une copie si le
+        système de fichiers ne le permet pas. Retourne False (et ne crée
+        rien) si un fichier de la session source manque.
+        """
+        links = []
+        for df_name in df_names:
+            for storage_format in STORAGE_EXTENSIONS:
+                source_path = self._dataframe_path(source_session_id, df_name, storage_format)
+                if os.path.exists(source_path):
+                    links.append((source_path, self._dataframe_path(session_id, df_name, storage_format)))
+                    break
+            else:
+                logger.warning(f"DataFrame {df_name} absent de la session {source_session_id}")
+                return False
+
+        source_lines = LineStore.for_session(self, source_session_id)
+        if source_lines.exists():
+            links.append((source_lines.path, LineStore.for_session(self, session_id).path))
+
+        try:
+            for source_path, target_path in links:
+                link_file(source_path, target_path)
+        except OSError as e:
+            logger.error(f"Erreur reprise des données de {source_session_id} pour session {session_id}: {e}")
+            self.cleanup_session_data(session_id)
+            return False
+
+        logger.info(f"Données de la session {source_session_id} reprises pour session {session_id}")
+        return True
+
     def cleanup_session_data(self, session_id: str):
         """Nettoie les fichiers de données d'une session"""
+        self._dataframe_cache.invalidate_prefix(f"{session_id}_")
         try:
             import glob
 
-            pattern = os.path.join(self.data_folder, f"{session_id}_*.parquet")
-            files = glob.glob(pattern)
-            for file_path in files:
-                os.remove(file_path)
-                logger.info(f"Fichier de données supprimé: {file_path}")
+            for extension in STORAGE_EXTENSIONS.values():
+                pattern = os.path.join(self.data_folder, f"{session_id}_*{extension}")
+                for file_path in glob.glob(pattern):
+                    os.remove(file_path)
+                    logger.info(f"Fichier de données supprimé: {file_path}")
+
+            # Lignes brutes de la session
+            line_store = LineStore.for_session(self, session_id)
+            if line_store.exists():
+                os.remove(line_store.path)
         except Exception as e:
             logger.error(f"Erreur nettoyage données session {session_id}: {e}")
 
@@ -210,10 +334,14 @@ class SessionService:
         """Supprime une session et ses données associées"""
         db_session = self.db.get_session()
         try:
-            # Supprimer les items d'inventaire
+            # Supprimer les items d'inventaire, les événements de progression et les jobs
             db_session.query(InventoryItem).filter(
                 InventoryItem.session_id == session_id
             ).delete()
+            db_session.query(ProgressEvent).filter(
+                ProgressEvent.session_id == session_id
+            ).delete()
+            db_session.query(Job).filter(Job.session_id == session_id).delete()
 
             # Supprimer la session
             session = db_session.query(Session).filter(Session.id == session_id).first()
@@ -245,10 +373,14 @@ class SessionService:
 
             count = 0
             for session in expired_sessions:
-                # Supprimer les items associés
+                # Supprimer les items, événements et jobs associés
                 db_session.query(InventoryItem).filter(
                     InventoryItem.session_id == session.id
                 ).delete()
+                db_session.query(ProgressEvent).filter(
+                    ProgressEvent.session_id == session.id
+                ).delete()
+                db_session.query(Job).filter(Job.session_id == session.id).delete()
 
                 # Supprimer la session
                 db_session.delete(session)
@@ -304,3 +436,7 @@ class SessionService:
             return []
         finally:
             db_session.close()
+
+
+# Instance globale
+session_service = SessionService()
@@ -0,0 +1,144 @@
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+# Modules lourds importés une fois pour toutes dans chaque processus du pool
+import openpyxl  # noqa: F401
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class ArrowFrame:
+    """DataFrame sérialisé en flux Arrow IPC (résultat d'une étape du pool)"""
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame):
+        table = pa.Table.from_pandas(df)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return cls(sink.getvalue().to_pybytes())
+
+    def to_frame(self) -> pd.DataFrame:
+        return pa.ipc.open_stream(pa.py_buffer(self.data)).read_all().to_pandas()
+
+
+def encode_result(value: Any) -> Any:
+    """DataFrames du résultat (seul ou dans un tuple) en buffers Arrow"""
+    if isinstance(value, tuple):
+        return tuple(encode_result(item) for item in value)
+    if isinstance(value, pd.DataFrame):
+        try:
+            return ArrowFrame.from_frame(value)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+            # Colonne d'objets hétérogènes : le DataFrame est transmis tel quel (pickle)
+            logger.debug(f"DataFrame non convertible en Arrow ({e}), transmis par pickle")
+    return value
+
+
+def decode_result(value: Any) -> Any:
+    if isinstance(value, tuple):
+        return tuple(decode_result(item) for item in value)
+    if isinstance(value, ArrowFrame):
+        return value.to_frame()
+    return value
+
+
+def _warm_up():
+    """
+    Initialisation de chaque processus du pool
+
+    Les partitions sont traitées en série (pas de pool dans le pool), le
+    cache de DataFrames du processus est désactivé (les fichiers de session
+    font foi) et les connexions héritées du processus parent sont écartées.
+    """
+    from database import db_manager
+    from services.dataframe_cache import dataframe_cache
+    from services.partition_executor import partition_executor
+
+    partition_executor.workers = 0
+    dataframe_cache.max_bytes = 0
+    dataframe_cache.clear()
+    db_manager.engine.dispose(close=False)
+
+
+def _run_stage(func: Callable, args: tuple) -> Any:
+    return encode_result(func(*args))
+
+
+def _ready() -> bool:
+    return True
+
+
+class StagePool:
+    """
+    Pool de processus chauds pour les étapes lourdes du traitement
+
+    Les étapes (analyse, agrégation, template, répartition, fichier final)
+    sont exécutées hors du worker qui a reçu la requête : celui-ci reste
+    disponible pour les contrôles de santé et les téléchargements. Les
+    processus sont démarrés à l'avance avec pandas, pyarrow et openpyxl
+    importés ; les DataFrames retournés reviennent sous forme de buffers
+    Arrow IPC. Sans workers, les étapes s'exécutent directement.
+    """
+
+    def __init__(self, workers: int = 0):
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0
+
+    def start(self):
+        """Démarre les processus (idempotent) et attend qu'ils soient prêts"""
+        if not self.enabled:
+            return
+        pool = self._get_pool()
+        for future in [pool.submit(_ready) for _ in range(self.workers)]:
+            future.result()
+        logger.info(f"Pool d'étapes prêt: {self.workers} processus")
+
+    def run(self, func: Callable, *args) -> Any:
+        """
+        Exécute func(*args) dans le pool (ou directement s'il est désactivé)
+
+        func doit être une fonction de module. Si le pool est cassé (processus
+        tué), l'étape est exécutée directement et le pool recréé.
+        """
+        if not self.enabled:
+            return func(*args)
+        try:
+            return decode_result(self._get_pool().submit(_run_stage, func, args).result())
+        except BrokenProcessPool as e:
+            logger.error(f"Pool d'étapes indisponible ({e}), exécution directe de {func.__name__}")
+            self.shutdown()
+            return func(*args)
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_up)
+            return self._pool
+
+    def shutdown(self, wait: bool = False):
+        """Arrête le pool (recréé au prochain usage)"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
+
+
+# Instance globale
+stage_pool = StagePool(workers=config.STAGE_POOL_WORKERS)
@@ -0,0 +1,272 @@
+import logging
+import zipfile
+import posixpath
+import xml.etree.ElementTree as ET
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+STRICT_NS = "http://purl.oclc.org/ooxml/spreadsheetml/main"
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+STRICT_REL_NS = "http://purl.oclc.org/ooxml/officeDocument/relationships"
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+
+class XlsxReadError(ValueError):
+    """Fichier illisible par le lecteur natif (format non XLSX ou archive invalide)"""
+
+
+class XlsxReader:
+    """
+    Lecteur XLSX en flux, sans passer par openpyxl
+
+    Le classeur est lu directement depuis l'archive ZIP :
+    - la table des chaînes partagées est décodée une seule fois
+    - les lignes de la première feuille sont produites au fil de l'eau
+    - seules les cellules des colonnes demandées sont converties
+
+    Les nombres sont typés comme le fait pandas (entier si la valeur est
+    entière, flottant sinon) et les chaînes vides valent None. Les styles ne sont pas interprétés : une date
+    Excel est donc renvoyée sous forme de numéro de série.
+    """
+
+    def __init__(self, source: Union[str, BinaryIO]):
+        try:
+            self._zip = zipfile.ZipFile(source)
+        except (zipfile.BadZipFile, OSError) as e:
+            raise XlsxReadError(f"Archive XLSX invalide: {e}") from e
+
+        self._names = set(self._zip.namelist())
+        self.sheet_path, shared_strings_path = self._resolve_parts()
+        self._ns = self._detect_namespace(self.sheet_path)
+        self._shared_strings = self._load_shared_strings(shared_strings_path)
+        self._column_cache: Dict[str, int] = {}
+
+    def close(self):
+        self._zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def iter_rows(
+        self, columns: Optional[Iterable[int]] = None, width: Optional[int] = None
+    ) -> Iterator[List[Any]]:
+        """
+        Produit les lignes de la première feuille
+
+        Args:
+            columns: indices (base 0) des colonnes à convertir, les autres
+                cellules valent None
+            width: largeur des lignes produites (complétées par None)
+
+        Une liste vide est produite pour chaque ligne absente de la feuille,
+        la position d'une ligne dans le flux correspond donc à son numéro
+        Excel moins un.
+        """
+        wanted = set(columns) if columns is not None else None
+        ns = self._ns
+        row_tag, cell_tag, sheet_data_tag = f"{{{ns}}}row", f"{{{ns}}}c", f"{{{ns}}}sheetData"
+        value_tag, text_tag = f"{{{ns}}}v", f"{{{ns}}}t"
+        shared_strings = self._shared_strings
+
+        expected_row = 1
+        with self._zip.open(self.sheet_path) as stream:
+            sheet_data = None
+            for event, elem in ET.iterparse(stream, events=("start", "end")):
+                if event == "start":
+                    if elem.tag == sheet_data_tag:
+                        sheet_data = elem
+                    continue
+                if elem.tag != row_tag:
+                    continue
+
+                row_ref = elem.get("r")
+                row_number = int(row_ref) if row_ref else expected_row
+                while expected_row < row_number:
+                    yield []
+                    expected_row += 1
+                expected_row = row_number + 1
+
+                values: List[Any] = [None] * width if width else []
+                position = -1
+                for cell in elem:
+                    if cell.tag != cell_tag:
+                        continue
+                    ref = cell.get("r")
+                    position = self._column_index(ref) if ref else position + 1
+                    if wanted is not None and position not in wanted:
+                        continue
+                    if width:
+                        if position >= width:
+                            continue
+                    elif position >= len(values):
+                        values.extend([None] * (position + 1 - len(values)))
+
+                    cell_type = cell.get("t")
+                    if cell_type == "inlineStr":
+                        value = "".join(t.text or "" for t in cell.iter(text_tag)) or None
+                    else:
+                        v = cell.find(value_tag)
+                        text = v.text if v is not None else None
+                        if text is None:
+                            value = None
+                        elif cell_type == "s":
+                            value = shared_strings[int(text)] or None
+                        elif cell_type in ("str", None, "n"):
+                            value = text if cell_type == "str" else _to_number(text)
+                        elif cell_type == "b":
+                            value = text == "1"
+                        else:
+                            # Cellule en erreur (#N/A, #REF!...) ou type inconnu
+                            value = None
+                    values[position] = value
+
+                elem.clear()
+                if sheet_data is not None:
+                    sheet_data.clear()
+                yield values
+
+    def read_table(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Lit la première feuille sous forme de table (première ligne = en-têtes)
+
+        Args:
+            columns: colonnes à conserver; les colonnes absentes du fichier sont
+                ignorées afin de laisser la validation les signaler
+        """
+        header: List[Any] = []
+        header_index = -1
+        rows = self.iter_rows()
+        for header_index, values in enumerate(rows):
+            if any(v is not None for v in values):
+                header = values
+                break
+        rows.close()
+
+        positions: Dict[str, int] = {}
+        for i, name in enumerate(header):
+            if name is not None:
+                positions.setdefault(str(name), i)
+
+        names = [c for c in columns if c in positions] if columns else list(positions)
+        indices = [positions[name] for name in names]
+        data: Dict[str, list] = {name: [] for name in names}
+
+        if indices:
+            rows = self.iter_rows(columns=indices, width=max(indices) + 1)
+            for row_index, values in enumerate(rows):
+                if row_index <= header_index or not values:
+                    continue
+                cells = [values[idx] for idx in indices]
+                if all(v is None for v in cells):
+                    continue
+                for name, value in zip(names, cells):
+                    data[name].append(np.nan if value is None else value)
+
+        return pd.DataFrame(data, columns=names)
+
+    def _resolve_parts(self):
+        """Retrouve la première feuille et la table des chaînes partagées"""
+        if "xl/workbook.xml" not in self._names:
+            raise XlsxReadError("Classeur XLSX invalide: xl/workbook.xml absent")
+
+        workbook = ET.fromstring(self._zip.read("xl/workbook.xml"))
+        sheet = next((e for e in workbook.iter() if _local(e.tag) == "sheet"), None)
+        if sheet is None:
+            raise XlsxReadError("Classeur XLSX sans feuille")
+        rel_id = sheet.get(f"{{{REL_NS}}}id") or sheet.get(f"{{{STRICT_REL_NS}}}id")
+
+        targets: Dict[str, str] = {}
+        shared_strings_path = None
+        if "xl/_rels/workbook.xml.rels" in self._names:
+            rels = ET.fromstring(self._zip.read("xl/_rels/workbook.xml.rels"))
+            for rel in rels.iter(f"{{{PKG_REL_NS}}}Relationship"):
+                target = rel.get("Target", "")
+                target = (
+                    target.lstrip("/")
+                    if target.startswith("/")
+                    else posixpath.normpath(posixpath.join("xl", target))
+                )
+                targets[rel.get("Id")] = target
+                if rel.get("Type", "").endswith("/sharedStrings"):
+                    shared_strings_path = target
+
+        sheet_path = targets.get(rel_id, "xl/worksheets/sheet1.xml")
+        if sheet_path not in self._names:
+            raise XlsxReadError(f"Feuille introuvable dans l'archive: {sheet_path}")
+        if shared_strings_path is None and "xl/sharedStrings.xml" in self._names:
+            shared_strings_path = "xl/sharedStrings.xml"
+        return sheet_path, shared_strings_path
+
+    def _detect_namespace(self, part: str) -> str:
+        with self._zip.open(part) as stream:
+            head = stream.read(2048)
+        return STRICT_NS if STRICT_NS.encode() in head else MAIN_NS
+
+    def _load_shared_strings(self, part: Optional[str]) -> List[str]:
+        """Décode la table des chaînes partagées (texte riche concaténé, phonétique ignorée)"""
+        if not part or part not in self._names:
+            return []
+
+        ns = self._detect_namespace(part)
+        si_tag, t_tag, r_tag = f"{{{ns}}}si", f"{{{ns}}}t", f"{{{ns}}}r"
+        strings: List[str] = []
+        with self._zip.open(part) as stream:
+            root = None
+            for event, elem in ET.iterparse(stream, events=("start", "end")):
+                if event == "start":
+                    if root is None:
+                        root = elem
+                    continue
+                if elem.tag != si_tag:
+                    continue
+                parts = []
+                for child in elem:
+                    if child.tag == t_tag:
+                        parts.append(child.text or "")
+                    elif child.tag == r_tag:
+                        t = child.find(t_tag)
+                        if t is not None:
+                            parts.append(t.text or "")
+                strings.append("".join(parts))
+                root.clear()
+        return strings
+
+    def _column_index(self, ref: str) -> int:
+        letters = ref.rstrip("0123456789")
+        index = self._column_cache.get(letters)
+        if index is None:
+            index = 0
+            for char in letters:
+                index = index * 26 + (ord(char) - 64)
+            index -= 1
+            self._column_cache[letters] = index
+        return index
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _to_number(text: str) -> Union[int, float]:
+    """Convertit une valeur numérique Excel (entier si la valeur est entière)"""
+    try:
+        return int(text)
+    except ValueError:
+        value = float(text)
+        return int(value) if value.is_integer() else value
+
+
+def read_xlsx_table(
+    source: Union[str, BinaryIO], columns: Optional[List[str]] = None
+) -> pd.DataFrame:
+    """Raccourci : lit la première feuille d'un classeur sous forme de DataFrame"""
+    with XlsxReader(source) as reader:
+        return reader.read_table(columns)
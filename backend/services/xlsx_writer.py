@@ -0,0 +1,173 @@
+import logging
+import zipfile
+from typing import List, Optional
+from xml.sax.saxutils import escape, quoteattr
+
+import numpy as np
+import pandas as pd
+from openpyxl.utils import get_column_letter
+
+from services.xlsx_reader import MAIN_NS, PKG_REL_NS, REL_NS
+
+logger = logging.getLogger(__name__)
+
+# Caractères interdits dans un document XML 1.0
+ILLEGAL_XML_CHARS = r"[\x00-\x08\x0b\x0c\x0e-\x1f]"
+
+CONTENT_TYPES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    "</Types>"
+)
+
+ROOT_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    f'<Relationships xmlns="{PKG_REL_NS}">'
+    f'<Relationship Id="rId1" Type="{REL_NS}/officeDocument" Target="xl/workbook.xml"/>'
+    "</Relationships>"
+)
+
+WORKBOOK_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    f'<Relationships xmlns="{PKG_REL_NS}">'
+    f'<Relationship Id="rId1" Type="{REL_NS}/worksheet" Target="worksheets/sheet1.xml"/>'
+    f'<Relationship Id="rId2" Type="{REL_NS}/styles" Target="styles.xml"/>'
+    "</Relationships>"
+)
+
+# Style 1 = en-tête identique à celui de DataFrame.to_excel (gras, bordure fine, centré)
+STYLES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    f'<styleSheet xmlns="{MAIN_NS}">'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="2"><border><left/><right/><top/><bottom/><diagonal/></border>'
+    '<border><left style="thin"/><right style="thin"/><top style="thin"/>'
+    '<bottom style="thin"/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="1" xfId="0" applyFont="1" '
+    'applyBorder="1" applyAlignment="1"><alignment horizontal="center" vertical="top"/></xf>'
+    "</cellXfs>"
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    "</styleSheet>"
+)
+
+
+def column_widths(df: pd.DataFrame, max_width: int = 50) -> List[int]:
+    """
+    Largeur de chaque colonne : texte le plus long (en-tête compris) + 2,
+    plafonnée à max_width ; les cellules vides sont ignorées
+    """
+    widths = []
+    for name in df.columns:
+        values = df[name]
+        values = values[values.notna()]
+        longest = int(values.astype(str).str.len().max()) if len(values) else 0
+        widths.append(min(max(longest, len(str(name))) + 2, max_width))
+    return widths
+
+
+def _text(values: pd.Series) -> pd.Series:
+    """Texte XML échappé de chaque valeur"""
+    text = values.astype(str)
+    if text.str.contains(r"[&<>\x00-\x1f]", regex=True).any():
+        text = text.str.replace(ILLEGAL_XML_CHARS, "", regex=True).map(escape)
+    return text
+
+
+def _column_cells(values: pd.Series, refs: pd.Series) -> pd.Series:
+    """Fragments XML <c> d'une colonne (chaîne vide pour les valeurs manquantes)"""
+    present = values.notna().to_numpy()
+    if pd.api.types.is_bool_dtype(values):
+        cells = '<c r="' + refs + '" t="b"><v>' + values.astype(int).astype(str) + "</v></c>"
+    elif pd.api.types.is_numeric_dtype(values):
+        cells = '<c r="' + refs + '"><v>' + values.astype(str) + "</v></c>"
+    else:
+        cells = (
+            '<c r="' + refs + '" t="inlineStr"><is><t xml:space="preserve">'
+            + _text(values) + "</t></is></c>"
+        )
+    return cells.where(present, "")
+
+
+def write_xlsx_table(
+    path: str,
+    df: pd.DataFrame,
+    sheet_name: str = "Sheet1",
+    max_width: int = 50,
+    chunk_size: int = 20000,
+    hidden_columns: Optional[List[str]] = None,
+):
+    """
+    Écrit un DataFrame dans un classeur XLSX en flux
+
+    Le XML de la feuille est produit colonne par colonne (opérations
+    vectorisées sur les chaînes) par blocs de lignes et écrit directement
+    dans l'archive, sans construire de cellules en mémoire. Les largeurs de
+    colonnes sont calculées à partir des longueurs de texte. Les nombres
+    restent des nombres, les valeurs manquantes des cellules vides et les
+    chaînes sont écrites en ligne (inlineStr). Les colonnes de
+    hidden_columns sont masquées (identifiants techniques).
+    """
+    letters = [get_column_letter(i) for i in range(1, len(df.columns) + 1)]
+    last_ref = f"{letters[-1]}{len(df) + 1}" if letters else "A1"
+
+    hidden = set(hidden_columns or [])
+    cols_xml = "".join(
+        f'<col min="{i}" max="{i}" width="{width}" customWidth="1"'
+        + (' hidden="1"/>' if name in hidden else "/>")
+        for i, (name, width) in enumerate(zip(df.columns, column_widths(df, max_width)), start=1)
+    )
+    header_xml = "".join(
+        f'<c r="{letter}1" s="1" t="inlineStr"><is><t>{escape(str(name))}</t></is></c>'
+        for letter, name in zip(letters, df.columns)
+    )
+
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", CONTENT_TYPES_XML)
+        archive.writestr("_rels/.rels", ROOT_RELS_XML)
+        archive.writestr(
+            "xl/workbook.xml",
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            f'<workbook xmlns="{MAIN_NS}" xmlns:r="{REL_NS}"><sheets>'
+            f'<sheet name={quoteattr(sheet_name)} sheetId="1" r:id="rId1"/>'
+            "</sheets></workbook>",
+        )
+        archive.writestr("xl/_rels/workbook.xml.rels", WORKBOOK_RELS_XML)
+        archive.writestr("xl/styles.xml", STYLES_XML)
+
+        with archive.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(
+                (
+                    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                    f'<worksheet xmlns="{MAIN_NS}" xmlns:r="{REL_NS}">'
+                    f'<dimension ref="A1:{last_ref}"/>'
+                    + (f"<cols>{cols_xml}</cols>" if cols_xml else "")
+                    + f'<sheetData><row r="1">{header_xml}</row>'
+                ).encode("utf-8")
+            )
+
+            for start in range(0, len(df), chunk_size):
+                chunk = df.iloc[start:start + chunk_size]
+                row_numbers = pd.Series(
+                    np.arange(start + 2, start + 2 + len(chunk)).astype(str), index=chunk.index
+                )
+                rows = '<row r="' + row_numbers + '">'
+                for letter, name in zip(letters, df.columns):
+                    rows = rows + _column_cells(chunk[name], letter + row_numbers)
+                sheet.write(("".join(rows + "</row>")).encode("utf-8"))
+
+            sheet.write(b"</sheetData></worksheet>")
+
+    logger.info(f"Classeur écrit: {path} ({len(df)} lignes)")
@@ -7,15 +7,37 @@ from unittest.mock import Mock, patch
 import pandas as pd
 from datetime import datetime
 
+# Base et dossiers de test (avant l'import de l'application) : les tests
+# n'écrivent ni dans database/sage_x3.db ni dans uploads/processed/final/logs
+TEST_ROOT = tempfile.mkdtemp(prefix='inventory_tests_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(TEST_ROOT, 'test.db')}"
+for name, folder in (('UPLOAD_FOLDER', 'uploads'), ('PROCESSED_FOLDER', 'processed'),
+                     ('FINAL_FOLDER', 'final'), ('ARCHIVE_FOLDER', 'archive'), ('LOG_FOLDER', 'logs')):
+    os.environ[name] = os.path.join(TEST_ROOT, folder)
+
 # Import de l'application
 import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app import app, config
+from services.session_service import session_service
+from services.dataframe_cache import dataframe_cache
+from services.job_service import job_service
 from services.session_service import SessionService
 from services.file_processor import FileProcessorService
 from database import db_manager
 
+@pytest.fixture(scope='session', autouse=True)
+def isolated_storage():
+    """Fichiers de session dans TEST_ROOT, supprimé (avec la base) en fin de tests"""
+    session_service.data_folder = os.path.join(TEST_ROOT, 'session_data')
+    os.makedirs(session_service.data_folder, exist_ok=True)
+    dataframe_cache.clear()
+    yield TEST_ROOT
+    job_service.stop(timeout=5)
+    db_manager.engine.dispose()
+    shutil.rmtree(TEST_ROOT, ignore_errors=True)
+
 @pytest.fixture
 def client():
     """Client de test Flask"""
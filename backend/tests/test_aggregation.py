@@ -0,0 +1,57 @@
+import pytest
+import pandas as pd
+from unittest.mock import patch
+from services.file_processor import FileProcessorService
+from services.partition_executor import PartitionExecutor
+
+class TestAggregateData:
+    """Tests pour l'agrégation vectorisée des lots par article"""
+
+    @pytest.fixture
+    def processor(self):
+        with patch('services.file_processor.config_service') as mock_config:
+            mock_config.get_sage_columns.return_value = {'TYPE_LIGNE': 0}
+            mock_config.get_validation_config.return_value = {}
+            mock_config.get_processing_config.return_value = {
+                'aggregation_keys': ['CODE_ARTICLE', 'EMPLACEMENT']
+            }
+            mock_config.get_lot_patterns.return_value = {}
+            mock_config._config = {}
+            return FileProcessorService()
+
+    @pytest.fixture
+    def lots_df(self):
+        return pd.DataFrame({
+            'CODE_ARTICLE': ['ART1', 'ART1', 'ART2', 'ART2', 'ART3', 'ART4', 'ART5'],
+            'EMPLACEMENT': ['E1'] * 7,
+            'NUMERO_INVENTAIRE': ['INV1'] * 7,
+            'QUANTITE': [10, 5, 3, 4, 7, 1, 2],
+            'NUMERO_SESSION': ['SES1'] * 7,
+            'SITE': ['BKE02'] * 7,
+            'Date_Lot': pd.to_datetime(['2025-03-01', '2025-01-01', None, '2025-02-01', None, None, '2024-12-01']),
+            'Type_Lot': pd.Categorical(['type1', 'type1', 'unknown', 'type2', 'unknown', None, 'type1']),
+        })
+
+    def test_priority_and_date_min(self, processor, lots_df):
+        """Test type prioritaire (minimum ordonné) et date minimale par groupe"""
+        aggregated = processor.aggregate_data(lots_df).set_index('CODE_ARTICLE')
+
+        assert aggregated.loc['ART1', 'Quantite_Theorique_Totale'] == 15
+        assert aggregated.loc['ART1', 'Date_Min'] == pd.Timestamp('2025-01-01')
+        assert aggregated.loc['ART2', 'Type_Lot_Prioritaire'] == 'type2'
+        assert aggregated.loc['ART2', 'Date_Min'] == pd.Timestamp('2025-02-01')
+        assert pd.isna(aggregated.loc['ART3', 'Date_Min'])
+        assert aggregated.loc['ART4', 'Type_Lot_Prioritaire'] == 'unknown'
+
+    def test_sort_by_priority_then_date(self, processor, lots_df):
+        """Test tri par type prioritaire puis date, ordre des clés conservé à égalité"""
+        aggregated = processor.aggregate_data(lots_df)
+
+        assert aggregated['CODE_ARTICLE'].tolist() == ['ART5', 'ART1', 'ART2', 'ART3', 'ART4']
+
+    def test_config_keys_not_mutated(self, processor, lots_df):
+        """Test la configuration des clés n'est pas modifiée par l'agrégation"""
+        processor.aggregate_data(lots_df)
+        processor.aggregate_data(lots_df)
+
+        assert processor.processing_config['aggregation_keys'] == ['CODE_ARTICLE', 'EMPLACEMENT']
@@ -0,0 +1,56 @@
+import io
+import pytest
+import pandas as pd
+from unittest.mock import Mock
+from werkzeug.datastructures import FileStorage
+from services.completed_template import CompletedTemplate
+from services.file_processor import FileProcessorService
+
+class TestCompletedTemplate:
+    """Tests pour la lecture unique du template complété"""
+
+    def make_upload(self, df, filename='completed.xlsx'):
+        buffer = io.BytesIO()
+        df.to_excel(buffer, index=False)
+        buffer.seek(0)
+        return FileStorage(stream=buffer, filename=filename)
+
+    @pytest.fixture
+    def template_df(self):
+        return pd.DataFrame({
+            'Numéro Session': ['SES1', 'SES1'],
+            'Numéro Inventaire': ['INV1', 'INV1'],
+            'Code Article': ['ART001', 'ART002'],
+            'Quantité Théorique': [10, 0],
+            'Quantité Réelle': [8, 3],
+        })
+
+    def test_parsed_once_and_reused(self, template_df, tmp_path):
+        """Test une seule lecture pour la validation et la sauvegarde"""
+        reader = Mock(side_effect=FileProcessorService().read_completed_template)
+        template = CompletedTemplate.from_upload(self.make_upload(template_df), reader)
+
+        assert template.validate()[0] is True
+        path = tmp_path / 'completed.xlsx'
+        template.save(str(path))
+
+        assert reader.call_count == 1
+        assert template.df['Code Article'].tolist() == ['ART001', 'ART002']
+        assert path.read_bytes() == template.content
+
+    def test_validation_errors(self, template_df):
+        """Test quantités manquantes signalées"""
+        template_df['Quantité Réelle'] = [8, None]
+        template = CompletedTemplate.from_upload(
+            self.make_upload(template_df), FileProcessorService().read_completed_template
+        )
+
+        is_valid, _, errors = template.validate()
+        assert is_valid is False
+        assert 'ART002' in errors[0]
+
+    def test_empty_upload(self):
+        """Test fichier vide refusé"""
+        upload = FileStorage(stream=io.BytesIO(b''), filename='completed.xlsx')
+        with pytest.raises(ValueError):
+            CompletedTemplate.from_upload(upload, Mock())
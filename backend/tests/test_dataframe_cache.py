@@ -0,0 +1,56 @@
+import pytest
+import pandas as pd
+from services.dataframe_cache import DataFrameCache
+
+class TestDataFrameCache:
+    """Tests pour le cache mémoire borné des DataFrames"""
+
+    @pytest.fixture
+    def frame(self):
+        return pd.DataFrame({'CODE_ARTICLE': ['ART%03d' % i for i in range(100)], 'QUANTITE': range(100)})
+
+    def test_no_copy_and_counters(self, frame):
+        """Test retour du même objet et compteurs hits/misses"""
+        cache = DataFrameCache(max_bytes=10**8)
+        cache.put('s1_original_df', frame)
+
+        assert cache.get('s1_original_df') is frame
+        assert cache.get('s1_autre') is None
+        stats = cache.stats()
+        assert stats['hits'] == 1 and stats['misses'] == 1
+        assert stats['current_bytes'] == frame.memory_usage(deep=True).sum()
+
+    def test_lru_eviction_by_bytes(self, frame):
+        """Test éviction de l'entrée la moins récemment utilisée"""
+        size = int(frame.memory_usage(deep=True).sum())
+        cache = DataFrameCache(max_bytes=2 * size)
+        cache.put('a', frame)
+        cache.put('b', frame.copy())
+        cache.get('a')
+        cache.put('c', frame.copy())
+
+        assert 'a' in cache and 'c' in cache and 'b' not in cache
+        assert cache.current_bytes == 2 * size
+        assert cache.evictions == 1
+
+    def test_ttl_and_invalidation(self, frame, monkeypatch):
+        """Test expiration et suppression par session"""
+        now = [1000.0]
+        monkeypatch.setattr('services.dataframe_cache.time.monotonic', lambda: now[0])
+        cache = DataFrameCache(max_bytes=10**8, ttl=60)
+        cache.put('s1_a', frame)
+        cache.put('s2_a', frame)
+
+        cache.invalidate_prefix('s2_')
+        assert 's2_a' not in cache
+
+        now[0] += 61
+        assert cache.get('s1_a') is None
+        assert cache.current_bytes == 0
+
+    def test_oversized_frame_not_cached(self, frame):
+        """Test DataFrame plus gros que le budget ignoré"""
+        cache = DataFrameCache(max_bytes=10)
+        cache.put('big', frame)
+
+        assert len(cache) == 0 and cache.current_bytes == 0
@@ -0,0 +1,81 @@
+import pytest
+import pandas as pd
+from app import InventoryProcessor
+from services.lot_index import LotIndex
+
+class TestCalculateDiscrepancies:
+    """Tests pour le calcul des écarts par jointure"""
+
+    @pytest.fixture
+    def processor(self):
+        return InventoryProcessor()
+
+    @pytest.fixture
+    def original_df(self, sample_dataframe):
+        df = sample_dataframe.copy()
+        df['NUMERO_LOT'] = [' LOT123456 ', 'CPKU070725001', None]
+        df['Type_Lot'] = ['type2', 'type1', 'unknown']
+        df['Date_Lot'] = pd.to_datetime([None, '2025-07-07', None])
+        df['original_s_line_raw'] = ['S;1', 'S;2', 'S;3']
+        return df
+
+    def test_join_on_article_and_inventory(self, processor, original_df):
+        """Test rapprochement des saisies, dernière saisie prioritaire"""
+        completed_df = pd.DataFrame({
+            'Code Article': ['ART001', 'ART002', 'ART001'],
+            'Numéro Inventaire': ['BKE022508INV00000006'] * 3,
+            'Quantité Réelle': [90, 55, 95],
+        })
+
+        discrepancies, unmatched = processor._calculate_discrepancies(completed_df, original_df)
+
+        assert list(discrepancies.columns) == [
+            'CODE_ARTICLE', 'NUMERO_INVENTAIRE', 'NUMERO_LOT', 'TYPE_LOT',
+            'QUANTITE_ORIGINALE', 'QUANTITE_REELLE_SAISIE_TOTALE', 'AJUSTEMENT',
+            'QUANTITE_CORRIGEE', 'Date_Lot', 'original_s_line_raw'
+        ]
+        assert discrepancies['NUMERO_LOT'].tolist() == ['LOT123456', 'CPKU070725001', '']
+        # ART003 absent du template : quantité saisie = 0
+        assert discrepancies['QUANTITE_REELLE_SAISIE_TOTALE'].tolist() == [95, 55, 0]
+        assert discrepancies['QUANTITE_CORRIGEE'].tolist() == [100.0, 50.0, 0.0]
+        assert (discrepancies['AJUSTEMENT'] == 0).all()
+        assert discrepancies['original_s_line_raw'].tolist() == ['S;1', 'S;2', 'S;3']
+
+        assert unmatched.to_dict('records') == [
+            {'CODE_ARTICLE': 'ART003', 'NUMERO_INVENTAIRE': 'BKE022508INV00000006', 'SOURCE': 'original'}
+        ]
+
+    def test_unmatched_template_keys(self, processor, original_df):
+        """Test signalement des saisies absentes des données originales"""
+        completed_df = pd.DataFrame({
+            'Code Article': ['ART001', 'ART002', 'ART003', 'ART999'],
+            'Numéro Inventaire': ['BKE022508INV00000006'] * 3 + ['AUTRE_INV'],
+            'Quantité Réelle': [100, 50, 0, 4],
+        })
+
+        discrepancies, unmatched = processor._calculate_discrepancies(completed_df, original_df)
+
+        assert discrepancies['QUANTITE_REELLE_SAISIE_TOTALE'].tolist() == [100, 50, 0]
+        assert unmatched.to_dict('records') == [
+            {'CODE_ARTICLE': 'ART999', 'NUMERO_INVENTAIRE': 'AUTRE_INV', 'SOURCE': 'template'}
+        ]
+
+    def test_join_by_template_key(self, processor, original_df):
+        """Test rapprochement par la colonne masquée, lignes modifiées ou ajoutées"""
+        lot_index = LotIndex.build(original_df)
+        original_df = lot_index.with_ids(original_df)
+        art001, art002 = original_df['KEY_ID'].iloc[0], original_df['KEY_ID'].iloc[1]
+        completed_df = pd.DataFrame({
+            'Code Article': ['ART001', 'ART002', 'ART999'],
+            'Numéro Inventaire': ['BKE022508INV00000006'] * 3,
+            'Quantité Réelle': [90, 55, 4],
+            # ART002 porte le numéro de clé d'ART001 (ligne modifiée) ; ART999 ajoutée à la main
+            'Clé Ligne': [art001, art001, None],
+        })
+
+        discrepancies, unmatched = processor._calculate_discrepancies(completed_df, original_df, lot_index)
+
+        assert discrepancies['QUANTITE_REELLE_SAISIE_TOTALE'].tolist() == [90, 55, 0]
+        assert discrepancies['KEY_ID'].tolist()[:2] == [art001, art002]
+        assert discrepancies['ROW_ID'].tolist() == [0, 1, 2]
+        assert unmatched['SOURCE'].tolist() == ['original', 'template']
@@ -0,0 +1,136 @@
+import logging
+import pytest
+import numpy as np
+import pandas as pd
+from services.distribution_engine import DistributionEngine
+
+
+def _reference_distribution(df, strategy):
+    """Répartition lot par lot (algorithme historique) pour comparaison"""
+    rows = []
+    for _, group in df.groupby(['CODE_ARTICLE', 'NUMERO_INVENTAIRE']):
+        ecart = group['QUANTITE_REELLE_SAISIE_TOTALE'].iloc[0] - group['QUANTITE_ORIGINALE'].sum()
+        if strategy == 'FIFO':
+            group = group.sort_values(['Date_Lot', 'NUMERO_LOT'], na_position='last')
+        elif strategy == 'LIFO':
+            group = group.sort_values(['Date_Lot', 'NUMERO_LOT'], ascending=[False, False], na_position='first')
+        for index, lot in group.iterrows():
+            quantite = lot['QUANTITE_ORIGINALE']
+            if ecart == 0:
+                ajustement = 0
+            elif ecart > 0:
+                ajustement = min(ecart, quantite)
+            else:
+                ajustement = -min(-ecart, quantite)
+            ecart -= ajustement
+            rows.append((index, ajustement, quantite + ajustement))
+    return rows
+
+
+class TestDistributionEngine:
+    """Tests pour la répartition vectorisée des écarts"""
+
+    @pytest.fixture
+    def engine(self):
+        return DistributionEngine()
+
+    @pytest.fixture
+    def discrepancies(self):
+        rng = np.random.default_rng(42)
+        n = 400
+        articles = rng.integers(0, 60, n)
+        real_by_article = rng.integers(0, 120, 60)
+        dates = pd.to_datetime('2024-01-01') + pd.to_timedelta(rng.integers(0, 500, n), unit='D')
+        dates = pd.Series(dates).mask(rng.random(n) < 0.2)
+        return pd.DataFrame({
+            'CODE_ARTICLE': [f'ART{a:03d}' for a in articles],
+            'NUMERO_INVENTAIRE': np.where(articles % 7 == 0, 'INV2', 'INV1'),
+            'NUMERO_LOT': [f'LOT{i % 13}' for i in range(n)],
+            'QUANTITE_ORIGINALE': rng.integers(0, 40, n).astype(float),
+            'QUANTITE_REELLE_SAISIE_TOTALE': real_by_article[articles].astype(float),
+            'AJUSTEMENT': 0,
+            'QUANTITE_CORRIGEE': 0.0,
+            'Date_Lot': dates,
+        })
+
+    @pytest.mark.parametrize('strategy', ['FIFO', 'LIFO', 'AUTRE'])
+    def test_matches_lot_by_lot_distribution(self, engine, discrepancies, strategy):
+        """Test équivalence avec la répartition lot par lot"""
+        result = engine.distribute(discrepancies, strategy)
+        expected = _reference_distribution(discrepancies, strategy)
+
+        assert list(result.index) == [index for index, _, _ in expected]
+        assert result['AJUSTEMENT'].tolist() == [adj for _, adj, _ in expected]
+        assert result['QUANTITE_CORRIGEE'].tolist() == [qty for _, _, qty in expected]
+        assert (result['QUANTITE_REELLE_SAISIE'] == result['QUANTITE_REELLE_SAISIE_TOTALE']).all()
+
+    def test_fifo_and_lifo_order(self, engine):
+        """Test consommation des lots selon la date"""
+        df = pd.DataFrame({
+            'CODE_ARTICLE': ['ART1'] * 3,
+            'NUMERO_INVENTAIRE': ['INV1'] * 3,
+            'NUMERO_LOT': ['RECENT', 'ANCIEN', 'SANS_DATE'],
+            'QUANTITE_ORIGINALE': [10.0, 10.0, 10.0],
+            'QUANTITE_REELLE_SAISIE_TOTALE': [15.0] * 3,
+            'Date_Lot': pd.to_datetime(['2025-06-01', '2024-01-01', None]),
+        })
+
+        fifo = engine.distribute(df, 'FIFO')
+        assert fifo['NUMERO_LOT'].tolist() == ['ANCIEN', 'RECENT', 'SANS_DATE']
+        assert fifo['AJUSTEMENT'].tolist() == [-10.0, -5.0, 0.0]
+
+        lifo = engine.distribute(df, 'LIFO')
+        assert lifo['NUMERO_LOT'].tolist() == ['SANS_DATE', 'RECENT', 'ANCIEN']
+        assert lifo['QUANTITE_CORRIGEE'].tolist() == [0.0, 5.0, 10.0]
+
+    def test_compare_matches_distribute(self, engine, discrepancies):
+        """Test comparaison en une passe : mêmes ajustements que chaque stratégie seule"""
+        # Lots en double (même date, même numéro) : l'ordre LIFO des ex aequo est conservé
+        discrepancies = pd.concat([discrepancies, discrepancies.iloc[::5]], ignore_index=True)
+        comparison = engine.compare(discrepancies, ['FIFO', 'LIFO'])
+
+        for strategy in ('FIFO', 'LIFO'):
+            expected = engine.distribute(discrepancies, strategy)
+            assert comparison.loc[expected.index, f'AJUSTEMENT_{strategy}'].tolist() == expected['AJUSTEMENT'].tolist()
+            assert comparison.loc[expected.index, f'QUANTITE_CORRIGEE_{strategy}'].tolist() == expected['QUANTITE_CORRIGEE'].tolist()
+        assert (comparison['DELTA_LIFO'] == comparison['QUANTITE_CORRIGEE_LIFO'] - comparison['QUANTITE_CORRIGEE_FIFO']).all()
+
+    def test_compare_summary(self, engine):
+        """Test synthèse : lots et articles modifiés, quantité déplacée"""
+        df = pd.DataFrame({
+            'CODE_ARTICLE': ['ART1'] * 3 + ['ART2'],
+            'NUMERO_INVENTAIRE': ['INV1'] * 4,
+            'NUMERO_LOT': ['RECENT', 'ANCIEN', 'SANS_DATE', 'UNIQUE'],
+            'QUANTITE_ORIGINALE': [10.0, 10.0, 10.0, 8.0],
+            'QUANTITE_REELLE_SAISIE_TOTALE': [15.0] * 3 + [5.0],
+            'Date_Lot': pd.to_datetime(['2025-06-01', '2024-01-01', None, '2024-01-01']),
+        })
+
+        comparison = engine.compare(df, ['fifo', 'lifo'])
+        summary = engine.summarize_comparison(comparison, ['FIFO', 'LIFO'])
+
+        assert comparison['NUMERO_LOT'].tolist() == ['ANCIEN', 'RECENT', 'SANS_DATE', 'UNIQUE']
+        assert comparison['DELTA_LIFO'].tolist() == [10.0, 0.0, -10.0, 0.0]
+        assert summary['reference'] == 'FIFO'
+        assert summary['strategies']['LIFO']['total_adjustment'] == summary['strategies']['FIFO']['total_adjustment'] == -18.0
+        assert summary['deltas']['LIFO'] == {'lots_changed': 2, 'articles_changed': 1, 'quantity_shifted': 10.0}
+
+        with pytest.raises(ValueError):
+            engine.compare(df, ['FIFO', 'MOYENNE'])
+
+    def test_undistributed_leftover_is_logged(self, engine, caplog):
+        """Test avertissement quand l'écart dépasse les quantités des lots"""
+        df = pd.DataFrame({
+            'CODE_ARTICLE': ['ART1', 'ART1'],
+            'NUMERO_INVENTAIRE': ['INV1', 'INV1'],
+            'NUMERO_LOT': ['LOT1', 'LOT2'],
+            'QUANTITE_ORIGINALE': [2.0, 3.0],
+            'QUANTITE_REELLE_SAISIE_TOTALE': [20.0, 20.0],
+            'Date_Lot': pd.to_datetime(['2024-01-01', '2024-02-01']),
+        })
+
+        with caplog.at_level(logging.WARNING):
+            result = engine.distribute(df, 'FIFO')
+
+        assert result['AJUSTEMENT'].tolist() == [2.0, 3.0]
+        assert "Écart non complètement distribué pour ART1: 10.0" in caplog.text
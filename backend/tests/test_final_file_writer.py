@@ -0,0 +1,107 @@
+import pytest
+import numpy as np
+import pandas as pd
+from services.final_file_writer import FinalFileWriter
+from services.lotecart_processor import LotecartProcessor
+from services.lot_index import LotIndex
+from services.line_store import LineStore
+
+class TestFinalFileWriter:
+    """Tests pour l'écriture du fichier final"""
+
+    @pytest.fixture
+    def writer(self):
+        return FinalFileWriter(LotecartProcessor())
+
+    @pytest.fixture
+    def original_df(self):
+        lines = [
+            'S;SES1;INV1;1000;BKE02;100;0;1;ART001;EMP001;A;UN;0;ZONE1;LOT1',
+            'S;SES1;INV1;1001;BKE02;50;0;1;ART001;EMP001;A;UN;0;ZONE1;LOT2',
+            'S;SES1;INV1;3000;BKE02;20;0;1;ART002;EMP001;A;UN;0;ZONE1;LOT3',
+            'S;SES1;INV1;1003;BKE02;5;0;1;ART003',
+        ]
+        return pd.DataFrame({
+            'CODE_ARTICLE': ['ART001', 'ART001', 'ART002', 'ART003'],
+            'NUMERO_INVENTAIRE': ['INV1'] * 4,
+            'NUMERO_LOT': ['LOT1', 'LOT2 ', 'LOT3', ''],
+            'original_s_line_raw': lines,
+        })
+
+    @pytest.fixture
+    def distributed_df(self):
+        return pd.DataFrame({
+            'CODE_ARTICLE': ['ART001', 'ART001', 'ART002', 'ART002'],
+            'NUMERO_INVENTAIRE': ['INV1'] * 4,
+            'NUMERO_LOT': ['LOT1', 'LOT2', 'LOT3', 'LOTECART'],
+            'QUANTITE_CORRIGEE': [100.0, 0.0, 12.7, 8.0],
+        })
+
+    def test_adjusted_quantities(self, writer, original_df, distributed_df):
+        """Test rapprochement des ajustements sur (article, inventaire, lot)"""
+        adjusted = writer.adjusted_quantities(original_df, distributed_df, LotIndex.build(original_df))
+
+        assert adjusted[:3].tolist() == [100.0, 0.0, 12.7]
+        assert np.isnan(adjusted[3])
+
+    def test_write_patches_columns(self, writer, original_df, distributed_df, tmp_path):
+        """Test colonnes 5/6/7, lignes ignorées et nouvelles lignes LOTECART"""
+        path = tmp_path / 'final.csv'
+        adjusted = writer.adjusted_quantities(original_df, distributed_df, LotIndex.build(original_df))
+        lotecart = [{
+            'CODE_ARTICLE': 'ART002',
+            'QUANTITE_CORRIGEE': 8.0,
+            'is_new_lotecart': True,
+            'reference_line': original_df['original_s_line_raw'].iloc[2],
+        }]
+
+        stats = writer.write(str(path), ['E;SES1', 'L;SES1;INV1'], original_df, adjusted, lotecart)
+
+        assert path.read_text(encoding='utf-8').splitlines() == [
+            'E;SES1',
+            'L;SES1;INV1',
+            'S;SES1;INV1;1000;BKE02;100;100;1;ART001;EMP001;A;UN;0;ZONE1;LOT1',
+            'S;SES1;INV1;1001;BKE02;50;0;2;ART001;EMP001;A;UN;0;ZONE1;LOT2',
+            'S;SES1;INV1;3000;BKE02;20;12;1;ART002;EMP001;A;UN;0;ZONE1;LOT3',
+            'S;SES1;INV1;4000;BKE02;0;8;2;ART002;EMP001;A;UN;0;ZONE1;LOTECART',
+        ]
+        assert stats['original_lines'] == 3
+        assert stats['skipped_lines'] == 1
+        assert stats['adjusted_lines'] == 3
+        assert stats['max_line_number'] == 3000
+        assert stats['lotecart_new_lines'] == 1
+
+    def test_stats_match_file_validation(self, writer, original_df, distributed_df, tmp_path):
+        """Test statistiques identiques à une relecture du fichier"""
+        path = tmp_path / 'final.csv'
+        adjusted = writer.adjusted_quantities(original_df, distributed_df, LotIndex.build(original_df))
+        lotecart = [{
+            'CODE_ARTICLE': 'ART002',
+            'QUANTITE_CORRIGEE': 8.0,
+            'is_new_lotecart': True,
+            'reference_line': original_df['original_s_line_raw'].iloc[2],
+        }]
+        stats = writer.write(str(path), ['E;SES1'], original_df, adjusted, lotecart)
+
+        processor = LotecartProcessor()
+        from_stats = processor.validate_lotecart_processing(str(path), 1, stats)
+        from_file = processor.validate_lotecart_processing(str(path), 1)
+
+        assert stats['lotecart_lines'] == [
+            {'line_number': 5, 'article': 'ART002', 'quantite': '0', 'indicateur': '2'}
+        ]
+        assert from_stats['success'] and from_file['success']
+        assert from_stats == from_file
+
+    def test_write_from_line_store(self, writer, original_df, distributed_df, tmp_path):
+        """Test lignes brutes lues dans le LineStore plutôt que dans le DataFrame"""
+        adjusted = writer.adjusted_quantities(original_df, distributed_df, LotIndex.build(original_df))
+        writer.write(str(tmp_path / 'expected.csv'), ['E;SES1'], original_df, adjusted, [])
+
+        line_store = LineStore(str(tmp_path / 's1_lines.txt'))
+        detached = line_store.detach(original_df)
+        writer.write(str(tmp_path / 'final.csv'), ['E;SES1'], detached, adjusted, [], line_store)
+
+        assert (tmp_path / 'final.csv').read_text(encoding='utf-8') == (
+            tmp_path / 'expected.csv'
+        ).read_text(encoding='utf-8')
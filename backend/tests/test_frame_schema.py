@@ -0,0 +1,66 @@
+import pytest
+import pandas as pd
+from services.dataframe_cache import DataFrameCache
+from services.frame_schema import LOT_TYPE_DTYPE, apply_schema
+from services.session_service import SessionService
+
+class TestFrameSchema:
+    """Tests pour le schéma compact des DataFrames de session"""
+
+    @pytest.fixture
+    def original_df(self):
+        return pd.DataFrame({
+            'CODE_ARTICLE': ['ART001', 'ART002', 'ART001'],
+            'SITE': ['SITE01', 'SITE01', 'SITE01'],
+            'STATUT': ['A', 'A', 'Q'],
+            'RANG': [1000, 1001, 1002],
+            'QUANTITE': ['10', '0', '5.5'],
+            'Date_Lot': ['2025-07-07', None, '2025-01-01'],
+            'Type_Lot': ['type1', 'unknown', 'type1'],
+        })
+
+    def test_compact_dtypes(self, original_df):
+        """Test conversion vers les types compacts, clés de jointure inchangées"""
+        converted = apply_schema(original_df, 'original_df')
+
+        assert converted['SITE'].dtype == 'category'
+        assert converted['STATUT'].dtype == 'category'
+        assert converted['RANG'].dtype == 'Int64'
+        assert converted['QUANTITE'].tolist() == [10.0, 0.0, 5.5]
+        assert converted['Date_Lot'].dtype == 'datetime64[ns]'
+        assert converted['Type_Lot'].dtype == LOT_TYPE_DTYPE
+        assert converted['CODE_ARTICLE'].dtype == object
+        # Le DataFrame d'origine n'est pas modifié
+        assert original_df['SITE'].dtype == object
+
+        # Déjà au bon type : pas de copie
+        assert apply_schema(converted, 'original_df') is converted
+        assert apply_schema(original_df, 'lot_index_order') is original_df
+
+    def test_flags_and_unknown_categories(self):
+        """Test drapeaux LOTECART absents et valeurs hors catégories"""
+        distributed_df = pd.DataFrame({
+            'TYPE_LOT': ['type1', 'autre'],
+            'is_new_lotecart': [None, True],
+            'is_existing_update': [None, False],
+        })
+
+        converted = apply_schema(distributed_df, 'distributed_df')
+
+        assert converted['is_new_lotecart'].tolist() == [False, True]
+        assert converted['is_existing_update'].dtype == bool
+        assert converted['TYPE_LOT'].dtype == object
+
+    @pytest.mark.parametrize('storage_format', ['arrow', 'parquet'])
+    def test_schema_survives_storage(self, original_df, tmp_path, storage_format):
+        """Test conservation du schéma après écriture et relecture"""
+        service = SessionService()
+        service.data_folder = str(tmp_path)
+        service.storage_format = storage_format
+        service._dataframe_cache = DataFrameCache(max_bytes=10**8)
+
+        service.save_dataframe('s1', 'original_df', original_df)
+        service._dataframe_cache.clear()
+        loaded = service.load_dataframe('s1', 'original_df')
+
+        pd.testing.assert_frame_equal(loaded, apply_schema(original_df, 'original_df'))
@@ -0,0 +1,75 @@
+import hashlib
+import io
+import os
+import pandas as pd
+import pytest
+from werkzeug.datastructures import FileStorage
+from services.ingest_cache import ingest_cache, IngestCacheService
+from services.session_service import session_service
+
+class TestIngestCache:
+    """Tests pour la reprise des imports d'un fichier identique"""
+
+    @pytest.fixture(autouse=True)
+    def sessions(self):
+        """Sessions créées par le test, supprimées avec leurs fichiers"""
+        self.session_ids = []
+        yield self.session_ids
+        for session_id in self.session_ids:
+            data = session_service.get_session_data(session_id) or {}
+            for key in ('original_file_path', 'template_file_path'):
+                if data.get(key) and os.path.exists(data[key]):
+                    os.remove(data[key])
+            session_service.cleanup_session_data(session_id)
+            session_service.delete_session(session_id)
+
+    def upload(self, client, content):
+        data = {'file': (io.BytesIO(content.encode('utf-8')), 'test_sage.csv'), 'async': 'false'}
+        response = client.post('/api/upload', data=data, content_type='multipart/form-data')
+        self.session_ids.append(response.get_json()['session_id'])
+        return response
+
+    def test_hash_while_saving(self, tmp_path):
+        """Test empreinte calculée pendant l'écriture par blocs"""
+        content = b'S;BKE02;ART001;100\n' * 1000
+        upload = FileStorage(stream=io.BytesIO(content), filename='test_sage.csv')
+        path = tmp_path / 'upload.csv'
+
+        content_hash = IngestCacheService(chunk_size=1024).save_upload(upload, str(path))
+
+        assert content_hash == hashlib.sha256(content).hexdigest()
+        assert path.read_bytes() == content
+
+    def test_repeated_upload_reuses_session(self, client, sample_csv_content):
+        """Test second import du même fichier : données et template repris"""
+        content_hash = hashlib.sha256(sample_csv_content.encode('utf-8')).hexdigest()
+        ingest_cache.forget(content_hash, ingest_cache.config_version(), '.csv')
+
+        first = self.upload(client, sample_csv_content).get_json()
+        second = self.upload(client, sample_csv_content).get_json()
+
+        assert 'reused_session_id' not in first
+        assert second['reused_session_id'] == first['session_id']
+        assert second['stats'] == first['stats']
+
+        source_id, session_id = first['session_id'], second['session_id']
+        pd.testing.assert_frame_equal(
+            session_service.load_dataframe(session_id, 'original_df'),
+            session_service.load_dataframe(source_id, 'original_df'),
+        )
+        template_path = session_service.get_session_data(session_id)['template_file_path']
+        assert template_path.endswith(f'_{session_id}.xlsx')
+        assert os.path.exists(template_path)
+
+    def test_stale_entry_dropped(self, client, sample_csv_content):
+        """Test entrée supprimée quand la session reprise n'a plus son template"""
+        content = sample_csv_content.replace('ART003', 'ART004')
+        content_hash = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        config_version = ingest_cache.config_version()
+        ingest_cache.forget(content_hash, config_version, '.csv')
+
+        first = self.upload(client, content).get_json()
+        os.remove(session_service.get_session_data(first['session_id'])['template_file_path'])
+
+        assert ingest_cache.lookup(content_hash, config_version, '.csv') is None
+        assert 'reused_session_id' not in self.upload(client, content).get_json()
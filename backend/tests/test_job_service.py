@@ -0,0 +1,154 @@
+import io
+import time
+import uuid
+from datetime import datetime, timedelta
+import pytest
+from database import db_manager
+from models.job import Job
+from services.job_service import JobService, JobFailed, job_service
+from services.session_service import session_service
+from utils.rate_limiter import rate_limiter
+
+class TestJobService:
+    """Tests pour la file de jobs SQLite"""
+
+    @pytest.fixture
+    def service(self):
+        service = JobService(poll_interval=0.05)
+        yield service
+        service.stop(timeout=5)
+
+    def wait_for(self, service, job_id, timeout=10):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            job = service.get_job(job_id)
+            if job['status'] in ('completed', 'failed'):
+                return job
+            time.sleep(0.05)
+        raise AssertionError(f"Job {job_id} non terminé")
+
+    def test_job_runs_with_stages(self, service):
+        """Test exécution en arrière-plan et suivi des étapes"""
+        def handler(payload, progress):
+            progress('parse')
+            progress('save')
+            return {'total': payload['a'] + payload['b']}
+
+        service.register('test_sum', handler, ['parse', 'save', 'template'])
+        job = self.wait_for(service, service.submit('test_sum', 'sess0001', {'a': 1, 'b': 2}))
+
+        assert job['status'] == 'completed'
+        assert job['result'] == {'total': 3}
+        assert [s['status'] for s in job['stages']] == ['completed', 'completed', 'skipped']
+        assert job['attempts'] == 1
+
+    def test_job_failure(self, service):
+        """Test échec d'un job et étape en erreur"""
+        def handler(payload, progress):
+            progress('parse')
+            raise JobFailed('Fichier invalide')
+
+        service.register('test_fail', handler, ['parse', 'save'])
+        job = self.wait_for(service, service.submit('test_fail', 'sess0002'))
+
+        assert job['status'] == 'failed'
+        assert job['error'] == 'Fichier invalide'
+        assert job['current_stage'] == 'parse'
+        assert [s['status'] for s in job['stages']] == ['failed', 'pending']
+
+    def test_job_claimed_once(self, service):
+        """Test un job n'est exécuté qu'une seule fois"""
+        calls = []
+        service.register('test_once', lambda payload, progress: calls.append(1), [])
+        service.start()
+        job_id = service.submit('test_once')
+        self.wait_for(service, job_id)
+
+        assert service.run_job(job_id) is False
+        assert len(calls) == 1
+
+    def test_unknown_job_type(self, service):
+        """Test type de job non déclaré"""
+        with pytest.raises(ValueError):
+            service.submit('inconnu')
+
+    def job_updated_at(self, session_id):
+        db_session = db_manager.get_session()
+        try:
+            return db_session.query(Job.updated_at).filter(Job.session_id == session_id).scalar()
+        finally:
+            db_session.close()
+
+    def test_heartbeat_during_long_stage(self):
+        """Test signal de vie pendant une étape plus longue que stale_timeout"""
+        service = JobService(poll_interval=0.05, stale_timeout=1, heartbeat_interval=0.05)
+        session_id = uuid.uuid4().hex[:8]
+        seen = []
+
+        def handler(payload, progress):
+            progress('parse')
+            for _ in range(4):
+                seen.append(self.job_updated_at(session_id))
+                time.sleep(0.5)
+            return {}
+
+        service.register('test_beat', handler, ['parse'])
+        try:
+            job = self.wait_for(service, service.submit('test_beat', session_id))
+        finally:
+            service.stop(timeout=5)
+
+        assert job['status'] == 'completed'
+        assert job['attempts'] == 1
+        assert seen == sorted(seen) and seen[-1] - seen[0] >= timedelta(seconds=1)
+
+    def test_stale_job_recovered_by_worker_loop(self):
+        """Test job d'un worker tué remis en file sans redémarrage"""
+        service = JobService(poll_interval=0.05, stale_timeout=60, heartbeat_interval=0.05)
+        service.register('test_stale', lambda payload, progress: {'ok': True}, [])
+        service.start()
+
+        db_session = db_manager.get_session()
+        try:
+            job = Job(
+                job_type='test_stale', session_id='sessdead', status='running', attempts=1,
+                worker='autre-hote:1', stages='[]', payload='{}',
+                updated_at=datetime.utcnow() - timedelta(seconds=120),
+            )
+            db_session.add(job)
+            db_session.commit()
+            job_id = job.id
+        finally:
+            db_session.close()
+
+        try:
+            job = self.wait_for(service, job_id)
+        finally:
+            service.stop(timeout=5)
+
+        assert job['status'] == 'completed'
+        assert job['attempts'] == 2
+
+    def test_jobs_deleted_with_session(self, service):
+        """Test suppression des jobs avec leur session"""
+        session_id = session_service.create_session('jobs.csv', '/tmp/jobs.csv')
+        service.register('test_cleanup', lambda payload, progress: {}, [])
+        job_id = service.submit('test_cleanup', session_id)
+        self.wait_for(service, job_id)
+
+        assert session_service.delete_session(session_id) is True
+        assert service.get_job(job_id) is None
+
+    def test_upload_async_by_default(self, client, sample_csv_content):
+        """Test upload sans paramètre async : réponse 202 et résultat sur /api/jobs/<id>"""
+        rate_limiter.requests.clear()
+        data = {'file': (io.BytesIO(sample_csv_content.encode('utf-8')), 'test_sage.csv')}
+        response = client.post('/api/upload', data=data, content_type='multipart/form-data')
+
+        assert response.status_code == 202
+        accepted = response.get_json()
+        assert accepted['status_url'] == f"/api/jobs/{accepted['job_id']}"
+        job = self.wait_for(job_service, accepted['job_id'])
+        assert job['status'] == 'completed'
+        assert job['result']['session_id'] == accepted['session_id']
+        session_service.delete_session(accepted['session_id'])
@@ -0,0 +1,59 @@
+import pytest
+import pandas as pd
+from services.line_store import LineStore, raw_lines
+
+class TestLineStore:
+    """Tests pour le stockage des lignes brutes par positions en octets"""
+
+    @pytest.fixture
+    def store(self, tmp_path):
+        return LineStore(str(tmp_path / 's1_lines.txt'))
+
+    @pytest.fixture
+    def original_df(self):
+        return pd.DataFrame({
+            'CODE_ARTICLE': ['ART001', 'ART002', 'ART003'],
+            'original_s_line_raw': [
+                'S;SES1;INV1;1000;SITE01;100;0;1;ART001;EMP;A;UN;0;ZONE1;LOTÉ1',
+                'S;SES1;INV1;1001;SITE01;0;0;1;ART002;EMP;A;UN;0;ZONE1;LOT2',
+                'S;SES1;INV1;1002;SITE01;5;0;1;ART003;EMP;A;UN;0;ZONE1;LOT3',
+            ],
+        })
+
+    def test_detach_and_read_all(self, store, original_df):
+        """Test remplacement de la colonne brute et relecture de toutes les lignes"""
+        detached = store.detach(original_df)
+
+        assert 'original_s_line_raw' not in detached.columns
+        assert detached['LINE_OFFSET'].tolist()[0] == 0
+        assert raw_lines(detached, store).tolist() == original_df['original_s_line_raw'].tolist()
+
+    def test_read_selected_positions(self, store, original_df):
+        """Test lecture à la demande de lignes non consécutives"""
+        detached = store.detach(original_df)
+
+        lines = raw_lines(detached, store, positions=[2, 0])
+
+        assert lines.tolist() == [
+            original_df['original_s_line_raw'].iloc[2],
+            original_df['original_s_line_raw'].iloc[0],
+        ]
+
+    def test_legacy_column_and_missing_store(self, original_df):
+        """Test anciennes sessions (colonne brute) et absence de stockage"""
+        assert raw_lines(original_df, positions=[1])[0].endswith('LOT2')
+
+        detached = original_df.drop(columns='original_s_line_raw')
+        assert raw_lines(detached).tolist() == [None, None, None]
+
+    def test_writer_appends_batches(self, store, original_df):
+        """Test écriture par lots : positions continues d'un lot à l'autre"""
+        lines = original_df['original_s_line_raw'].tolist()
+        with store.open_writer() as writer:
+            first = writer.append(lines[:2])
+            second = writer.append(lines[2:])
+
+        offsets = list(first[0]) + list(second[0])
+        lengths = list(first[1]) + list(second[1])
+        assert store.lines(offsets, lengths).tolist() == lines
+        assert store.lines(offsets[2:], lengths[2:]).tolist() == lines[2:]
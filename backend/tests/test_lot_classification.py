@@ -0,0 +1,68 @@
+import pytest
+import pandas as pd
+from unittest.mock import patch
+from services.file_processor import FileProcessorService, LOT_TYPE_PRIORITY
+
+class TestLotClassification:
+    """Tests pour la classification vectorisée des numéros de lot"""
+
+    @pytest.fixture
+    def processor(self):
+        """Instance du service avec les patterns de production"""
+        with patch('services.file_processor.config_service') as mock_config:
+            mock_config.get_sage_columns.return_value = {'TYPE_LIGNE': 0}
+            mock_config.get_validation_config.return_value = {}
+            mock_config.get_processing_config.return_value = {}
+            mock_config.get_lot_patterns.return_value = {
+                'type1_pattern': r'^([A-Z0-9]{5})(\d{6})([A-Z0-9]{4})$',
+                'type2_pattern': r'^LOT[A-Z0-9]+$'
+            }
+            mock_config._config = {'sage_x3': {'priority1_site_codes': ['CPKU1', 'CB2TV']}}
+            return FileProcessorService()
+
+    @pytest.fixture
+    def lots(self):
+        return pd.Series([
+            'CPKU1070725ABCD',   # type 1 valide
+            ' CB2TV020425WXYZ ', # type 1 avec espaces
+            'CPKU1310225ABCD',   # type 1, 31 février
+            'CPKU1071325ABCD',   # type 1, mois 13
+            'XXXXX070725ABCD',   # site non reconnu
+            'LOT311224',         # type 2
+            '',                  # vide
+            None,                # absent
+        ])
+
+    def test_classify_lots_types(self, processor, lots):
+        """Test types et dtypes produits"""
+        dates, types = processor._classify_lots(lots)
+
+        assert isinstance(types, pd.Categorical)
+        assert list(types.categories) == LOT_TYPE_PRIORITY
+        assert list(types) == [
+            'type1', 'type1', 'type1', 'type1', 'unknown', 'type2', 'unknown', 'unknown'
+        ]
+        assert dates.dtype == 'datetime64[ns]'
+        assert dates.iloc[0] == pd.Timestamp(2025, 7, 7)
+        assert dates.iloc[1] == pd.Timestamp(2025, 4, 2)
+        assert dates.iloc[2:].isna().all()
+
+    def test_classify_lots_matches_row_extraction(self, processor, lots):
+        """Test équivalence avec _extract_date_from_lot"""
+        dates, types = processor._classify_lots(lots)
+
+        for i, lot in enumerate(lots):
+            expected_date, expected_type = processor._extract_date_from_lot(lot)
+            assert types[i] == expected_type
+            if expected_date is None:
+                assert pd.isna(dates.iloc[i])
+            else:
+                assert dates.iloc[i] == pd.Timestamp(expected_date)
+
+    def test_classify_lots_keeps_index(self, processor):
+        """Test conservation de l'index d'origine"""
+        lots = pd.Series(['LOT1', 'CPKU1070725ABCD'], index=[10, 10])
+        dates, types = processor._classify_lots(lots)
+
+        assert list(dates.index) == [10, 10]
+        assert list(types) == ['type2', 'type1']
@@ -0,0 +1,80 @@
+import pytest
+import pandas as pd
+from services.lot_index import LotIndex
+
+class TestLotIndex:
+    """Tests pour l'index (article, inventaire) des lots originaux"""
+
+    @pytest.fixture
+    def original_df(self):
+        return pd.DataFrame({
+            'CODE_ARTICLE': ['ART1', 'ART2', 'ART1', None, 'ART2', 'ART1'],
+            'NUMERO_INVENTAIRE': ['INV1', 'INV1', 'INV1', 'INV1', 'INV2', 'INV1'],
+            'NUMERO_LOT': ['L1', 'L2', 'L3', 'L4', 'L5', 'L6'],
+        })
+
+    def test_positions_in_original_order(self, original_df):
+        """Test plages de lignes par clé, ordre d'origine conservé"""
+        lot_index = LotIndex.build(original_df)
+
+        assert len(lot_index) == 3
+        assert lot_index.positions('ART1', 'INV1').tolist() == [0, 2, 5]
+        assert lot_index.lots(original_df, 'ART2', 'INV2')['NUMERO_LOT'].tolist() == ['L5']
+        assert lot_index.positions('ART9', 'INV1').size == 0
+
+    def test_codes(self, original_df):
+        """Test numéros de clé par ligne et pour des clés arbitraires"""
+        lot_index = LotIndex.build(original_df)
+
+        row_codes = lot_index.row_codes(len(original_df))
+        assert row_codes[3] == -1
+        assert row_codes[0] == row_codes[2] == row_codes[5]
+        assert row_codes[1] != row_codes[4]
+
+        codes = lot_index.key_codes(['ART2', 'ART9', 'ART1'], ['INV2', 'INV1', 'INV1'])
+        assert codes.tolist() == [row_codes[4], -1, row_codes[0]]
+
+    def test_first_positions(self, original_df):
+        """Test première ligne de chaque clé, avec et sans filtre"""
+        lot_index = LotIndex.build(original_df)
+        codes = lot_index.key_codes(['ART1', 'ART2', 'ART2'], ['INV1', 'INV1', 'INV2'])
+
+        assert lot_index.first_positions()[codes].tolist() == [0, 1, 4]
+
+        mask = original_df['NUMERO_LOT'].isin(['L3', 'L6', 'L4']).to_numpy()
+        assert lot_index.first_positions(mask)[codes].tolist() == [2, -1, -1]
+
+    def test_frames_round_trip(self, original_df):
+        """Test persistance sous forme de DataFrames"""
+        groups, order = LotIndex.build(original_df).to_frames()
+        lot_index = LotIndex.from_frames(groups, order)
+
+        assert lot_index.positions('ART1', 'INV1').tolist() == [0, 2, 5]
+        assert lot_index.positions('ART2', 'INV1').tolist() == [1]
+
+    def test_empty(self):
+        """Test index vide"""
+        lot_index = LotIndex.build(pd.DataFrame(columns=['CODE_ARTICLE', 'NUMERO_INVENTAIRE']))
+
+        assert len(lot_index) == 0
+        assert lot_index.positions('ART1', 'INV1').size == 0
+        assert lot_index.key_codes(['ART1'], ['INV1']).tolist() == [-1]
+
+    def test_ids_and_template_keys(self, original_df):
+        """Test identifiants de ligne/clé/lot et résolution des numéros du template"""
+        lot_index = LotIndex.build(original_df)
+        with_ids = lot_index.with_ids(original_df)
+
+        assert with_ids['ROW_ID'].tolist() == list(range(6))
+        assert with_ids['KEY_ID'].tolist() == lot_index.row_codes(6).tolist()
+        assert with_ids['LOT_ID'].iloc[3] == -1
+        assert with_ids['LOT_ID'].drop(3).nunique() == 5
+
+        art1, art2 = with_ids['KEY_ID'].iloc[0], with_ids['KEY_ID'].iloc[1]
+        codes = lot_index.resolve_key_codes(
+            ['ART1', 'ART2', 'ART2', 'ART9'],
+            ['INV1', 'INV1', 'INV1', 'INV1'],
+            [art1, art1, None, art2],
+        )
+        # Numéro valide utilisé tel quel, numéro incohérent ou absent : recherche par libellés
+        assert codes.tolist() == [art1, art2, art2, -1]
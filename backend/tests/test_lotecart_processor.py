@@ -130,6 +130,44 @@ class TestLotecartProcessor:
         adjustments = processor.create_lotecart_adjustments(candidates, original_df)
         assert len(adjustments) == 0  # Aucun ajustement créé
     
+    def test_create_lotecart_adjustments_bulk_resolution(self, processor):
+        """Test résolution groupée : ligne à 0 existante, nouvelle ligne, inventaire absent"""
+        candidates = pd.DataFrame({
+            'Code Article': ['ART001', 'ART002', 'ART003', 'ART999'],
+            'Numéro Inventaire': ['INV001', 'INV001', '', 'INV001'],
+            'Quantité Théorique': [0, 0, 0, 0],
+            'Quantité Réelle': [5, 7, 3, 1],
+        })
+        original_df = pd.DataFrame({
+            'CODE_ARTICLE': ['ART001', 'ART001', 'ART002', 'ART003', 'ART003'],
+            'NUMERO_INVENTAIRE': ['INV001', 'INV001', 'INV001', 'INV002', 'INV001'],
+            'NUMERO_LOT': ['LOT1', 'LOT2', 'LOT3', 'LOT4', 'LOT5'],
+            'QUANTITE': [10, 0, 20, 30, 0],
+            'Date_Lot': [None, None, None, None, None],
+            'SITE': ['SITE01'] * 5,
+            'EMPLACEMENT': ['EMP1', 'EMP2', 'EMP3', 'EMP4', 'EMP5'],
+            'original_s_line_raw': ['S1', 'S2', 'S3', 'S4', 'S5'],
+        })
+
+        adjustments = processor.create_lotecart_adjustments(candidates, original_df)
+
+        assert [a['CODE_ARTICLE'] for a in adjustments] == ['ART001', 'ART002', 'ART003']
+
+        existing, new_line, without_inventory = adjustments
+        assert existing['is_existing_update'] is True
+        assert existing['NUMERO_LOT'] == 'LOT2'
+        assert existing['original_s_line_raw'] == 'S2'
+        assert existing['QUANTITE_CORRIGEE'] == 5.0
+        assert existing['metadata']['existing_emplacement'] == 'EMP2'
+
+        assert new_line['is_new_lotecart'] is True
+        assert new_line['NUMERO_LOT'] == 'LOTECART'
+        assert new_line['reference_line'] == 'S3'
+        assert new_line['metadata']['reference_lot'] == 'LOT3'
+
+        # Sans inventaire : première ligne de l'article, tous inventaires confondus
+        assert without_inventory['reference_line'] == 'S4'
+    
     def test_generate_lotecart_lines_valid(self, processor):
         """Test génération de lignes LOTECART valides"""
         adjustments = [
@@ -0,0 +1,106 @@
+import json
+import uuid
+import pytest
+from database import db_manager
+from models.progress_event import ProgressEvent
+from services.metrics import MetricsRegistry
+from services.progress_service import ProgressService
+
+class TestMetricsRegistry:
+    """Tests pour le registre de métriques (exposition Prometheus)"""
+
+    def make_registry(self, directory=None):
+        registry = MetricsRegistry(directory=directory, flush_interval=3600)
+        registry.histogram('stage_duration_seconds', 'Durée', (0.1, 1))
+        registry.counter('hits_total', 'Hits')
+        registry.counter('misses_total', 'Misses')
+        registry.ratio('hit_ratio', 'Ratio', 'hits_total', ['hits_total', 'misses_total'])
+        return registry
+
+    def test_histogram_render(self):
+        """Test classes cumulées, +Inf, somme et nombre d'observations"""
+        registry = self.make_registry()
+        for value in (0.05, 0.5, 2):
+            registry.observe('stage_duration_seconds', value, stage='parse')
+
+        lines = registry.render().splitlines()
+        assert '# TYPE stage_duration_seconds histogram' in lines
+        assert 'stage_duration_seconds_bucket{stage="parse",le="0.1"} 1' in lines
+        assert 'stage_duration_seconds_bucket{stage="parse",le="1"} 2' in lines
+        assert 'stage_duration_seconds_bucket{stage="parse",le="+Inf"} 3' in lines
+        assert 'stage_duration_seconds_sum{stage="parse"} 2.55' in lines
+        assert 'stage_duration_seconds_count{stage="parse"} 3' in lines
+
+    def test_ratio(self):
+        """Test ratio calculé sur les compteurs, 0 sans lecture"""
+        registry = self.make_registry()
+        assert 'hit_ratio 0' in registry.render().splitlines()
+
+        registry.inc('hits_total', 3)
+        registry.inc('misses_total')
+        assert 'hit_ratio 0.75' in registry.render().splitlines()
+
+    def test_workers_aggregated_from_shared_directory(self, tmp_path):
+        """Test addition des états de plusieurs processus (répertoire partagé)"""
+        first = self.make_registry(str(tmp_path))
+        second = self.make_registry(str(tmp_path))
+        first.observe('stage_duration_seconds', 0.05, stage='parse')
+        first.inc('hits_total', 2)
+        first.flush()
+        # Second worker simulé : fichier distinct de celui du processus courant
+        second.observe('stage_duration_seconds', 0.5, stage='parse')
+        second.inc('misses_total', 2)
+        (tmp_path / 'metrics_other_1.json').write_text(json.dumps(second.snapshot()))
+
+        lines = first.render().splitlines()
+        assert 'stage_duration_seconds_count{stage="parse"} 2' in lines
+        assert 'stage_duration_seconds_bucket{stage="parse",le="0.1"} 1' in lines
+        assert 'hits_total 2' in lines
+        assert 'misses_total 2' in lines
+        assert 'hit_ratio 0.5' in lines
+
+    def test_collector(self):
+        """Test compteurs fournis par un collecteur"""
+        registry = self.make_registry()
+        registry.register_collector(lambda: {'hits_total': 5, 'misses_total': 5})
+        lines = registry.render().splitlines()
+        assert 'hits_total 5' in lines
+        assert 'hit_ratio 0.5' in lines
+
+class TestMetricsEndpoint:
+    """Tests pour l'endpoint /api/metrics"""
+
+    @pytest.fixture
+    def session_id(self):
+        session_id = uuid.uuid4().hex[:8]
+        yield session_id
+        db_session = db_manager.get_session()
+        try:
+            db_session.query(ProgressEvent).filter(ProgressEvent.session_id == session_id).delete()
+            db_session.commit()
+        finally:
+            db_session.close()
+
+    def test_request_metrics(self, client):
+        """Test durée des requêtes par règle de routage"""
+        client.get('/api/health')
+        response = client.get('/api/metrics')
+
+        assert response.status_code == 200
+        assert response.mimetype == 'text/plain'
+        body = response.get_data(as_text=True)
+        assert 'http_request_duration_seconds_count{endpoint="/api/health",method="GET",status="200"}' in body
+        assert 'session_dataframe_cache_hit_ratio' in body
+
+    def test_stage_metrics(self, client, session_id):
+        """Test durée et débit des étapes suivies par le tracker"""
+        service = ProgressService(poll_interval=0.01, heartbeat=0.02, stream_timeout=0.2)
+        with service.tracker(session_id, 'metrics_test') as tracker:
+            tracker.stage('parse')
+            tracker.rows(1000)
+            tracker.finish()
+
+        body = client.get('/api/metrics').get_data(as_text=True)
+        assert 'inventory_stage_duration_seconds_count{pipeline="metrics_test",stage="parse"}' in body
+        assert 'inventory_stage_rows_per_second_count{pipeline="metrics_test",stage="parse"}' in body
+        assert 'inventory_stage_rows_total{pipeline="metrics_test",stage="parse"}' in body
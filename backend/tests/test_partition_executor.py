@@ -0,0 +1,47 @@
+import pytest
+import pandas as pd
+from services.distribution_engine import distribution_engine
+from services.partition_executor import PartitionExecutor
+
+class TestPartitionExecutor:
+    """Tests pour le traitement parallèle par numéro d'inventaire"""
+
+    @pytest.fixture
+    def executor(self):
+        executor = PartitionExecutor(workers=2, min_rows=1)
+        yield executor
+        executor.shutdown(wait=True)
+
+    @pytest.fixture
+    def discrepancies_df(self):
+        return pd.DataFrame({
+            'CODE_ARTICLE': ['ART2', 'ART1', 'ART1', 'ART2', 'ART1', 'ART1'],
+            'NUMERO_INVENTAIRE': ['INV2', 'INV1', 'INV2', 'INV1', 'INV1', 'INV2'],
+            'NUMERO_LOT': ['L1', 'L2', 'L3', 'L4', 'L5', 'L6'],
+            'QUANTITE_ORIGINALE': [10.0, 5.0, 8.0, 3.0, 7.0, 2.0],
+            'QUANTITE_REELLE_SAISIE_TOTALE': [4.0, 20.0, 1.0, 3.0, 20.0, 1.0],
+            'Date_Lot': pd.to_datetime(['2025-01-01', '2025-02-01', None, '2025-03-01', '2025-01-15', '2024-12-01']),
+            'KEY_ID': [0, 1, 2, 3, 1, 2],
+        })
+
+    def test_partitions(self, executor, discrepancies_df):
+        """Test une partition par inventaire, dans l'ordre de première apparition"""
+        partitions = executor.partitions(discrepancies_df)
+
+        assert [p['NUMERO_INVENTAIRE'].unique().tolist() for p in partitions] == [['INV2'], ['INV1']]
+        assert partitions[0].index.tolist() == [0, 2, 5]
+
+    def test_serial_when_not_applicable(self, discrepancies_df):
+        """Test traitement en série : pool désactivé, trop peu de lignes ou un seul inventaire"""
+        assert PartitionExecutor(workers=1, min_rows=1).partitions(discrepancies_df) is None
+        assert PartitionExecutor(workers=2, min_rows=100).partitions(discrepancies_df) is None
+        single = discrepancies_df.assign(NUMERO_INVENTAIRE='INV1')
+        assert PartitionExecutor(workers=2, min_rows=1).partitions(single) is None
+
+    def test_parallel_distribution_matches_serial(self, executor, discrepancies_df):
+        """Test répartition par partitions identique (valeurs et ordre) à la répartition en série"""
+        for strategy in ('FIFO', 'LIFO'):
+            pd.testing.assert_frame_equal(
+                distribution_engine.distribute(discrepancies_df, strategy, executor),
+                distribution_engine.distribute(discrepancies_df, strategy),
+            )
@@ -0,0 +1,127 @@
+import io
+import json
+import os
+import uuid
+import pytest
+from database import db_manager
+from models.progress_event import ProgressEvent
+from services.progress_service import ProgressService, format_sse
+from services.session_service import session_service
+
+class TestProgressService:
+    """Tests pour les événements de progression (flux SSE)"""
+
+    @pytest.fixture
+    def service(self):
+        return ProgressService(poll_interval=0.01, heartbeat=0.02, stream_timeout=0.2)
+
+    @pytest.fixture
+    def session_id(self):
+        session_id = uuid.uuid4().hex[:8]
+        yield session_id
+        db_session = db_manager.get_session()
+        try:
+            db_session.query(ProgressEvent).filter(ProgressEvent.session_id == session_id).delete()
+            db_session.commit()
+        finally:
+            db_session.close()
+
+    def run_upload(self, service, session_id, stages=None):
+        stages = stages if stages is not None else []
+        with service.tracker(session_id, 'upload', stages.append) as tracker:
+            tracker.stage('parse')
+            tracker.rows(120)
+            tracker.stage('aggregate')
+            tracker.rows(40)
+            tracker.finish({'nb_articles': 40})
+
+    def test_stage_transitions_and_rows(self, service, session_id):
+        """Test transitions d'étapes, nombres de lignes et résultat"""
+        stages = []
+        self.run_upload(service, session_id, stages)
+
+        events = service.events(session_id)
+        assert [(e['event'], e['stage'], e.get('status'), e['rows']) for e in events] == [
+            ('started', None, None, None),
+            ('stage', 'parse', 'started', None),
+            ('stage', 'parse', 'completed', 120),
+            ('stage', 'aggregate', 'started', None),
+            ('stage', 'aggregate', 'completed', 40),
+            ('completed', None, None, None),
+        ]
+        assert events[-1]['result'] == {'nb_articles': 40}
+        assert stages == ['parse', 'aggregate']
+
+    def test_failure_event(self, service, session_id):
+        """Test exception du traitement : événement failed sur l'étape en cours"""
+        with pytest.raises(ValueError):
+            with service.tracker(session_id, 'process') as tracker:
+                tracker.stage('distribution')
+                raise ValueError('Écarts non calculés')
+
+        failed = service.events(session_id)[-1]
+        assert failed['event'] == 'failed'
+        assert failed['stage'] == 'distribution'
+        assert failed['error'] == 'Écarts non calculés'
+
+    def test_row_reporter(self, service, session_id):
+        """Test lignes traitées en cours d'étape"""
+        reporter = service.row_reporter(session_id, 'upload', 'parse')
+        reporter(100)
+        reporter(250)
+
+        assert reporter.rows == 250
+        assert [e['rows'] for e in service.events(session_id)] == [100, 250]
+
+    def test_stream_replays_last_run(self, service, session_id):
+        """Test flux SSE : dernier traitement rejoué, fin sur l'événement completed"""
+        self.run_upload(service, session_id)
+        with service.tracker(session_id, 'process') as tracker:
+            tracker.finish({'final_url': '/api/download/final/x'})
+
+        messages = list(service.stream(session_id))
+
+        assert messages[0].startswith('retry:')
+        assert [m.split('\n')[1] for m in messages[1:]] == ['event: started', 'event: completed']
+        assert '"pipeline": "process"' in messages[1]
+
+    def test_stream_resumes_after_last_event(self, service, session_id):
+        """Test reprise du flux après Last-Event-ID et filtre par traitement"""
+        self.run_upload(service, session_id)
+        events = service.events(session_id)
+
+        messages = list(service.stream(session_id, last_event_id=events[3]['id']))
+        assert [m.split('\n')[0] for m in messages[1:]] == [f"id: {e['id']}" for e in events[4:]]
+
+        # Aucun traitement 'process' démarré : le flux attend puis expire
+        waiting = list(service.stream(session_id, pipeline='process'))
+        assert waiting[0].startswith('retry:')
+        assert all(m == ': keep-alive\n\n' for m in waiting[1:])
+
+    def test_format_sse(self):
+        """Test format d'un message SSE"""
+        assert format_sse(7, 'stage', {'stage': 'parse'}) == 'id: 7\nevent: stage\ndata: {"stage": "parse"}\n\n'
+
+    def test_events_endpoint(self, client, sample_csv_content):
+        """Test endpoint SSE : étapes de l'import avec leurs nombres de lignes"""
+        assert client.get('/api/sessions/inconnue/events').status_code == 404
+
+        data = {'file': (io.BytesIO(sample_csv_content.encode('utf-8')), 'test_sage.csv'), 'async': 'false'}
+        session_id = client.post('/api/upload', data=data, content_type='multipart/form-data').get_json()['session_id']
+        try:
+            response = client.get(f'/api/sessions/{session_id}/events?pipeline=upload')
+            body = response.get_data(as_text=True)
+        finally:
+            session_data = session_service.get_session_data(session_id) or {}
+            for key in ('original_file_path', 'template_file_path'):
+                if session_data.get(key) and os.path.exists(session_data[key]):
+                    os.remove(session_data[key])
+            session_service.cleanup_session_data(session_id)
+            session_service.delete_session(session_id)
+
+        assert response.mimetype == 'text/event-stream'
+        events = [json.loads(line[len('data: '):]) for line in body.split('\n') if line.startswith('data: ')]
+        parse = [e for e in events if e['stage'] == 'parse' and e.get('status') == 'completed']
+        assert parse and parse[0]['rows'] == 3
+        assert events[-1]['event'] == 'completed'
+        assert events[-1]['result']['session_id'] == session_id
@@ -0,0 +1,115 @@
+import io
+import json
+import os
+import pandas as pd
+import pytest
+from services.session_service import session_service
+from utils.rate_limiter import rate_limiter
+
+# Article ART001 sur deux lots datés : FIFO et LIFO ne corrigent pas le même lot
+CONTENT = """E;BKE022508SES00000003;test depot conf;1;BKE02;;;;;;;;;;
+L;BKE022508SES00000003;BKE022508INV00000006;1;BKE02;;;;;;;;;;
+S;BKE022508SES00000003;BKE022508INV00000006;1000;BKE02;30;0;1;ART001;EMP001;A;UN;0;ZONE1;CPKU1010125AAAA;
+S;BKE022508SES00000003;BKE022508INV00000006;1001;BKE02;30;0;1;ART001;EMP001;A;UN;0;ZONE1;CPKU1010625AAAA;
+S;BKE022508SES00000003;BKE022508INV00000006;1002;BKE02;50;0;1;ART002;EMP001;A;UN;0;ZONE1;CPKU070725001;"""
+
+class TestRedistribute:
+    """Tests pour la nouvelle répartition des écarts d'une session"""
+
+    @pytest.fixture
+    def session_id(self, client):
+        """Session importée (template généré), supprimée avec ses fichiers"""
+        rate_limiter.requests.clear()
+        data = {'file': (io.BytesIO(CONTENT.encode('utf-8')), 'test_sage.csv'), 'async': 'false'}
+        session_id = client.post('/api/upload', data=data, content_type='multipart/form-data').get_json()['session_id']
+        yield session_id
+        session_data = session_service.get_session_data(session_id) or {}
+        for key in ('original_file_path', 'template_file_path', 'completed_file_path', 'final_file_path'):
+            if session_data.get(key) and os.path.exists(session_data[key]):
+                os.remove(session_data[key])
+        session_service.cleanup_session_data(session_id)
+        session_service.delete_session(session_id)
+
+    def process(self, client, session_id, strategy):
+        template = pd.read_excel(session_service.get_session_data(session_id)['template_file_path'])
+        template['Quantité Réelle'] = template['Quantité Théorique'] - 20
+        completed = io.BytesIO()
+        template.to_excel(completed, index=False)
+        completed.seek(0)
+        data = {'file': (completed, 'completed.xlsx'), 'session_id': session_id, 'strategy': strategy, 'async': 'false'}
+        return client.post('/api/process', data=data, content_type='multipart/form-data')
+
+    def redistribute(self, client, session_id, strategy):
+        data = {'session_id': session_id, 'async': 'false'}
+        return client.post(f'/api/distribute/{strategy}', data=data, content_type='multipart/form-data')
+
+    def test_redistribute_matches_full_process(self, client, session_id):
+        """Test FIFO puis LIFO : même fichier final qu'un traitement LIFO complet"""
+        assert self.process(client, session_id, 'LIFO').status_code == 200
+        with open(session_service.get_session_data(session_id)['final_file_path'], encoding='utf-8') as f:
+            lifo_final = f.read()
+
+        assert self.process(client, session_id, 'FIFO').status_code == 200
+        with open(session_service.get_session_data(session_id)['final_file_path'], encoding='utf-8') as f:
+            assert f.read() != lifo_final
+        response = self.redistribute(client, session_id, 'lifo')
+
+        assert response.status_code == 200
+        body = response.get_json()
+        assert body['stats']['strategy_used'] == 'LIFO'
+        assert body['final_url'] == f'/api/download/final/{session_id}'
+        session_data = session_service.get_session_data(session_id)
+        assert session_data['strategy_used'] == 'LIFO'
+        with open(session_data['final_file_path'], encoding='utf-8') as f:
+            assert f.read() == lifo_final
+
+    def test_redistribute_events(self, client, session_id):
+        """Test flux SSE pipeline=redistribute : toutes les étapes, lignes du fichier final comprises"""
+        assert self.process(client, session_id, 'FIFO').status_code == 200
+        assert self.redistribute(client, session_id, 'LIFO').status_code == 200
+
+        response = client.get(f'/api/sessions/{session_id}/events?pipeline=redistribute')
+        events = [
+            json.loads(line[len('data: '):])
+            for line in response.get_data(as_text=True).splitlines() if line.startswith('data: ')
+        ]
+
+        assert events[0]['event'] == 'started' and events[-1]['event'] == 'completed'
+        assert {event['pipeline'] for event in events} == {'redistribute'}
+        assert [e for e in events if e['event'] == 'progress' and e['stage'] == 'final_file']
+        process_events = client.get(f'/api/sessions/{session_id}/events?pipeline=process').get_data(as_text=True)
+        assert process_events.count('event: completed') == 1
+
+    def test_redistribute_requires_discrepancies(self, client, session_id):
+        """Test session sans écarts calculés, stratégie inconnue, session absente"""
+        assert self.redistribute(client, session_id, 'LIFO').status_code == 409
+        assert self.redistribute(client, session_id, 'MOYENNE').status_code == 400
+        assert self.redistribute(client, 'inconnue', 'LIFO').status_code == 404
+
+    def test_compare_strategies(self, client, session_id):
+        """Test comparaison FIFO/LIFO : lots modifiés, sans fichier final ni changement de répartition"""
+        assert client.get(f'/api/sessions/{session_id}/compare').status_code == 409
+        assert self.process(client, session_id, 'FIFO').status_code == 200
+        session_data = session_service.get_session_data(session_id)
+        with open(session_data['final_file_path'], encoding='utf-8') as f:
+            fifo_final = f.read()
+
+        response = client.get(f'/api/sessions/{session_id}/compare?strategies=FIFO,LIFO')
+
+        assert response.status_code == 200
+        body = response.get_json()
+        assert body['summary']['deltas']['LIFO'] == {'lots_changed': 2, 'articles_changed': 1, 'quantity_shifted': 20.0}
+        assert [(lot['NUMERO_LOT'], lot['DELTA_LIFO']) for lot in body['lots']] == [
+            ('CPKU1010125AAAA', 20.0), ('CPKU1010625AAAA', -20.0)
+        ]
+        assert session_service.get_session_data(session_id)['strategy_used'] == 'FIFO'
+        with open(session_data['final_file_path'], encoding='utf-8') as f:
+            assert f.read() == fifo_final
+        assert client.get(f'/api/sessions/{session_id}/compare?strategies=FIFO').status_code == 400
+        assert not session_service.has_dataframe(session_id, 'strategy_comparison_df')
+
+    def test_compare_rejects_negative_limit(self, client, session_id):
+        """Test limit négatif refusé"""
+        response = client.get(f'/api/sessions/{session_id}/compare?limit=-1')
+
+        assert response.status_code == 400
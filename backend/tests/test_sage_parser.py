@@ -0,0 +1,185 @@
+import pytest
+import pandas as pd
+from datetime import datetime
+from config import config
+from services.file_processor import FileProcessorService
+from services.line_store import LineStore, raw_lines
+from services.sage_parser import SageStreamParser
+
+SAGE_COLUMNS = {
+    'TYPE_LIGNE': 0,
+    'NUMERO_SESSION': 1,
+    'NUMERO_INVENTAIRE': 2,
+    'RANG': 3,
+    'SITE': 4,
+    'QUANTITE': 5,
+    'QUANTITE_REELLE_IN_INPUT': 6,
+    'INDICATEUR_COMPTE': 7,
+    'CODE_ARTICLE': 8,
+    'EMPLACEMENT': 9,
+    'STATUT': 10,
+    'UNITE': 11,
+    'VALEUR': 12,
+    'ZONE_PK': 13,
+    'NUMERO_LOT': 14,
+}
+
+class TestSageStreamParser:
+    """Tests pour SageStreamParser"""
+
+    @pytest.fixture
+    def parser(self):
+        return SageStreamParser(SAGE_COLUMNS, source="csv")
+
+    def _write(self, tmp_path, content):
+        csv_file = tmp_path / "export.csv"
+        csv_file.write_text(content, encoding='utf-8')
+        return str(csv_file)
+
+    def test_parse_csv_routes_lines(self, parser, tmp_path):
+        """Test ventilation des lignes E/L/S et typage des colonnes"""
+        path = self._write(tmp_path, """E;SES1;depot;1;BKE02;;;;;;;;;;
+L;SES1;BKE022508INV00000006;1;BKE02;;;;;;;;;;
+S;SES1;BKE022508INV00000006;1000;BKE02;100;0;1;ART001;EMP001;A;UN;12,5;ZONE1;LOT123456;
+S;SES1;BKE022508INV00000006;1001;BKE02;50;0;1;ART002;EMP001;A;UN;;ZONE1;CPKU070725001
+""")
+        result = parser.parse_csv(path)
+
+        assert result.success
+        assert len(result.headers) == 2
+        assert result.first_numero_inventaire == 'BKE022508INV00000006'
+
+        df = result.dataframe
+        assert list(df.columns) == list(SAGE_COLUMNS.keys())
+        assert df['QUANTITE'].dtype == 'float64'
+        assert df['QUANTITE'].tolist() == [100.0, 50.0]
+        assert df['VALEUR'].iloc[0] == 12.5
+        assert pd.isna(df['VALEUR'].iloc[1])
+        assert df['RANG'].tolist() == [1000, 1001]
+
+        # La colonne vide finale est ignorée dans la ligne brute conservée
+        assert result.raw_lines[0].endswith(';LOT123456')
+        assert result.raw_lines[1].endswith(';CPKU070725001')
+
+    def test_parse_csv_collects_validation_errors(self, parser, tmp_path):
+        """Test collecte des erreurs métier pendant l'analyse"""
+        path = self._write(tmp_path, """S;SES1;INV1;1000;BKE02;abc;0;1;ART001;EMP001;A;UN;0;ZONE1;LOT1
+S;SES1;INV1;1001;BKE02;-5;0;1;ART002;EMP001;A;UN;0;ZONE1;LOT2
+S;SES1;INV1;1002;BKE02;-1;0;1; ;EMP001;A;UN;0;ZONE1;LOT3
+""")
+        result = parser.parse_csv(path)
+
+        assert not result.success
+        assert result.errors == [
+            "1 valeurs de quantité invalides détectées",
+            "2 quantités négatives détectées",
+            "1 codes articles vides détectés",
+        ]
+
+    def test_parse_csv_short_line(self, parser, tmp_path):
+        """Test arrêt sur une ligne S; incomplète"""
+        path = self._write(tmp_path, "E;SES1\nS;SES1;INV1;1000\n")
+        result = parser.parse_csv(path)
+
+        assert not result.success
+        assert "Ligne 2" in result.error_message
+        assert "15 colonnes requises" in result.error_message
+
+    def test_parse_csv_without_data(self, parser, tmp_path):
+        """Test fichier sans ligne S;"""
+        path = self._write(tmp_path, "E;SES1;depot\nL;SES1;INV1\n")
+        result = parser.parse_csv(path)
+
+        assert not result.success
+        assert result.errors == ["Aucune donnée S; trouvée"]
+
+    def test_parse_rows(self):
+        """Test analyse de lignes découpées (Excel)"""
+        parser = SageStreamParser(SAGE_COLUMNS, source="xlsx")
+        rows = [
+            ['E', 'SES1', 'depot'] + [''] * 12,
+            ['S', 'SES1', 'INV1', '1000', 'BKE02', '7', '0', '1', 'ART001', 'EMP001', 'A', 'UN', '0', 'ZONE1', 'LOT1'],
+        ]
+        result = parser.parse_rows(rows)
+
+        assert result.success
+        assert result.headers == ['E;SES1;depot;;;;;;;;;;;;']
+        assert result.dataframe['QUANTITE'].tolist() == [7.0]
+        assert result.raw_lines == ['S;SES1;INV1;1000;BKE02;7;0;1;ART001;EMP001;A;UN;0;ZONE1;LOT1']
+
+    def test_batches_match_single_pass(self, parser, tmp_path):
+        """Test analyse par lots : lots bornés, même DataFrame qu'en une passe"""
+        lines = [
+            f"S;SES1;INV1;{1000 + i};BKE02;{i};0;1;ART{i:03d};EMP001;A;UN;0;ZONE1;LOT{i}"
+            for i in range(5)
+        ]
+        path = self._write(tmp_path, "E;SES1;depot\n" + "\n".join(lines) + "\n")
+        received = []
+
+        def handler(frame, raw_lines):
+            received.append(list(raw_lines))
+            return frame
+
+        batched = SageStreamParser(SAGE_COLUMNS, source="csv", batch_rows=2, batch_handler=handler)
+        result = batched.parse_csv(path)
+
+        assert result.success
+        assert result.batches == 3
+        assert [len(batch) for batch in received] == [2, 2, 1]
+        assert sum(received, []) == lines
+        pd.testing.assert_frame_equal(result.dataframe, parser.parse_csv(path).dataframe)
+
+class TestChunkedProcessing:
+    """Tests pour l'analyse par lots des exports"""
+
+    def test_batched_file_matches_single_pass(self, sample_csv_file, tmp_path, monkeypatch):
+        """Test lots convertis et lignes stockées au fil de l'analyse : même résultat qu'en une passe"""
+        processor = FileProcessorService()
+        timestamp = datetime(2025, 8, 25)
+        result = processor._new_parser('csv').parse_csv(sample_csv_file)
+        assert result.success and result.batches == 0
+        success, expected, _, expected_date = processor._finalize_parse_result(result, timestamp)
+        assert success
+
+        monkeypatch.setattr(config, 'CHUNK_ROWS', 2)
+        store = LineStore(str(tmp_path / 's1_lines.txt'))
+        success, batched, headers, inventory_date = processor.validate_and_process_sage_file(
+            sample_csv_file, '.csv', timestamp, store
+        )
+
+        assert success
+        assert inventory_date == expected_date
+        assert len(headers) == 2
+        assert raw_lines(batched, store).tolist() == expected['original_s_line_raw'].tolist()
+        pd.testing.assert_frame_equal(
+            batched.drop(columns=['LINE_OFFSET', 'LINE_LENGTH']),
+            expected.drop(columns='original_s_line_raw'),
+        )
+
+    def test_row_counts_across_batches(self, tmp_path, monkeypatch):
+        """Test lots de CHUNK_ROWS lignes : progression cumulée, lignes stockées contiguës"""
+        lines = [
+            f"S;SES1;INV1;{1000 + i};BKE02;{i};0;1;ART{i:03d};EMP001;A;UN;0;ZONE1;LOT{i}"
+            for i in range(7)
+        ]
+        path = tmp_path / 'export.csv'
+        path.write_text("E;SES1;depot\nL;SES1;INV1\n" + "\n".join(lines) + "\n")
+
+        monkeypatch.setattr(config, 'CHUNK_ROWS', 3)
+        processor = FileProcessorService()
+        store = LineStore(str(tmp_path / 's1_lines.txt'))
+        progress = []
+        success, df, _, _ = processor.validate_and_process_sage_file(
+            str(path), '.csv', datetime(2025, 8, 25), store, progress.append
+        )
+
+        assert success
+        assert progress == [3, 6, 7]
+        assert len(df) == 7
+        assert df['RANG'].tolist() == [1000 + i for i in range(7)]
+        # Chaque lot est écrit à la suite du précédent dans le fichier de lignes
+        offsets = df['LINE_OFFSET'].tolist()
+        lengths = df['LINE_LENGTH'].tolist()
+        assert offsets[0] == 0
+        assert all(offsets[i + 1] == offsets[i] + lengths[i] + 1 for i in range(6))
+        assert raw_lines(df, store).tolist() == lines
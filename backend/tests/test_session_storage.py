@@ -0,0 +1,61 @@
+import os
+import pytest
+import pandas as pd
+from services.dataframe_cache import DataFrameCache
+from services.session_service import SessionService
+
+class TestSessionStorage:
+    """Tests pour le stockage des DataFrames de session (Arrow IPC / Parquet)"""
+
+    @pytest.fixture
+    def service(self, tmp_path):
+        service = SessionService()
+        service.data_folder = str(tmp_path)
+        service.storage_format = 'arrow'
+        service._dataframe_cache = DataFrameCache(max_bytes=10**8)
+        return service
+
+    @pytest.fixture
+    def frame(self):
+        return pd.DataFrame({
+            'CODE_ARTICLE': ['ART001', 'ART002', None],
+            'QUANTITE': [100.0, 50.0, 0.0],
+            'Date_Lot': pd.to_datetime(['2025-07-07', None, '2025-01-01']),
+        })
+
+    def test_arrow_round_trip(self, service, frame, tmp_path):
+        """Test écriture Arrow IPC et relecture mappée en mémoire"""
+        service.save_dataframe('s1', 'original_df', frame)
+        service._dataframe_cache.clear()
+
+        loaded = service.load_dataframe('s1', 'original_df')
+
+        assert os.path.exists(tmp_path / 's1_original_df.arrow')
+        pd.testing.assert_frame_equal(loaded, frame)
+
+    def test_parquet_fallback_and_cleanup(self, service, frame, tmp_path):
+        """Test lecture des sessions Parquet existantes et nettoyage des deux formats"""
+        frame.to_parquet(tmp_path / 's1_original_df.parquet', index=False)
+        service.save_dataframe('s1', 'aggregated_df', frame)
+
+        pd.testing.assert_frame_equal(service.load_dataframe('s1', 'original_df'), frame)
+
+        service.cleanup_session_data('s1')
+        assert os.listdir(tmp_path) == []
+        assert len(service._dataframe_cache) == 0
+
+    def test_file_rewritten_by_other_worker(self, service, frame):
+        """Test invalidation du cache local quand le fichier a été réécrit"""
+        service.save_dataframe('s1', 'distributed_df', frame)
+        other = SessionService()
+        other.data_folder = service.data_folder
+        other.storage_format = 'arrow'
+        other._dataframe_cache = DataFrameCache(max_bytes=10**8)
+        updated = frame.assign(QUANTITE=[1.0, 2.0, 3.0])
+        other.save_dataframe('s1', 'distributed_df', updated)
+        path = other._dataframe_path('s1', 'distributed_df', 'arrow')
+        os.utime(path, ns=(1, 1))
+
+        loaded = service.load_dataframe('s1', 'distributed_df')
+
+        assert loaded['QUANTITE'].tolist() == [1.0, 2.0, 3.0]
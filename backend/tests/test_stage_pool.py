@@ -0,0 +1,54 @@
+import os
+import pytest
+import pandas as pd
+from services.stage_pool import StagePool, ArrowFrame, encode_result, decode_result
+
+def frame_stage(rows):
+    """Étape de test : DataFrame construit dans le processus du pool"""
+    return os.getpid(), pd.DataFrame({'ROW': range(rows)}, index=range(10, 10 + rows))
+
+class TestStagePool:
+    """Tests pour le pool de processus des étapes lourdes"""
+
+    @pytest.fixture
+    def frame(self):
+        return pd.DataFrame({
+            'SITE': pd.Categorical(['BKE02', 'BKE02', 'BKE03']),
+            'RANG': pd.array([1000, None, 1002], dtype='Int64'),
+            'Date_Lot': pd.to_datetime(['2025-07-07', None, '2025-01-01']),
+            'QUANTITE': [1.5, 0.0, 3.0],
+        }, index=[5, 3, 9])
+
+    def test_arrow_round_trip(self, frame):
+        """Test buffer Arrow : types (catégoriel, Int64, dates) et index conservés"""
+        encoded = encode_result((True, frame, ['E;SES1'], None))
+
+        assert isinstance(encoded[1], ArrowFrame)
+        decoded = decode_result(encoded)
+        pd.testing.assert_frame_equal(decoded[1], frame)
+        assert decoded[0] is True and decoded[2] == ['E;SES1'] and decoded[3] is None
+
+    def test_mixed_objects_sent_as_is(self):
+        """Test colonne d'objets hétérogènes : DataFrame transmis sans conversion"""
+        mixed = pd.DataFrame({'VALEUR': [1, 'a', None]})
+
+        assert encode_result(mixed) is mixed
+
+    def test_run_in_worker_process(self):
+        """Test étape exécutée dans un autre processus, DataFrame retourné intact"""
+        pool = StagePool(workers=1)
+        try:
+            pool.start()
+            pid, df = pool.run(frame_stage, 3)
+        finally:
+            pool.shutdown(wait=True)
+
+        assert pid != os.getpid()
+        assert df.index.tolist() == [10, 11, 12]
+        assert df['ROW'].tolist() == [0, 1, 2]
+
+    def test_disabled_runs_directly(self):
+        """Test sans workers : étape exécutée dans le processus courant"""
+        pid, _ = StagePool(workers=0).run(frame_stage, 1)
+
+        assert pid == os.getpid()
@@ -0,0 +1,95 @@
+import zipfile
+import pytest
+import numpy as np
+import pandas as pd
+from services.xlsx_reader import XlsxReader, XlsxReadError, read_xlsx_table
+
+WORKBOOK = """<?xml version="1.0" encoding="UTF-8"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+ xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<sheets><sheet name="Export" sheetId="1" r:id="rId7"/></sheets></workbook>"""
+
+RELS = """<?xml version="1.0" encoding="UTF-8"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId7" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/data.xml"/>
+<Relationship Id="rId8" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings" Target="sharedStrings.xml"/>
+</Relationships>"""
+
+SHARED_STRINGS = """<?xml version="1.0" encoding="UTF-8"?>
+<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" count="3" uniqueCount="3">
+<si><t>S</t></si>
+<si><r><t>ART</t></r><r><rPr><b/></rPr><t>001</t></r><rPh><t>ignored</t></rPh></si>
+<si><t xml:space="preserve"> LOT &amp; CO </t></si>
+</sst>"""
+
+SHEET = """<?xml version="1.0" encoding="UTF-8"?>
+<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>
+<row r="1"><c r="A1" t="s"><v>0</v></c><c r="B1" t="s"><v>1</v></c><c r="D1"><v>12</v></c><c r="E1"><v>2.5</v></c></row>
+<row r="3"><c r="A3" t="inlineStr"><is><t>E</t></is></c><c r="B3" t="b"><v>1</v></c><c r="C3" t="e"><v>#N/A</v></c><c r="D3"><v>3.0</v></c><c r="E3" t="s"><v>2</v></c></row>
+</sheetData></worksheet>"""
+
+
+def _build_workbook(path):
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("[Content_Types].xml", "<Types/>")
+        zf.writestr("xl/workbook.xml", WORKBOOK)
+        zf.writestr("xl/_rels/workbook.xml.rels", RELS)
+        zf.writestr("xl/sharedStrings.xml", SHARED_STRINGS)
+        zf.writestr("xl/worksheets/data.xml", SHEET)
+    return str(path)
+
+
+class TestXlsxReader:
+    """Tests pour le lecteur XLSX natif"""
+
+    @pytest.fixture
+    def workbook(self, tmp_path):
+        return _build_workbook(tmp_path / "export.xlsx")
+
+    def test_iter_rows_decodes_cells(self, workbook):
+        """Test chaînes partagées, texte riche, nombres, booléens et erreurs"""
+        with XlsxReader(workbook) as reader:
+            rows = list(reader.iter_rows())
+
+        assert rows[0] == ['S', 'ART001', None, 12, 2.5]
+        # Ligne 2 absente de la feuille
+        assert rows[1] == []
+        assert rows[2] == ['E', True, None, 3, ' LOT & CO ']
+        assert isinstance(rows[2][3], int)
+
+    def test_iter_rows_width_and_columns(self, workbook):
+        """Test largeur fixe et sélection de colonnes"""
+        with XlsxReader(workbook) as reader:
+            assert list(reader.iter_rows(width=3)) == [
+                ['S', 'ART001', None], [], ['E', True, None]
+            ]
+            assert list(reader.iter_rows(columns=[1, 3], width=6)) == [
+                [None, 'ART001', None, 12, None, None],
+                [],
+                [None, True, None, 3, None, None],
+            ]
+
+    def test_read_table_matches_pandas(self, tmp_path):
+        """Test équivalence avec pd.read_excel sur un template généré par pandas"""
+        path = str(tmp_path / "template.xlsx")
+        df = pd.DataFrame({
+            'Numéro Session': ['SES1', 'SES1', 'SES1'],
+            'Code Article': ['ART1', 'ART2', None],
+            'Quantité Théorique': [10, 0, 5],
+            'Quantité Réelle': [9.5, np.nan, 5],
+        })
+        df.to_excel(path, index=False)
+
+        expected = pd.read_excel(path, engine='openpyxl')
+        pd.testing.assert_frame_equal(read_xlsx_table(path), expected)
+
+        subset = read_xlsx_table(path, ['Quantité Réelle', 'Code Article', 'Absente'])
+        pd.testing.assert_frame_equal(subset, expected[['Quantité Réelle', 'Code Article']])
+
+    def test_invalid_archive(self, tmp_path):
+        """Test rejet d'un fichier qui n'est pas une archive XLSX"""
+        path = tmp_path / "ancien.xls"
+        path.write_bytes(b"\xd0\xcf\x11\xe0 pas un zip")
+
+        with pytest.raises(XlsxReadError):
+            XlsxReader(str(path))
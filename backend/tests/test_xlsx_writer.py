@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import openpyxl
+from services.xlsx_writer import write_xlsx_table, column_widths
+from services.xlsx_reader import read_xlsx_table
+
+class TestXlsxWriter:
+    """Tests pour l'écriture XLSX en flux du template"""
+
+    def make_df(self):
+        return pd.DataFrame({
+            'Numéro Session': ['SES1', 'S&<>1 ', None],
+            'Code Article': ['A' * 60, 'ART002', 'ART003'],
+            'Quantité Théorique': [7.0, 12.5, np.nan],
+            'Quantité Réelle': [0, 0, 0],
+        })
+
+    def test_values_and_types(self, tmp_path):
+        """Test nombres en cellules numériques, chaînes échappées, cellules vides"""
+        path = tmp_path / 'template.xlsx'
+        write_xlsx_table(str(path), self.make_df(), sheet_name='Inventaire', chunk_size=2)
+
+        worksheet = openpyxl.load_workbook(path)['Inventaire']
+        rows = [list(row) for row in worksheet.iter_rows(values_only=True)]
+        assert rows[0] == ['Numéro Session', 'Code Article', 'Quantité Théorique', 'Quantité Réelle']
+        assert rows[1][2:] == [7, 0]
+        assert rows[2] == ['S&<>1 ', 'ART002', 12.5, 0]
+        assert rows[3] == [None, 'ART003', None, 0]
+        assert worksheet['A1'].font.b and worksheet['A1'].border.left.style == 'thin'
+
+    def test_column_widths(self, tmp_path):
+        """Test largeurs : texte le plus long + 2, en-tête compris, plafond à 50"""
+        df = self.make_df()
+        assert column_widths(df) == [16, 50, 20, 17]
+
+        path = tmp_path / 'template.xlsx'
+        write_xlsx_table(str(path), df)
+        worksheet = openpyxl.load_workbook(path).active
+        assert [worksheet.column_dimensions[c].width for c in 'ABCD'] == [16, 50, 20, 17]
+
+    def test_round_trip(self, tmp_path):
+        """Test relecture par pandas et par le lecteur natif"""
+        path = tmp_path / 'template.xlsx'
+        df = self.make_df()
+        write_xlsx_table(str(path), df)
+
+        pd.testing.assert_frame_equal(pd.read_excel(path), df)
+        native = read_xlsx_table(str(path), ['Code Article', 'Quantité Réelle'])
+        assert native['Code Article'].tolist() == df['Code Article'].tolist()
+
+    def test_hidden_columns(self, tmp_path):
+        """Test colonnes masquées (identifiants techniques), toujours relues"""
+        path = tmp_path / 'template.xlsx'
+        df = self.make_df().assign(**{'Clé Ligne': [3, 1, 2]})
+        write_xlsx_table(str(path), df, hidden_columns=['Clé Ligne'])
+
+        worksheet = openpyxl.load_workbook(path).active
+        assert worksheet.column_dimensions['E'].hidden
+        assert not worksheet.column_dimensions['D'].hidden
+        assert read_xlsx_table(str(path), ['Clé Ligne'])['Clé Ligne'].tolist() == [3, 1, 2]
@@ -4,6 +4,7 @@ import Header from './components/Header';
 import ErrorBoundary from './components/ErrorBoundary';
 import LoadingSpinner from './components/LoadingSpinner';
 import { useToast } from './components/Toast';
+import { waitForJob, JOB_STAGE_LABELS } from './hooks/useApi';
 
 // Lazy loading des composants lourds
 const SessionManager = lazy(() => import('./components/SessionManager'));
@@ -116,8 +117,12 @@ const SageInventoryApp = () => {
             const data = await response.json();
 
             if (response.ok) {
+                // 202 : traitement en arrière-plan, suivi par étape
+                const result = response.status === 202
+                    ? await waitForJob(data, (stage) => setProgressDetails(JOB_STAGE_LABELS[stage]))
+                    : data;
                 setUploadStatus('success');
-                setUploadResult(data);
+                setUploadResult(result);
                 setCurrentStep(1);
                 setProgressDetails('Template prêt à être téléchargé');
                 showSuccess('Fichier traité avec succès !');
@@ -220,8 +225,12 @@ const SageInventoryApp = () => {
             const data = await response.json();
 
             if (response.ok) {
+                // 202 : traitement en arrière-plan, suivi par étape
+                const result = response.status === 202
+                    ? await waitForJob(data, (stage) => setProgressDetails(JOB_STAGE_LABELS[stage]))
+                    : data;
                 setProcessStatus('success');
-                setProcessResult(data);
+                setProcessResult(result);
                 setCurrentStep(4);
                 setProgressDetails('Fichier final généré et prêt au téléchargement');
                 showSuccess('Traitement terminé avec succès !');
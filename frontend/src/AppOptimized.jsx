@@ -9,6 +9,7 @@ import StatsCard from './components/StatsCard';
 import { useToast } from './components/Toast';
 import { useAppState } from './hooks/useAppState';
 import { useFileHandler } from './hooks/useFileHandler';
+import { waitForJob, JOB_STAGE_LABELS } from './hooks/useApi';
 
 // Lazy loading des composants lourds
 const SessionManager = lazy(() => import('./components/SessionManager'));
@@ -116,7 +117,11 @@ const SageInventoryApp = () => {
             const data = await response.json();
 
             if (response.ok) {
-                setUploadProgress('success', data, 1, 'Template prêt à être téléchargé');
+                // 202 : traitement en arrière-plan, suivi par étape
+                const result = response.status === 202
+                    ? await waitForJob(data, (stage) => setUploadProgress('uploading', null, 0, JOB_STAGE_LABELS[stage]))
+                    : data;
+                setUploadProgress('success', result, 1, 'Template prêt à être téléchargé');
                 showSuccess('Fichier traité avec succès !');
             } else {
                 throw new Error(data.error || 'Erreur lors du traitement du fichier');
@@ -212,7 +217,11 @@ const SageInventoryApp = () => {
             const data = await response.json();
 
             if (response.ok) {
-                setProcessProgress('success', data, 4, 'Fichier final généré et prêt au téléchargement');
+                // 202 : traitement en arrière-plan, suivi par étape
+                const result = response.status === 202
+                    ? await waitForJob(data, (stage) => setProcessProgress('processing', null, 3, JOB_STAGE_LABELS[stage]))
+                    : data;
+                setProcessProgress('success', result, 4, 'Fichier final généré et prêt au téléchargement');
                 showSuccess('Traitement terminé avec succès !');
             } else {
                 throw new Error(data.error || 'Erreur lors du calcul des écarts');
@@ -1,6 +1,42 @@
 import { useState, useCallback, useMemo } from 'react';
 
 const API_BASE_URL = 'http://localhost:5000/api';
+const JOB_POLL_INTERVAL = 1000;
+
+// Libellés des étapes des traitements en arrière-plan
+export const JOB_STAGE_LABELS = {
+    parse: 'Analyse du fichier...',
+    save: 'Sauvegarde des données...',
+    aggregate: 'Agrégation des quantités...',
+    template: 'Génération du template...',
+    discrepancies: 'Calcul des écarts...',
+    distribution: 'Répartition des écarts...',
+    final_file: 'Génération du fichier final...',
+};
+
+// Réponse 202 (traitement en arrière-plan) : suit le job jusqu'à sa fin et retourne son résultat
+export const waitForJob = async (accepted, onStage) => {
+    let currentStage = null;
+    for (;;) {
+        const response = await fetch(`${API_BASE_URL}/jobs/${accepted.job_id}`);
+        const job = await response.json();
+
+        if (!response.ok) {
+            throw new Error(job.error || `Erreur HTTP: ${response.status}`);
+        }
+        if (job.current_stage && job.current_stage !== currentStage) {
+            currentStage = job.current_stage;
+            onStage?.(currentStage);
+        }
+        if (job.status === 'completed') {
+            return job.result;
+        }
+        if (job.status === 'failed') {
+            throw new Error(job.error || 'Erreur lors du traitement');
+        }
+        await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL));
+    }
+};
 
 export const useApi = () => {
     const [loading, setLoading] = useState(false);
@@ -28,7 +64,7 @@ export const useApi = () => {
                 throw new Error(data.error || `Erreur HTTP: ${response.status}`);
             }
 
-            return data;
+            return response.status === 202 && data.job_id ? await waitForJob(data) : data;
         } catch (err) {
             setError(err.message);
             throw err;